@@ -0,0 +1,164 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import random
+import re
+import threading
+import time
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test', 'fixtures')
+RECORDED_POSTER_LINK = 'https://a.ltrbxd.com/resized/film-poster/2/4/0/3/4/4/240344-la-la-land-0-230-0-345-crop.jpg?v=053670ff84'
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as fixture_file:
+        return fixture_file.read()
+
+
+class fixture_server:
+    '''
+    A local HTTP server that stands in for letterboxd.com, serving the recorded popular-list, film, stats and poster pages for a number of generated films.
+    Every request can be delayed, and a fraction of requests can be answered with 503 errors, to mimic a slow or unreliable site.
+
+    Attributes
+    ----------
+    n_films: int
+        The number of films listed in the popular section (equal to n_films parameter).
+    films_per_page: int
+        The number of films listed on each page of the popular section (equal to films_per_page parameter).
+    latency: float
+        The number of seconds every response is delayed by (equal to latency parameter).
+    error_rate: float
+        The fraction of film, list and poster requests answered with a 503 error (equal to error_rate parameter).
+    poster_bytes: int
+        The size of each poster image (equal to poster_bytes parameter).
+    base_url: str
+        The root URL of the server once it has started.
+    requests_served: int
+        The number of requests answered, including errors.
+    errors_served: int
+        The number of requests answered with an injected error.
+    '''
+    def __init__(self, n_films: int = 144, films_per_page: int = 72, latency: float = 0, error_rate: float = 0, poster_bytes: int = 50000, seed: int = 0):
+        '''
+        See help(fixture_server) for accurate signature.
+        '''
+        self.n_films = n_films
+        self.films_per_page = films_per_page
+        self.latency = latency
+        self.error_rate = error_rate
+        self.poster_bytes = poster_bytes
+        self.base_url = None
+        self.requests_served = 0
+        self.errors_served = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__film_template = read_fixture('film_page.html')
+        self.__stats_template = read_fixture('film_stats.html')
+        self.__rating_template = read_fixture('film_rating_histogram.html')
+        list_template = read_fixture('popular_page.html')
+        self.__list_header = list_template[:list_template.index('<li')]
+        self.__list_footer = list_template[list_template.rindex('</li>') + len('</li>'):]
+        self.__poster = self.__random.randbytes(poster_bytes)
+        self.__server = None
+
+    def friendly_id(self, index: int) -> str:
+        '''
+        Returns the 'friendly_id' of the film at a position in the popular section, starting from 0.
+        '''
+        return f'benchmark-film-{index}'
+
+    def __film_page(self, friendly_id: str) -> str:
+        page_html = self.__film_template.replace(RECORDED_POSTER_LINK, f'{self.base_url}/posters/{friendly_id}.jpg?v=1')
+        page_html = page_html.replace('https://letterboxd.com', self.base_url)
+        return page_html.replace('la-la-land', friendly_id).replace('La La Land', friendly_id.replace('-', ' ').title())
+
+    def __list_page(self, page: int) -> str:
+        first = (page - 1) * self.films_per_page
+        items = []
+        for index in range(first, min(first + self.films_per_page, self.n_films)):
+            friendly_id = self.friendly_id(index)
+            items.append(f'<li class="listitem poster-container"><div class="really-lazy-load poster film-poster" data-film-slug="{friendly_id}" '
+                         f'data-target-link="/film/{friendly_id}/"><a href="/film/{friendly_id}/" class="frame"><span class="frame-title"></span></a></div></li>')
+        return self.__list_header + '\n\t\t'.join(items) + self.__list_footer
+
+    def __route(self, path: str):
+        path = path.split('?')[0]
+        match = re.fullmatch(r'/films/(?:ajax/)?popular/(?:size/small/)?page/(\d+)/?', path)
+        if match is not None:
+            return 200, 'text/html', self.__list_page(int(match.group(1))).encode(), True
+        match = re.fullmatch(r'/csi/film/([\w-]+)/(stats|rating-histogram)/', path)
+        if match is not None:
+            template = self.__stats_template if match.group(2) == 'stats' else self.__rating_template
+            return 200, 'text/html', template.replace('la-la-land', match.group(1)).encode(), False
+        match = re.fullmatch(r'/film/([\w-]+)/', path)
+        if match is not None:
+            return 200, 'text/html', self.__film_page(match.group(1)).encode(), True
+        match = re.fullmatch(r'/posters/([\w-]+)\.jpg', path)
+        if match is not None:
+            return 200, 'image/jpeg', self.__poster, True
+        return 404, 'text/plain', b'Not found', False
+
+    def __inject_error(self, can_fail: bool) -> bool:
+        with self.__lock:
+            self.requests_served += 1
+            if can_fail and self.error_rate > 0 and self.__random.random() < self.error_rate:
+                self.errors_served += 1
+                return True
+        return False
+
+    def response_for(self, path: str) -> tuple:
+        '''
+        Returns the response to a GET request after the configured latency, replacing it with a 503 error for a fraction of requests.
+        Parameters
+        ----------
+        path: str
+            The path of the request.
+
+        Returns
+        -------
+        tuple
+            The status code, content type and body of the response.
+        '''
+        if self.latency > 0:
+            time.sleep(self.latency)
+        status, content_type, body, can_fail = self.__route(path)
+        if self.__inject_error(can_fail):
+            return 503, 'text/plain', b'Service unavailable'
+        return status, content_type, body
+
+    def start(self) -> 'fixture_server':
+        '''
+        Starts serving on a free local port on a background thread.
+        '''
+        fixtures = self
+
+        class fixture_handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                status, content_type, body = fixtures.response_for(self.path)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if content_type == 'image/jpeg':
+                    self.send_header('ETag', '"benchmark-poster"')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer(('127.0.0.1', 0), fixture_handler)
+        self.__server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.__server.server_port}'
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        '''
+        Stops the server.
+        '''
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
@@ -0,0 +1,194 @@
+'''
+Runs the scraper against a local fixture server, with a SQLite database and a mocked s3 bucket, and reports its throughput, per-film latency and peak memory.
+
+Each engine, flow and concurrency setting is run in its own process so that the peak RSS of one run does not hide another's.
+Results are appended to a JSON Lines file together with the current git commit, and compared with the last result for the same setting so that regressions between commits are visible.
+
+    python -m benchmarks.run_benchmarks --engines http --workers 1,4 --flows sequential,pipeline --latency 0.02
+    python -m benchmarks.run_benchmarks --engines selenium --browsers standard,lean --workers 1
+'''
+from benchmarks.fixture_server import fixture_server
+from contextlib import redirect_stdout
+from datetime import datetime
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+COMPARED_METRICS = {'films_per_second': 'higher', 'p50_seconds': 'lower', 'p95_seconds': 'lower', 'peak_rss_mb': 'lower'}
+
+
+def setting_key(setting: dict) -> tuple:
+    return tuple(sorted((name, value) for name, value in setting.items()))
+
+
+def run_single(setting: dict) -> dict:
+    '''
+    Runs one benchmark in the current process and returns its results.
+    Parameters
+    ----------
+    setting: dict
+        The 'engine', 'flow', 'workers', 'pages', 'films_per_page', 'latency', 'error_rate' and 'politeness_delay' of the run, and for the selenium engine the 'browser', 'standard' or 'lean'.
+
+    Returns
+    -------
+    dict
+        The setting with the 'films', 'seconds', 'films_per_second', 'p50_seconds', 'p95_seconds', 'peak_rss_mb', 'peak_children_rss_mb', 'requests_served' and 'errors_served' of the run.
+    '''
+    from data_collection.scraper import scraper
+    from moto import mock_s3
+    import boto3
+
+    server = fixture_server(n_films=setting['pages'] * setting['films_per_page'], films_per_page=setting['films_per_page'],
+                            latency=setting['latency'], error_rate=setting['error_rate']).start()
+    working_dir = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir, mock_s3():
+        os.chdir(tmp_dir)
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+        boto3.client('s3').create_bucket(Bucket='letterboxd-data-bucket', CreateBucketConfiguration={'LocationConstraint': 'eu-west-2'})
+        try:
+            lean = setting.get('browser') == 'lean'
+            lbox_scraper = scraper(scrape_engine=setting['engine'], workers=setting['workers'], start_page=1, pages=setting['pages'],
+                                   metrics=True, base_url=server.base_url, database_url=f"sqlite:///{os.path.join(tmp_dir, 'film_data.db')}",
+                                   politeness_delay=setting['politeness_delay'], lean_browser=lean,
+                                   browser_profile_dir=os.path.join(tmp_dir, 'browser_profiles') if lean else None)
+            lbox_scraper.set_data_storage_options(s3_storage=True, keep_raw_data=False, rds=True, csv=True, parquet=False)
+            pages = list(range(1, setting['pages'] + 1))
+            started = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                if setting['flow'] == 'pipeline':
+                    lbox_scraper.run_pipeline(pages, {'fetch': setting['workers']}, report_interval=None)
+                else:
+                    lbox_scraper.scrape_pages(pages)
+                    lbox_scraper.flush_storage()
+            seconds = time.perf_counter() - started
+            summary = lbox_scraper.metrics.summary()
+            lbox_scraper.close()
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+    films = summary['counters'].get('films_scraped_total', 0)
+    if films == 0:
+        raise RuntimeError('no films were scraped')
+    latency = summary['timings'].get(f"film_scrape_seconds{{engine=\"{setting['engine']}\"}}", {})
+    # ru_maxrss is in kilobytes on Linux.
+    return {**setting,
+            'films': films,
+            'seconds': round(seconds, 3),
+            'films_per_second': round(films / seconds, 3),
+            'p50_seconds': latency.get('p50_seconds'),
+            'p95_seconds': latency.get('p95_seconds'),
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            'peak_children_rss_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+            'requests_served': server.requests_served,
+            'errors_served': server.errors_served}
+
+
+def run_in_subprocess(setting: dict) -> dict:
+    '''
+    Runs one benchmark in a fresh Python process and returns its results, or the setting with an 'error' if it failed.
+    '''
+    completed = subprocess.run([sys.executable, '-m', 'benchmarks.run_benchmarks', '--single', json.dumps(setting)],
+                               capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if completed.returncode != 0:
+        return {**setting, 'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f'exit code {completed.returncode}'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def load_results(path: str) -> list:
+    if not os.path.exists(path):
+        return []
+    with open(path) as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+def compare(result: dict, previous: dict, threshold: float) -> list:
+    '''
+    Returns a description of every metric that is more than threshold worse than in a previous result for the same setting.
+    '''
+    regressions = []
+    for name, better in COMPARED_METRICS.items():
+        old, new = previous.get(name), result.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (better == 'higher' and change < -threshold) or (better == 'lower' and change > threshold):
+            regressions.append(f"{name} {old} -> {new} ({change:+.0%}) since {previous.get('commit', 'unknown')}")
+    return regressions
+
+
+def parse_list(setting: str, item_type=str) -> list:
+    return [item_type(item.strip()) for item in setting.split(',') if item.strip()]
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run_benchmarks', description='Benchmark the scraper against a local fixture server.')
+    parser.add_argument('--engines', default='http', help="comma separated engines to benchmark, 'http' and/or 'selenium'")
+    parser.add_argument('--browsers', default='standard,lean', help="comma separated browser configurations for the selenium engine, 'standard' and/or 'lean'")
+    parser.add_argument('--flows', default='sequential,pipeline', help="comma separated flows to benchmark, 'sequential' and/or 'pipeline'")
+    parser.add_argument('--workers', default='1,4', help='comma separated numbers of workers')
+    parser.add_argument('--pages', type=int, default=2, help='the number of pages of the popular section scraped per run')
+    parser.add_argument('--films-per-page', type=int, default=24, help='the number of films listed on each page')
+    parser.add_argument('--latency', type=float, default=0.02, help='the number of seconds every response is delayed by')
+    parser.add_argument('--error-rate', type=float, default=0, help='the fraction of requests answered with a 503 error')
+    parser.add_argument('--politeness-delay', type=float, default=0, help='the number of seconds between requests at the start of a run, or 0 for no limit')
+    parser.add_argument('--results', default=RESULTS_PATH, help='the JSON Lines file results are appended to')
+    parser.add_argument('--threshold', type=float, default=0.1, help='the relative change in a metric reported as a regression')
+    parser.add_argument('--no-save', action='store_true', help='print the results without storing them')
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.single is not None:
+        print(json.dumps(run_single(json.loads(args.single))))
+        return 0
+
+    previous_results = {}
+    for previous in load_results(args.results):
+        previous_results[setting_key(previous['setting'])] = previous
+    commit = current_commit()
+    regressed = False
+    settings = []
+    for engine in parse_list(args.engines):
+        # Only the selenium engine loads film pages in the browser, so the browser configuration is not varied for the http engine.
+        for browser in parse_list(args.browsers) if engine == 'selenium' else [None]:
+            for flow in parse_list(args.flows):
+                for workers in parse_list(args.workers, int):
+                    setting = {'engine': engine, 'flow': flow, 'workers': workers, 'pages': args.pages, 'films_per_page': args.films_per_page,
+                               'latency': args.latency, 'error_rate': args.error_rate, 'politeness_delay': args.politeness_delay}
+                    if browser is not None:
+                        setting['browser'] = browser
+                    settings.append(setting)
+    for setting in settings:
+        result = run_in_subprocess(setting)
+        label = f"{setting['engine']:<8} {setting.get('browser', ''):<8} {setting['flow']:<10} workers={setting['workers']:<3}"
+        if 'error' in result:
+            print(f"{label} skipped: {result['error']}")
+            continue
+        print(f"{label} {result['films_per_second']:>8.2f} films/s  p50 {result['p50_seconds']}s  p95 {result['p95_seconds']}s  "
+              f"peak RSS {result['peak_rss_mb']} MB (+{result['peak_children_rss_mb']} MB in child processes)")
+        record = {'commit': commit, 'time': datetime.now().isoformat(timespec='seconds'), 'setting': setting, **result}
+        previous = previous_results.get(setting_key(setting))
+        if previous is not None:
+            for regression in compare(record, previous, args.threshold):
+                regressed = True
+                print(f'    regression: {regression}')
+        if not args.no_save:
+            with open(args.results, 'a') as results_file:
+                results_file.write(json.dumps(record) + '\n')
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
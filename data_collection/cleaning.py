@@ -0,0 +1,177 @@
+import pandas as pd
+
+
+RECORD_FIELDS = ['friendly_id', 'uuid', 'title', 'year', 'runtime', 'rating', 'watches', 'lists', 'likes', 'director', 'top_250_position',
+                 'description', 'poster_link', 'data_obtained_time']
+NUMERIC_DTYPES = {'year': 'Int32', 'runtime': 'Int32', 'rating': 'Float64', 'watches': 'Int64', 'lists': 'Int64', 'likes': 'Int64',
+                  'top_250_position': 'Int32'}
+NULLABLE_FIELDS = ['top_250_position']
+
+
+class film_record:
+    '''
+    The data of a single film, with one typed slot per field instead of a dictionary per film.
+    Fields can be read and set by name as with a film dictionary, and missing values are None.
+
+    Attributes
+    ----------
+    friendly_id: str
+        The id of the film in its letterboxd.com link.
+    uuid: str
+        A unique id generated for this scrape of the film.
+    title, director, description, poster_link: str
+        The scraped text fields. Two directors are joined with ', '.
+    year, runtime, watches, lists, likes: int
+        The scraped counts, with 'runtime' in minutes.
+    rating: float
+        The average rating out of 5.
+    top_250_position: int or None
+        The film's position in the top 250, or None if it is not in it.
+    data_obtained_time: datetime
+        When the film was scraped.
+    '''
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, **fields):
+        '''
+        See help(film_record) for accurate signature.
+        '''
+        unknown_fields = set(fields) - set(RECORD_FIELDS)
+        if len(unknown_fields) > 0:
+            raise TypeError(f"film_record has no fields {', '.join(sorted(unknown_fields))}")
+        for field in RECORD_FIELDS:
+            setattr(self, field, fields.get(field))
+
+    @classmethod
+    def from_dict(cls, film_data_dic: dict) -> 'film_record':
+        return cls(**{field: film_data_dic[field] for field in RECORD_FIELDS if field in film_data_dic})
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in RECORD_FIELDS}
+
+    def keys(self) -> list:
+        return list(RECORD_FIELDS)
+
+    def get(self, field: str, default=None):
+        return getattr(self, field) if field in RECORD_FIELDS else default
+
+    def __getitem__(self, field: str):
+        if field not in RECORD_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field: str, value):
+        if field not in RECORD_FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def __contains__(self, field: str) -> bool:
+        return field in RECORD_FIELDS
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self) -> int:
+        return len(RECORD_FIELDS)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, film_record) and self.to_dict() == other.to_dict()
+
+    def __repr__(self) -> str:
+        return f'film_record({self.friendly_id!r})'
+
+
+def clean_columns(film_data_df: pd.DataFrame) -> list:
+    '''
+    Converts the scraped text in every column of a batch of films to its type in place, one column at a time.
+    Commas are stripped from the numeric fields, 'runtime' is read from text such as '128 mins' and directors scraped as a list are joined with ', '.
+    Numeric columns get nullable dtypes, so a value that cannot be parsed becomes <NA> instead of failing the batch.
+    Parameters
+    ----------
+    film_data_df: pandas.DataFrame
+        One row per film and one column per scraped field, holding the scraped values.
+
+    Returns
+    -------
+    list of dict
+        The 'friendly_id', 'field' and scraped 'value' of every value that could not be parsed, and of every missing value of a field that is not nullable.
+    '''
+    parse_errors = []
+    for field, dtype in NUMERIC_DTYPES.items():
+        if field not in film_data_df.columns:
+            continue
+        scraped = film_data_df[field]
+        text = scraped.astype('string').str.strip()
+        present = (text.notna() & (text != '')).fillna(False)
+        if field == 'runtime':
+            text = text.str.extract(r'^([\d,.]+)', expand=False)
+        parsed = pd.to_numeric(text.str.replace(',', '', regex=False), errors='coerce')
+        if dtype.startswith('Int'):
+            # Casting a fractional value to an integer dtype would raise, so it is treated as unparseable.
+            parsed = parsed.where(parsed % 1 == 0)
+        cleaned = parsed.astype(dtype)
+        failed = cleaned.isna() & (present | (field not in NULLABLE_FIELDS))
+        for index in failed[failed].index:
+            value = scraped[index]
+            parse_errors.append({'friendly_id': film_data_df.at[index, 'friendly_id'] if 'friendly_id' in film_data_df.columns else None,
+                                 'field': field, 'value': None if pd.isna(value) else value})
+        film_data_df[field] = cleaned
+    if 'director' in film_data_df.columns:
+        directors = film_data_df['director']
+        is_list = directors.map(lambda director: isinstance(director, list))
+        if is_list.any():
+            film_data_df.loc[is_list, 'director'] = directors[is_list].str.join(', ')
+    return parse_errors
+
+
+def clean_batch(film_data_dic_list: list) -> tuple:
+    '''
+    Cleans a batch of scraped film dictionaries, which may hold any subset of the film fields, e.g. only the stats of a refresh.
+    Parameters
+    ----------
+    film_data_dic_list: list of dict
+        The scraped data of each film.
+
+    Returns
+    -------
+    film_data_dic_list: list of dict
+        The cleaned data of each film with the same keys, in the same order, using plain python values and None for missing values.
+    parse_errors: list of dict
+        The values that could not be parsed, see help(clean_columns).
+    '''
+    if len(film_data_dic_list) == 0:
+        return [], []
+    film_data_df = pd.DataFrame.from_records(film_data_dic_list)
+    parse_errors = clean_columns(film_data_df)
+    cleaned_columns = {}
+    for field in list(NUMERIC_DTYPES) + ['director']:
+        if field in film_data_df.columns:
+            column = film_data_df[field]
+            cleaned_columns[field] = column.astype(object).where(column.notna(), None).tolist()
+    cleaned_list = []
+    for index, film_data_dic in enumerate(film_data_dic_list):
+        cleaned = dict(film_data_dic)
+        for field, values in cleaned_columns.items():
+            if field in film_data_dic:
+                cleaned[field] = values[index]
+        cleaned_list.append(cleaned)
+    return cleaned_list, parse_errors
+
+
+def clean_film_batch(film_data_dic_list: list) -> tuple:
+    '''
+    Cleans a batch of scraped films into typed film records.
+    Parameters
+    ----------
+    film_data_dic_list: list of dict
+        The scraped data of each film.
+
+    Returns
+    -------
+    records: list of film_record
+        The cleaned data of each film, in the same order.
+    parse_errors: list of dict
+        The values that could not be parsed, see help(clean_columns).
+    '''
+    cleaned_list, parse_errors = clean_batch(film_data_dic_list)
+    return [film_record.from_dict(film_data_dic) for film_data_dic in cleaned_list], parse_errors
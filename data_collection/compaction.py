@@ -0,0 +1,293 @@
+'''
+Compacts the film data exported by past runs into one deduplicated, sorted Parquet snapshot.
+
+The .csv file and database table written by the scraper gain a row every time a film is scraped again, and rows written one DataFrame at a time do not agree on their dtypes.
+Exports are streamed in chunks, typed with the same cleaning as new scrapes and spilled to disk by the first character of 'friendly_id', so that only one chunk and one partition are held in memory at a time.
+
+    python -m data_collection.compaction --csv film_data.csv --database-url sqlite:///film_data.db --history
+'''
+from data_collection.cleaning import clean_columns
+from data_collection.http_engine import STATS_FIELDS
+from data_collection.tabular_sinks import FILM_DATA_SCHEMA
+from sqlalchemy import create_engine, text
+import argparse
+import bisect
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import shutil
+import tempfile
+import uuid
+
+
+HISTORY_SCHEMA = pa.schema([FILM_DATA_SCHEMA.field(name) for name in ['friendly_id', 'data_obtained_time'] + STATS_FIELDS])
+INDEX_SCHEMA = pa.schema([('year', pa.int32()), ('rating', pa.float64()), ('row', pa.int64())])
+SNAPSHOT_FILES = {'films': 'films.parquet', 'index': 'year_rating_index.parquet', 'history': 'history.parquet'}
+
+
+def read_csv_chunks(path: str, chunk_rows: int = 50000):
+    '''
+    Yields the rows of a .csv export as DataFrames of up to chunk_rows rows, with every value read as text.
+    '''
+    # Reading every column as text keeps chunks consistent when the file mixes rows written with different dtypes.
+    with pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[''], chunksize=chunk_rows) as chunks:
+        for chunk in chunks:
+            yield chunk
+
+
+def read_table_chunks(engine, table_name: str = 'film_data', chunk_rows: int = 50000):
+    '''
+    Yields the rows of a database table as DataFrames of up to chunk_rows rows, streamed from the database with a server-side cursor where it has one.
+    '''
+    with engine.connect().execution_options(stream_results=True) as connection:
+        for chunk in pd.read_sql_query(text(f'SELECT * FROM {table_name}'), connection, chunksize=chunk_rows):
+            yield chunk
+
+
+def typed_chunk(film_data_df: pd.DataFrame) -> pa.Table:
+    '''
+    Converts a chunk of exported rows to a table matching FILM_DATA_SCHEMA.
+    Values that cannot be parsed become nulls, columns missing from the export are null and rows without a 'friendly_id' are dropped.
+    '''
+    film_data_df = film_data_df.reindex(columns=FILM_DATA_SCHEMA.names)
+    film_data_df = film_data_df[film_data_df['friendly_id'].notna() & (film_data_df['friendly_id'].astype(str) != '')].copy()
+    clean_columns(film_data_df)
+    film_data_df['data_obtained_time'] = pd.to_datetime(film_data_df['data_obtained_time'], errors='coerce')
+    for field in FILM_DATA_SCHEMA:
+        if pa.types.is_string(field.type):
+            column = film_data_df[field.name]
+            film_data_df[field.name] = column.astype(object).where(column.notna(), None).map(lambda value: value if value is None else str(value))
+    return pa.Table.from_pandas(film_data_df, schema=FILM_DATA_SCHEMA, preserve_index=False)
+
+
+def last_of_runs(table: pa.Table, keys: list) -> pa.Array:
+    '''
+    Returns a mask of the rows of a table sorted by keys that are the last of their run of equal keys, treating two nulls as equal.
+    '''
+    if table.num_rows == 0:
+        return pa.array([], pa.bool_())
+    same_as_next = pa.array([True] * (table.num_rows - 1), pa.bool_())
+    for key in keys:
+        column = table.column(key).combine_chunks()
+        current, following = column.slice(0, table.num_rows - 1), column.slice(1)
+        equal = pc.or_(pc.fill_null(pc.equal(current, following), False), pc.and_(pc.is_null(current), pc.is_null(following)))
+        same_as_next = pc.and_(same_as_next, equal)
+    return pa.concat_arrays([pc.invert(same_as_next), pa.array([True])])
+
+
+def partition_name(friendly_id: str) -> str:
+    # Partitions named by the code point of the first character sort in the same order as the ids in them.
+    return f'{ord(friendly_id[0]):06x}'
+
+
+class film_data_compactor:
+    '''
+    Builds a snapshot holding the latest row of every film, sorted by 'friendly_id', from any number of exports.
+    The snapshot directory contains 'films.parquet', whose row group statistics let a film be found by reading a single row group, and 'year_rating_index.parquet', the row of every film sorted by 'year' and 'rating' so that a range of either is found without scanning the films.
+    With history, 'history.parquet' also keeps every distinct snapshot of each film's stats, sorted by 'friendly_id' and 'data_obtained_time'.
+
+    Attributes
+    ----------
+    output_dir: str
+        The directory the snapshot is written to, replacing any previous snapshot once it is complete (equal to output_dir parameter).
+    chunk_rows: int
+        The number of rows read from an export at a time (equal to chunk_rows parameter).
+    row_group_rows: int
+        The number of rows in each row group of the snapshot (equal to row_group_rows parameter).
+    history: bool
+        Whether the stats history table is written (equal to history parameter).
+    rows_read: int
+        The number of rows read from the exports so far.
+    '''
+    def __init__(self, output_dir: str = 'film_data_snapshot', chunk_rows: int = 50000, row_group_rows: int = 10000, history: bool = False):
+        '''
+        See help(film_data_compactor) for accurate signature.
+        '''
+        self.output_dir = output_dir
+        self.chunk_rows = chunk_rows
+        self.row_group_rows = row_group_rows
+        self.history = history
+        self.rows_read = 0
+        self.__spill_dir = None
+
+    def add_chunks(self, chunks):
+        '''
+        Spills chunks of exported rows to disk, split by partition.
+        Parameters
+        ----------
+        chunks: iterable of pandas.DataFrame
+            Exported rows, e.g. from read_csv_chunks or read_table_chunks.
+        '''
+        for chunk in chunks:
+            self.rows_read += len(chunk)
+            table = typed_chunk(chunk)
+            if table.num_rows == 0:
+                continue
+            if self.__spill_dir is None:
+                self.__spill_dir = tempfile.mkdtemp(prefix='film_data_spill-', dir=os.path.dirname(os.path.abspath(self.output_dir)))
+            partitions = pd.Series(table.column('friendly_id').to_pylist()).map(partition_name)
+            spill_id = uuid.uuid4().hex
+            for name, positions in partitions.groupby(partitions).indices.items():
+                partition_dir = os.path.join(self.__spill_dir, name)
+                os.makedirs(partition_dir, exist_ok=True)
+                pq.write_table(table.take(positions), os.path.join(partition_dir, f'{spill_id}.parquet'))
+
+    def add_csv(self, path: str):
+        self.add_chunks(read_csv_chunks(path, self.chunk_rows))
+
+    def add_table(self, engine, table_name: str = 'film_data'):
+        self.add_chunks(read_table_chunks(engine, table_name, self.chunk_rows))
+
+    def compact(self) -> dict:
+        '''
+        Deduplicates each partition in turn and writes the snapshot.
+
+        Returns
+        -------
+        dict
+            The 'rows_read', the number of 'films' kept, the number of 'duplicates_dropped' and the number of 'history_rows' written.
+        '''
+        build_dir = f'{self.output_dir}.part'
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+        films_writer = pq.ParquetWriter(os.path.join(build_dir, SNAPSHOT_FILES['films']), FILM_DATA_SCHEMA, compression='snappy')
+        history_writer = None
+        if self.history:
+            history_writer = pq.ParquetWriter(os.path.join(build_dir, SNAPSHOT_FILES['history']), HISTORY_SCHEMA, compression='snappy')
+        films, history_rows, index_tables = 0, 0, []
+        for name in sorted(os.listdir(self.__spill_dir)) if self.__spill_dir is not None else []:
+            partition = pq.read_table(os.path.join(self.__spill_dir, name), schema=FILM_DATA_SCHEMA)
+            # Rows without a 'data_obtained_time' sort first, so any timestamped row of the same film is kept over them.
+            partition = partition.take(pc.sort_indices(partition, sort_keys=[('friendly_id', 'ascending'), ('data_obtained_time', 'ascending')],
+                                                       null_placement='at_start'))
+            latest = partition.filter(last_of_runs(partition, ['friendly_id']))
+            films_writer.write_table(latest, row_group_size=self.row_group_rows)
+            index_tables.append(pa.table({'year': latest.column('year'), 'rating': latest.column('rating'),
+                                          'row': pa.array(range(films, films + latest.num_rows), pa.int64())}, schema=INDEX_SCHEMA))
+            films += latest.num_rows
+            if history_writer is not None:
+                history = partition.select(HISTORY_SCHEMA.names)
+                history = history.filter(last_of_runs(history, ['friendly_id', 'data_obtained_time']))
+                history_writer.write_table(history, row_group_size=self.row_group_rows)
+                history_rows += history.num_rows
+        films_writer.close()
+        if history_writer is not None:
+            history_writer.close()
+        # The index holds three numbers per film, so it is sorted in memory.
+        index = pa.concat_tables(index_tables) if len(index_tables) > 0 else INDEX_SCHEMA.empty_table()
+        index = index.sort_by([('year', 'ascending'), ('rating', 'ascending')])
+        pq.write_table(index, os.path.join(build_dir, SNAPSHOT_FILES['index']), row_group_size=self.row_group_rows)
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.output_dir)
+        os.replace(build_dir, self.output_dir)
+        if self.__spill_dir is not None:
+            shutil.rmtree(self.__spill_dir, ignore_errors=True)
+            self.__spill_dir = None
+        return {'rows_read': self.rows_read, 'films': films, 'duplicates_dropped': self.rows_read - films, 'history_rows': history_rows}
+
+
+class film_data_snapshot:
+    '''
+    Reads a snapshot written by film_data_compactor, touching only the row groups a lookup needs.
+
+    Attributes
+    ----------
+    snapshot_dir: str
+        The directory of the snapshot (equal to snapshot_dir parameter).
+    '''
+    def __init__(self, snapshot_dir: str = 'film_data_snapshot'):
+        '''
+        See help(film_data_snapshot) for accurate signature.
+        '''
+        self.snapshot_dir = snapshot_dir
+        self.__films = pq.ParquetFile(os.path.join(snapshot_dir, SNAPSHOT_FILES['films']), memory_map=True)
+        id_column = FILM_DATA_SCHEMA.get_field_index('friendly_id')
+        self.__max_ids, self.__first_rows = [], []
+        first_row = 0
+        for row_group in range(self.__films.metadata.num_row_groups):
+            metadata = self.__films.metadata.row_group(row_group)
+            self.__max_ids.append(metadata.column(id_column).statistics.max)
+            self.__first_rows.append(first_row)
+            first_row += metadata.num_rows
+
+    def __len__(self) -> int:
+        return self.__films.metadata.num_rows
+
+    def get(self, friendly_id: str) -> dict:
+        '''
+        Returns the latest row of a film, or None if it is not in the snapshot.
+        '''
+        row_group = bisect.bisect_left(self.__max_ids, friendly_id)
+        if row_group == len(self.__max_ids):
+            return None
+        ids = self.__films.read_row_group(row_group, columns=['friendly_id']).column('friendly_id').to_pylist()
+        position = bisect.bisect_left(ids, friendly_id)
+        if position == len(ids) or ids[position] != friendly_id:
+            return None
+        return self.__films.read_row_group(row_group).slice(position, 1).to_pylist()[0]
+
+    def query(self, year: tuple = None, rating: tuple = None) -> pd.DataFrame:
+        '''
+        Returns the films whose year and rating are within inclusive ranges, sorted by 'friendly_id'.
+        Parameters
+        ----------
+        year: tuple or None
+            The lowest and highest year, either of which may be None, or None for any year.
+        rating: tuple or None
+            The lowest and highest rating, either of which may be None, or None for any rating.
+        '''
+        filters = []
+        for field, bounds in (('year', year), ('rating', rating)):
+            if bounds is not None:
+                low, high = bounds
+                if low is not None:
+                    filters.append((field, '>=', low))
+                if high is not None:
+                    filters.append((field, '<=', high))
+        index = pq.read_table(os.path.join(self.snapshot_dir, SNAPSHOT_FILES['index']), filters=filters or None)
+        rows = sorted(index.column('row').to_pylist())
+        tables = []
+        position = 0
+        while position < len(rows):
+            row_group = bisect.bisect_right(self.__first_rows, rows[position]) - 1
+            group_end = self.__first_rows[row_group + 1] if row_group + 1 < len(self.__first_rows) else len(self)
+            end = bisect.bisect_left(rows, group_end, position)
+            offsets = [row - self.__first_rows[row_group] for row in rows[position:end]]
+            tables.append(self.__films.read_row_group(row_group).take(offsets))
+            position = end
+        if len(tables) == 0:
+            return FILM_DATA_SCHEMA.empty_table().to_pandas()
+        return pa.concat_tables(tables).to_pandas()
+
+    def history(self, friendly_id: str) -> pd.DataFrame:
+        '''
+        Returns every stats snapshot of a film, oldest first. The snapshot must have been written with history.
+        '''
+        return pq.read_table(os.path.join(self.snapshot_dir, SNAPSHOT_FILES['history']), filters=[('friendly_id', '=', friendly_id)]).to_pandas()
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m data_collection.compaction', description='Compact film data exports into a deduplicated, sorted Parquet snapshot.')
+    parser.add_argument('--csv', action='append', default=[], help='a .csv export to compact, may be given more than once')
+    parser.add_argument('--database-url', default=os.environ.get('DATABASE_URL'), help='the database whose table is compacted (DATABASE_URL)')
+    parser.add_argument('--table', default='film_data', help='the table read from the database')
+    parser.add_argument('--output', default='film_data_snapshot', help='the directory the snapshot is written to')
+    parser.add_argument('--history', action=argparse.BooleanOptionalAction, default=False, help='also write every distinct stats snapshot of each film')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='the number of rows read at a time')
+    parser.add_argument('--row-group-rows', type=int, default=10000, help='the number of rows in each row group of the snapshot')
+    args = parser.parse_args(argv)
+    if len(args.csv) == 0 and args.database_url is None:
+        parser.error('give at least one --csv export or a --database-url')
+    compactor = film_data_compactor(args.output, chunk_rows=args.chunk_rows, row_group_rows=args.row_group_rows, history=args.history)
+    for path in args.csv:
+        compactor.add_csv(path)
+    if args.database_url is not None:
+        compactor.add_table(create_engine(args.database_url), args.table)
+    print(compactor.compact())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,167 @@
+import argparse
+import os
+
+
+def env_flag(environ, name: str, default: bool = False) -> bool:
+    '''
+    Reads a boolean setting from an environment variable, where '1', 'true', 'yes' and 'y' mean True.
+    '''
+    value = environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def parse_concurrency(setting: str) -> dict:
+    '''
+    Parses a pipeline concurrency setting of the form 'stage=workers,stage=workers'.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each stage name to its number of workers.
+    '''
+    concurrency = {}
+    for stage_setting in filter(None, setting.split(',')):
+        stage, workers = stage_setting.split('=')
+        concurrency[stage.strip()] = int(workers)
+    return concurrency
+
+
+def parse_timeouts(setting: str) -> dict:
+    '''
+    Parses a timeout setting of the form 'step=seconds,step=seconds'.
+
+    Returns
+    -------
+    dict
+        A dictionary mapping each step to its timeout in seconds.
+    '''
+    timeouts = {}
+    for step_setting in filter(None, setting.split(',')):
+        step, seconds = step_setting.split('=')
+        timeouts[step.strip()] = float(seconds)
+    return timeouts
+
+
+def parse_run_config(argv: list = None, environ: dict = None) -> argparse.Namespace:
+    '''
+    Reads the settings for a run of the scraper from command line flags, falling back to environment variables and then to the defaults.
+    In batch mode the start page and number of pages must be given, and nothing is prompted for.
+    Parameters
+    ----------
+    argv: list
+        The command line arguments, or None to use sys.argv.
+    environ: dict
+        The environment variables, or None to use os.environ.
+
+    Returns
+    -------
+    argparse.Namespace
+        The settings, with one attribute per flag.
+    '''
+    if environ is None:
+        environ = os.environ
+    parser = argparse.ArgumentParser(prog='python -m data_collection.scraper', description="Scrape film data from letterboxd.com's popular section.")
+    parser.add_argument('--batch', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'BATCH_MODE'),
+                        help='run without prompts, checkpointing progress so that a restarted run resumes (BATCH_MODE)')
+    parser.add_argument('--start-page', type=int, default=int(environ['START_PAGE']) if 'START_PAGE' in environ else None,
+                        help='the first page of the popular section to scrape (START_PAGE)')
+    parser.add_argument('--pages', type=int, default=int(environ['PAGES']) if 'PAGES' in environ else None,
+                        help='the number of pages to scrape (PAGES)')
+    parser.add_argument('--frontier', default=environ.get('FRONTIER_PATH', 'crawl_frontier.sqlite'),
+                        help='the SQLite checkpoint used in batch mode (FRONTIER_PATH)')
+    parser.add_argument('--distributed', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'DISTRIBUTED'),
+                        help='claim page ranges from a lease table shared with other scraper instances, without prompts (DISTRIBUTED)')
+    parser.add_argument('--lease-database-url', default=environ.get('LEASE_DATABASE_URL'),
+                        help='the database holding the lease table, the film database if not given (LEASE_DATABASE_URL)')
+    parser.add_argument('--lease-ttl', type=float, default=float(environ.get('LEASE_TTL', 300)),
+                        help='the number of seconds a lease lasts unless its worker renews it (LEASE_TTL)')
+    parser.add_argument('--pages-per-lease', type=int, default=int(environ.get('PAGES_PER_LEASE', 5)),
+                        help='the number of pages in each leased page range (PAGES_PER_LEASE)')
+    parser.add_argument('--lease-links', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'LEASE_LINKS'),
+                        help='split leased page ranges into one lease per film link (LEASE_LINKS)')
+    parser.add_argument('--worker-id', default=environ.get('WORKER_ID'),
+                        help='the id this instance records on its leases, the host name and process id if not given (WORKER_ID)')
+    parser.add_argument('--s3', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'STORE_S3', True),
+                        help='store raw data in the s3 bucket (STORE_S3)')
+    parser.add_argument('--keep-raw-data', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'KEEP_RAW_DATA', True),
+                        help='keep a local copy of raw data (KEEP_RAW_DATA)')
+    parser.add_argument('--rds', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'STORE_RDS', True),
+                        help='store tabular data in the RDS database (STORE_RDS)')
+    parser.add_argument('--csv', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'SAVE_CSV'),
+                        help='save tabular data as .csv (SAVE_CSV)')
+    parser.add_argument('--parquet', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'SAVE_PARQUET'),
+                        help='save tabular data as .parquet (SAVE_PARQUET)')
+    parser.add_argument('--engine', choices=['selenium', 'http'], default=environ.get('SCRAPE_ENGINE', 'selenium'),
+                        help='the engine used to scrape film entries (SCRAPE_ENGINE)')
+    parser.add_argument('--workers', type=int, default=int(environ.get('SCRAPER_WORKERS', 1)),
+                        help='the number of film entries scraped concurrently (SCRAPER_WORKERS)')
+    parser.add_argument('--dom-extraction', choices=['elements', 'script'], default=environ.get('DOM_EXTRACTION', 'elements'),
+                        help='how data is read from pages loaded in the browser (DOM_EXTRACTION)')
+    parser.add_argument('--bloom-filter', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'DEDUP_BLOOM_FILTER'),
+                        help='hold the ids of stored films in a bloom filter (DEDUP_BLOOM_FILTER)')
+    parser.add_argument('--rds-batch-size', type=int, default=int(environ.get('RDS_BATCH_SIZE', 50)),
+                        help='the number of rows written to the RDS database at once (RDS_BATCH_SIZE)')
+    parser.add_argument('--rds-upsert', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'RDS_UPSERT'),
+                        help="update stored rows with the same 'friendly_id' (RDS_UPSERT)")
+    parser.add_argument('--s3-batch-records', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'S3_BATCH_RECORDS'),
+                        help='upload the JSON records of each page as one object (S3_BATCH_RECORDS)')
+    parser.add_argument('--raw-archive-dir', default=environ.get('RAW_ARCHIVE_DIR'),
+                        help='keep raw data in append-only segment files in this directory instead of a directory per film (RAW_ARCHIVE_DIR)')
+    parser.add_argument('--raw-segment-mb', type=float, default=float(environ.get('RAW_SEGMENT_MB', 64)),
+                        help='the size in megabytes at which a raw data segment is sealed and shipped (RAW_SEGMENT_MB)')
+    parser.add_argument('--spool-path', default=environ.get('STORAGE_SPOOL_PATH'),
+                        help='commit films to a durable spool at this path and store them from background threads (STORAGE_SPOOL_PATH)')
+    parser.add_argument('--page-fingerprints', default=environ.get('PAGE_FINGERPRINTS_PATH'),
+                        help='skip popular pages unchanged since the last crawl and track film ranks in this SQLite database (PAGE_FINGERPRINTS_PATH)')
+    parser.add_argument('--films-per-page', type=int, default=int(environ.get('FILMS_PER_PAGE', 72)),
+                        help='the number of films listed on each popular page, used to rank films (FILMS_PER_PAGE)')
+    parser.add_argument('--rank-report', default=environ.get('RANK_REPORT_PATH', 'rank_changes.jsonl'),
+                        help='the JSON Lines file the rank changes of each run are appended to (RANK_REPORT_PATH)')
+    parser.add_argument('--page-cache-dir', default=environ.get('PAGE_CACHE_DIR'),
+                        help='the directory of the on-disk page cache (PAGE_CACHE_DIR)')
+    parser.add_argument('--page-cache-replay', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'PAGE_CACHE_REPLAY'),
+                        help='serve every page from the page cache (PAGE_CACHE_REPLAY)')
+    parser.add_argument('--pipeline', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'PIPELINE'),
+                        help='run the scrape as a staged pipeline (PIPELINE)')
+    parser.add_argument('--pipeline-concurrency', type=parse_concurrency, default=parse_concurrency(environ.get('PIPELINE_CONCURRENCY', '')),
+                        help="the number of workers per pipeline stage, e.g. 'fetch=4,raw_storage=2' (PIPELINE_CONCURRENCY)")
+    parser.add_argument('--refresh-stats', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'REFRESH_STATS'),
+                        help='refresh the stats of stored films instead of scraping new ones (REFRESH_STATS)')
+    parser.add_argument('--refresh-budget', type=int, default=int(environ.get('REFRESH_BUDGET', 100)),
+                        help='the maximum number of films refreshed in one run (REFRESH_BUDGET)')
+    parser.add_argument('--lean-browser', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'LEAN_BROWSER'),
+                        help='block images, media, fonts and ad and tracker hosts in the browser and stop page loads once the DOM is ready (LEAN_BROWSER)')
+    parser.add_argument('--browser-profile-dir', default=environ.get('BROWSER_PROFILE_DIR'),
+                        help='a directory of Firefox profiles reused between runs to start the browser faster (BROWSER_PROFILE_DIR)')
+    parser.add_argument('--politeness-delay', type=float, default=float(environ.get('POLITENESS_DELAY', 1)),
+                        help='the number of seconds between requests at the start of a run, adapted as the site responds, or 0 for no limit (POLITENESS_DELAY)')
+    parser.add_argument('--max-attempts', type=int, default=int(environ.get('MAX_ATTEMPTS', 3)),
+                        help='the number of times a page that times out or is throttled is tried, and a failed link is tried by the crawl frontier (MAX_ATTEMPTS)')
+    parser.add_argument('--timeouts', type=parse_timeouts, default=parse_timeouts(environ.get('TIMEOUTS', '')),
+                        help="the number of seconds to wait per step, e.g. 'page_load=30,element=10,cookies=10,http=10' (TIMEOUTS)")
+    parser.add_argument('--dead-letters', default=environ.get('DEAD_LETTER_PATH', 'dead_letters.jsonl'),
+                        help='the JSON Lines file the links that could not be scraped are appended to (DEAD_LETTER_PATH)')
+    parser.add_argument('--metrics', action=argparse.BooleanOptionalAction, default=env_flag(environ, 'METRICS'),
+                        help='time each step of the scrape and count films, timeouts and bytes downloaded (METRICS)')
+    parser.add_argument('--metrics-port', type=int, default=int(environ['METRICS_PORT']) if 'METRICS_PORT' in environ else None,
+                        help='serve the metrics in the Prometheus text format on this port at /metrics (METRICS_PORT)')
+    parser.add_argument('--metrics-summary', default=environ.get('METRICS_SUMMARY', 'metrics_summary.json'),
+                        help='the JSON file the metrics are summarised in at the end of the run (METRICS_SUMMARY)')
+    config = parser.parse_args(argv)
+    if config.metrics_port is not None:
+        config.metrics = True
+    if config.batch and not config.refresh_stats and (config.start_page is None or config.pages is None):
+        parser.error('batch mode needs --start-page and --pages (or START_PAGE and PAGES)')
+    if config.distributed and (config.start_page is None or config.pages is None):
+        parser.error('distributed mode needs --start-page and --pages (or START_PAGE and PAGES)')
+    if config.lease_ttl <= 0:
+        parser.error('--lease-ttl must be positive')
+    if config.politeness_delay < 0:
+        parser.error('--politeness-delay cannot be negative')
+    for name in ['start_page', 'pages', 'workers', 'max_attempts', 'pages_per_lease', 'films_per_page']:
+        value = getattr(config, name)
+        if value is not None and value < 1:
+            parser.error(f"--{name.replace('_', '-')} must be a positive integer")
+    return config
@@ -0,0 +1,124 @@
+from sqlalchemy import Column, MetaData, Table, Text, inspect, select
+import hashlib
+import math
+
+
+class bloom_filter:
+    '''
+    A compact probabilistic set of strings. Membership tests can return false positives but never false negatives.
+
+    Attributes
+    ----------
+    n_bits: int
+        The number of bits in the filter, sized from the capacity and error_rate parameters.
+    n_hashes: int
+        The number of bit positions set for each item.
+    '''
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.01):
+        '''
+        See help(bloom_filter) for accurate signature.
+        '''
+        self.n_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.n_hashes = max(1, round(self.n_bits / capacity * math.log(2)))
+        self.__bits = bytearray((self.n_bits + 7) // 8)
+
+    def __positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        hash_1 = int.from_bytes(digest[:8], 'little')
+        hash_2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(hash_1 + i * hash_2) % self.n_bits for i in range(self.n_hashes)]
+
+    def add(self, item: str):
+        for position in self.__positions(item):
+            self.__bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.__bits[position // 8] & (1 << (position % 8)) for position in self.__positions(item))
+
+
+class scraped_link_index:
+    '''
+    An in-memory index of the 'friendly_id's already stored in the film_data table, used to decide which links to skip.
+    All known ids are loaded with a single query the first time the index is used. With use_bloom_filter the ids are held in a bloom filter instead of a set and possible matches are confirmed with one query per batch of links.
+
+    Attributes
+    ----------
+    engine: sqlalchemy database connection
+        The database containing the film_data table (equal to engine parameter).
+    table_name: str
+        The name of the table containing scraped film data (equal to table_name parameter).
+    use_bloom_filter: bool
+        Whether known ids are held in a bloom filter rather than a set (equal to use_bloom_filter parameter).
+    loaded: bool
+        Whether the known ids have been loaded from the database.
+    '''
+    def __init__(self, engine, table_name: str = 'film_data', use_bloom_filter: bool = False, expected_items: int = 1000000):
+        '''
+        See help(scraped_link_index) for accurate signature.
+        '''
+        self.engine = engine
+        self.table_name = table_name
+        self.use_bloom_filter = use_bloom_filter
+        self.loaded = False
+        self.__added_ids = set()
+        self.__table = Table(table_name, MetaData(), Column('friendly_id', Text))
+        if use_bloom_filter:
+            self.__known_ids = bloom_filter(expected_items)
+        else:
+            self.__known_ids = set()
+
+    def __table_exists(self) -> bool:
+        return inspect(self.engine).has_table(self.table_name)
+
+    def load(self):
+        '''
+        Loads every 'friendly_id' in the table into the index with a single query.
+        '''
+        if self.__table_exists():
+            with self.engine.connect() as connection:
+                for (friendly_id,) in connection.execute(select(self.__table.c.friendly_id)):
+                    self.__known_ids.add(friendly_id)
+        self.loaded = True
+
+    def add(self, friendly_id: str):
+        '''
+        Records that a film has been stored.
+        Parameters
+        ----------
+        friendly_id: str
+            The 'friendly_id' of the stored film.
+        '''
+        self.__known_ids.add(friendly_id)
+        if self.use_bloom_filter:
+            # Films stored this run may not be visible to the confirming query yet.
+            self.__added_ids.add(friendly_id)
+
+    def filter_scraped(self, friendly_ids: list) -> set:
+        '''
+        Returns the ids in a batch that have already been stored.
+        This needs no queries once the index is loaded, or one query for the possible matches when a bloom filter is used.
+        Parameters
+        ----------
+        friendly_ids: list
+            A list of 'friendly_id's to check.
+
+        Returns
+        -------
+        set
+            The ids from friendly_ids that are already stored.
+        '''
+        if not self.loaded:
+            self.load()
+        candidates = {friendly_id for friendly_id in friendly_ids if friendly_id in self.__known_ids}
+        if not self.use_bloom_filter:
+            return candidates
+        unconfirmed = candidates - self.__added_ids
+        if len(unconfirmed) == 0:
+            return candidates
+        statement = select(self.__table.c.friendly_id).where(self.__table.c.friendly_id.in_(sorted(unconfirmed)))
+        with self.engine.connect() as connection:
+            confirmed = {friendly_id for (friendly_id,) in connection.execute(statement)}
+        return confirmed | (candidates & self.__added_ids)
+
+    def __contains__(self, friendly_id: str) -> bool:
+        return len(self.filter_scraped([friendly_id])) > 0
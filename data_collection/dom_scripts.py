@@ -0,0 +1,81 @@
+# JavaScript run with execute_script to read a whole page in one webdriver round trip.
+# Each script returns null while the page is still loading, so it can be polled by a single WebDriverWait.
+
+FILM_LINKS_SCRIPT = '''
+var items = document.evaluate('//*[@class="poster-list -p70 -grid"]/li', document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+if (items.snapshotLength === 0) {
+    return null;
+}
+var links = [];
+for (var i = 0; i < items.snapshotLength; i++) {
+    var item = items.snapshotItem(i);
+    var a_tag = item.querySelector('a');
+    if (a_tag !== null) {
+        links.push(a_tag.href);
+        continue;
+    }
+    var poster = item.querySelector('[data-target-link]');
+    if (poster === null) {
+        return null;
+    }
+    links.push(new URL(poster.getAttribute('data-target-link'), document.baseURI).href);
+}
+return links;
+'''
+
+FILM_DATA_SCRIPT = '''
+function node(xpath, context) {
+    return document.evaluate(xpath, context || document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function visible_text(element) {
+    return element.innerText.replace(/\\u00a0/g, ' ').trim();
+}
+function text(xpath) {
+    var element = node(xpath);
+    return element === null ? null : visible_text(element).split('  ')[0];
+}
+function stat(xpath) {
+    var element = node(xpath);
+    if (element === null) {
+        return null;
+    }
+    var title = element.getAttribute('data-original-title') || element.getAttribute('title');
+    return title ? title.replace(/\\u00a0/g, ' ').split(/\\s+/)[2] : null;
+}
+
+var data = {
+    title: text('//h1[@class="headline-1 js-widont prettify"]'),
+    year: text('//a[starts-with(@href,"/films/year/")]'),
+    runtime: text('//p[@class="text-link text-footer"]'),
+    rating: text('//a[starts-with(@class,"tooltip display-rating")]'),
+    watches: stat('//a[@class="has-icon icon-watched icon-16 tooltip"]'),
+    lists: stat('//a[@class="has-icon icon-list icon-16 tooltip"]'),
+    likes: stat('//a[@class="has-icon icon-like icon-liked icon-16 tooltip"]')
+};
+var director = node('//a[starts-with(@href,"/director/")]');
+var review = node('//div[@class="review body-text -prose -hero prettify"]');
+var poster = node('//div[starts-with(@class,"react-component poster")]//img');
+for (var key in data) {
+    if (data[key] === null) {
+        return null;
+    }
+}
+if (director === null || review === null || poster === null) {
+    return null;
+}
+
+var next_director = node('following-sibling::a', director);
+data.director = next_director === null ? visible_text(director) : [visible_text(director), visible_text(next_director)];
+data.top_250_position = text('//a[@class="has-icon icon-top250 icon-16 tooltip"]');
+var more_button = node('//span[@class="condense_control condense_control_more"]');
+var condensed = node('//div[@class="truncate condenseable"]');
+if (more_button !== null && condensed !== null) {
+    more_button.click();
+    data.description = visible_text(condensed).split('\\u00d7')[0].trim();
+} else {
+    var paragraph = node('.//p', review);
+    data.description = paragraph === null ? '' : visible_text(paragraph);
+}
+data.poster_link = poster.src;
+return data;
+'''
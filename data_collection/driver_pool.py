@@ -0,0 +1,280 @@
+from selenium import webdriver
+from urllib.parse import quote
+import os
+import queue
+import threading
+
+
+BLOCKED_HOSTS = ['doubleclick.net', 'googlesyndication.com', 'googletagmanager.com', 'googletagservices.com', 'google-analytics.com',
+                 'adservice.google.com', 'fundingchoicesmessages.google.com', 'amazon-adsystem.com', 'adnxs.com', 'pubmatic.com',
+                 'rubiconproject.com', 'criteo.com', 'criteo.net', 'openx.net', 'casalemedia.com', 'quantserve.com', 'scorecardresearch.com',
+                 'moatads.com', 'facebook.net', 'connect.facebook.net', 'twitter.com', 'platform.twitter.com', 'sentry.io', 'newrelic.com']
+LEAN_PREFERENCES = {
+    # Images, media and web fonts are never read by the scraper.
+    'permissions.default.image': 2,
+    'media.autoplay.default': 5,
+    'media.autoplay.blocking_policy': 2,
+    'gfx.downloadable_fonts.enabled': False,
+    'browser.display.use_document_fonts': 0,
+    'privacy.trackingprotection.enabled': True,
+    'privacy.trackingprotection.socialtracking.enabled': True,
+    'privacy.trackingprotection.cryptomining.enabled': True,
+    'privacy.trackingprotection.fingerprinting.enabled': True,
+    'network.prefetch-next': False,
+    'network.dns.disablePrefetch': True,
+    'network.http.speculative-parallel-limit': 0,
+    'browser.shell.checkDefaultBrowser': False,
+    'browser.startup.homepage_override.mstone': 'ignore',
+    'browser.newtabpage.enabled': False,
+    'extensions.pocket.enabled': False,
+    'datareporting.policy.dataSubmissionEnabled': False,
+    'toolkit.telemetry.enabled': False,
+    'app.update.auto': False,
+}
+
+
+def blocked_hosts_pac(blocked_hosts: list = BLOCKED_HOSTS) -> str:
+    '''
+    Returns a proxy auto-config script that sends requests to the blocked hosts and their subdomains to a closed local port, so they fail at once.
+    '''
+    conditions = ' || '.join(f'host == "{host}" || dnsDomainIs(host, ".{host}")' for host in blocked_hosts)
+    return f'function FindProxyForURL(url, host) {{ if ({conditions}) return "PROXY 127.0.0.1:9"; return "DIRECT"; }}'
+
+
+def firefox_options(lean: bool = False, profile_dir: str = None):
+    '''
+    Returns the options of a headless Firefox webdriver.
+    Parameters
+    ----------
+    lean: bool
+        Whether to block images, media, web fonts and ad and tracker hosts, and to return from page loads once the DOM is ready instead of waiting for every resource.
+    profile_dir: str
+        A profile directory that Firefox uses in place, or None to start from a new temporary profile.
+
+    Returns
+    -------
+    selenium.webdriver.FirefoxOptions
+        The options passed to webdriver.Firefox.
+    '''
+    options = webdriver.FirefoxOptions()
+    options.add_argument("--headless")
+    options.add_argument("window-size=1920,1080")
+    if profile_dir is not None:
+        options.add_argument('-profile')
+        options.add_argument(profile_dir)
+    if lean:
+        options.page_load_strategy = 'eager'
+        for name, value in LEAN_PREFERENCES.items():
+            options.set_preference(name, value)
+        options.set_preference('network.proxy.type', 2)
+        options.set_preference('network.proxy.autoconfig_url', 'data:text/plain,' + quote(blocked_hosts_pac()))
+    return options
+
+
+class profile_directories:
+    '''
+    Firefox profile directories kept under a root directory and reused by successive webdrivers, so that Firefox starts from a warm profile instead of building a new one.
+    Each directory is used by one webdriver at a time, and only one process should use a root directory at once.
+
+    Attributes
+    ----------
+    root: str
+        The directory the profiles are kept in (equal to root parameter).
+    '''
+    def __init__(self, root: str):
+        '''
+        See help(profile_directories) for accurate signature.
+        '''
+        self.root = root
+        self.__free = []
+        self.__n_created = 0
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> str:
+        '''
+        Returns a profile directory that no other webdriver is using, preferring directories that have been used before.
+        '''
+        with self.__lock:
+            if len(self.__free) > 0:
+                return self.__free.pop()
+            profile_dir = os.path.join(self.root, f'profile-{self.__n_created}')
+            self.__n_created += 1
+        os.makedirs(profile_dir, exist_ok=True)
+        return profile_dir
+
+    def release(self, profile_dir: str):
+        '''
+        Makes a profile directory available again once its webdriver has quit.
+        '''
+        with self.__lock:
+            self.__free.append(profile_dir)
+
+
+class profile_firefox(webdriver.Firefox):
+    '''
+    A Firefox webdriver that runs in a directory from a profile_directories and hands the directory back when it quits.
+    '''
+    def __init__(self, profiles: profile_directories, profile_dir: str, options):
+        '''
+        See help(profile_firefox) for accurate signature.
+        '''
+        self.profiles = profiles
+        self.profile_dir = profile_dir
+        super().__init__(options=options)
+
+    def quit(self):
+        try:
+            super().quit()
+        finally:
+            self.profiles.release(self.profile_dir)
+
+
+def create_firefox_driver(lean: bool = False, profiles: profile_directories = None):
+    '''
+    Creates a headless Firefox webdriver instance.
+    Parameters
+    ----------
+    lean: bool
+        Whether to use the lean browser options, see help(firefox_options).
+    profiles: profile_directories
+        The profile directories to reuse, or None to start from a new temporary profile.
+
+    Returns
+    -------
+    driver: selenium webdriver instance
+        A driven headless firefox browser.
+    '''
+    if profiles is None:
+        return webdriver.Firefox(options=firefox_options(lean))
+    profile_dir = profiles.acquire()
+    try:
+        return profile_firefox(profiles, profile_dir, firefox_options(lean, profile_dir))
+    except Exception:
+        profiles.release(profile_dir)
+        raise
+
+
+class driver_pool:
+    '''
+    A bounded pool of webdriver instances shared between worker threads.
+    Drivers are created lazily, reused across films and recycled after a set number of pages or when they crash.
+
+    Attributes
+    ----------
+    size: int
+        The maximum number of drivers that can be open at once (equal to size parameter).
+    pages_per_driver: int
+        The number of pages a driver will load before it is quit and replaced (equal to pages_per_driver parameter).
+    driver_factory: callable
+        A function that returns a new webdriver instance.
+    on_new_driver: callable or None
+        A function called with each newly created driver before it is first handed out, e.g. to accept cookies.
+    '''
+    def __init__(self, size: int = 4, pages_per_driver: int = 50, driver_factory=create_firefox_driver, on_new_driver=None):
+        '''
+        See help(driver_pool) for accurate signature.
+        '''
+        if size < 1:
+            raise ValueError('size must be a positive integer')
+        self.size = size
+        self.pages_per_driver = pages_per_driver
+        self.driver_factory = driver_factory
+        self.on_new_driver = on_new_driver
+        self.__idle_drivers = queue.LifoQueue()
+        self.__page_counts = {}
+        self.__n_open = 0
+        self.__lock = threading.Lock()
+        self.__closed = False
+
+    def __new_driver(self):
+        driver = self.driver_factory()
+        try:
+            if self.on_new_driver is not None:
+                self.on_new_driver(driver)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
+
+    def __quit_driver(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def acquire(self):
+        '''
+        Takes a driver from the pool, creating a new one if fewer than 'size' drivers are open.
+        Blocks until a driver is released if the pool is full.
+
+        Returns
+        -------
+        driver: selenium webdriver instance
+            A driver reserved for the calling thread until it is released.
+        '''
+        while True:
+            with self.__lock:
+                if self.__closed:
+                    raise RuntimeError('driver_pool is closed')
+                create = self.__idle_drivers.empty() and self.__n_open < self.size
+                if create:
+                    self.__n_open += 1
+            if create:
+                break
+            driver = self.__idle_drivers.get()
+            if driver is not None:
+                return driver
+        try:
+            driver = self.__new_driver()
+        except Exception:
+            with self.__lock:
+                self.__n_open -= 1
+            raise
+        with self.__lock:
+            self.__page_counts[id(driver)] = 0
+        return driver
+
+    def release(self, driver, crashed: bool = False):
+        '''
+        Returns a driver to the pool after it has loaded a page.
+        The driver is quit instead if it crashed or has reached 'pages_per_driver' pages, freeing a slot for a fresh driver.
+        Parameters
+        ----------
+        driver: selenium webdriver instance
+            A driver previously returned by acquire.
+        crashed: bool
+            Whether the driver raised an error while it was in use.
+        '''
+        with self.__lock:
+            self.__page_counts[id(driver)] += 1
+            recycle = crashed or self.__closed or self.__page_counts[id(driver)] >= self.pages_per_driver
+            if recycle:
+                del self.__page_counts[id(driver)]
+                self.__n_open -= 1
+        if recycle:
+            self.__quit_driver(driver)
+            if not self.__closed:
+                # Wake any thread blocked in acquire so that it can create the replacement.
+                self.__idle_drivers.put(None)
+        else:
+            self.__idle_drivers.put(driver)
+
+    def close(self):
+        '''
+        Quits every idle driver and stops new drivers from being created.
+        '''
+        with self.__lock:
+            self.__closed = True
+        while True:
+            try:
+                driver = self.__idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            if driver is not None:
+                with self.__lock:
+                    self.__page_counts.pop(id(driver), None)
+                    self.__n_open -= 1
+                self.__quit_driver(driver)
+        # Wake any thread blocked in acquire so that it sees the pool is closed.
+        for _ in range(self.size):
+            self.__idle_drivers.put(None)
@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+
+
+class crawl_frontier:
+    '''
+    A checkpoint of a crawl of the 'popular' section, stored in a small SQLite database so that a restarted run resumes where it stopped.
+    Each page is recorded with the links listed on it the first time it is visited. Links are then marked 'skipped', 'done' or 'failed', and the page is marked done once all of its films are stored.
+
+    Attributes
+    ----------
+    path: str
+        The path of the SQLite database (equal to path parameter).
+    max_attempts: int
+        The number of times a failed link is tried before it is no longer returned as pending (equal to max_attempts parameter).
+    '''
+    def __init__(self, path: str = 'crawl_frontier.sqlite', max_attempts: int = 3):
+        '''
+        See help(crawl_frontier) for accurate signature.
+        '''
+        self.path = path
+        self.max_attempts = max_attempts
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS pages (page INTEGER PRIMARY KEY, done INTEGER NOT NULL DEFAULT 0)')
+        self.__db.execute('''CREATE TABLE IF NOT EXISTS links (
+                                 link TEXT PRIMARY KEY,
+                                 page INTEGER NOT NULL,
+                                 position INTEGER NOT NULL,
+                                 status TEXT NOT NULL DEFAULT 'pending',
+                                 attempts INTEGER NOT NULL DEFAULT 0)''')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS links_page ON links (page, status)')
+        self.__db.commit()
+
+    def has_page(self, page: int) -> bool:
+        '''
+        Returns whether the links on a page have already been recorded.
+        '''
+        with self.__lock:
+            return self.__db.execute('SELECT 1 FROM pages WHERE page = ?', (page,)).fetchone() is not None
+
+    def is_page_done(self, page: int) -> bool:
+        '''
+        Returns whether every film on a page has been stored.
+        '''
+        with self.__lock:
+            return self.__db.execute('SELECT 1 FROM pages WHERE page = ? AND done = 1', (page,)).fetchone() is not None
+
+    def add_page(self, page: int, link_list: list):
+        '''
+        Records the links listed on a page as pending, in a single transaction.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+        link_list: list
+            The links to film entries on the page, in the order they are listed.
+        '''
+        with self.__lock, self.__db:
+            self.__db.execute('INSERT OR IGNORE INTO pages (page) VALUES (?)', (page,))
+            # A film that moved to a later page while the crawl was running keeps its first entry.
+            self.__db.executemany('INSERT OR IGNORE INTO links (link, page, position) VALUES (?, ?, ?)',
+                                  [(link, page, position) for position, link in enumerate(link_list)])
+
+    def pending_links(self, page: int) -> list:
+        '''
+        Returns the links on a page that still need to be scraped, including failed links with attempts left.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+
+        Returns
+        -------
+        list
+            The links in the order they were listed on the page.
+        '''
+        with self.__lock:
+            rows = self.__db.execute("SELECT link FROM links WHERE page = ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?)) ORDER BY position",
+                                     (page, self.max_attempts))
+            return [link for (link,) in rows]
+
+    def mark_skipped(self, link_list: list):
+        '''
+        Marks links whose films are already in the database, so they are not checked again.
+        Parameters
+        ----------
+        link_list: list
+            The links to mark as 'skipped'.
+        '''
+        with self.__lock, self.__db:
+            self.__db.executemany("UPDATE links SET status = 'skipped' WHERE link = ?", [(link,) for link in link_list])
+
+    def finish_page(self, page: int, failed_links: list = ()):
+        '''
+        Records the outcome of scraping the pending links on a page. Call this once the page's films have been written to storage.
+        Every pending link that did not fail is marked 'done', and the page is marked done unless a failed link has attempts left.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+        failed_links: list
+            The links that could not be scraped.
+        '''
+        with self.__lock, self.__db:
+            self.__db.executemany("UPDATE links SET status = 'failed', attempts = attempts + 1 WHERE page = ? AND link = ?",
+                                  [(page, link) for link in failed_links])
+            failed_links = set(failed_links)
+            rows = self.__db.execute("SELECT link FROM links WHERE page = ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?))",
+                                     (page, self.max_attempts)).fetchall()
+            self.__db.executemany("UPDATE links SET status = 'done' WHERE link = ?", [row for row in rows if row[0] not in failed_links])
+            retryable = self.__db.execute("SELECT 1 FROM links WHERE page = ? AND status = 'failed' AND attempts < ?",
+                                          (page, self.max_attempts)).fetchone()
+            if retryable is None:
+                self.__db.execute('UPDATE pages SET done = 1 WHERE page = ?', (page,))
+
+    def reset_pages(self, pages: list):
+        '''
+        Forgets the links and outcome recorded for each of a list of pages, so that a new crawl of them starts from scratch.
+        Parameters
+        ----------
+        pages: list of int
+            The numbers of the pages in the 'popular' section.
+        '''
+        with self.__lock, self.__db:
+            self.__db.executemany('DELETE FROM links WHERE page = ?', [(page,) for page in pages])
+            self.__db.executemany('DELETE FROM pages WHERE page = ?', [(page,) for page in pages])
+
+    def summary(self) -> dict:
+        '''
+        Returns the number of pages done and the number of links with each status.
+
+        Returns
+        -------
+        dict
+            A dictionary of the number of 'pages_done' and the number of links that are 'pending', 'done', 'failed' and 'skipped'.
+        '''
+        with self.__lock:
+            summary = {'pages_done': self.__db.execute('SELECT COUNT(*) FROM pages WHERE done = 1').fetchone()[0],
+                       'pending': 0, 'done': 0, 'failed': 0, 'skipped': 0}
+            for status, count in self.__db.execute('SELECT status, COUNT(*) FROM links GROUP BY status'):
+                summary[status] = count
+        return summary
+
+    def close(self):
+        '''
+        Closes the checkpoint database.
+        '''
+        with self.__lock:
+            self.__db.close()
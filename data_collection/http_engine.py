@@ -0,0 +1,340 @@
+from data_collection import politeness
+from data_collection.metrics import NULL_METRICS
+from data_collection.page_cache import page_not_cached
+from lxml import html as lxml_html
+from requests.adapters import HTTPAdapter
+from urllib.parse import urljoin
+import json
+import numpy as np
+import re
+import requests
+import time
+
+
+FILM_FIELDS = ['title', 'year', 'runtime', 'rating', 'watches', 'lists', 'likes', 'director', 'top_250_position', 'description', 'poster_link']
+STATS_FIELDS = ['rating', 'watches', 'lists', 'likes', 'top_250_position']
+REQUIRED_FIELDS = ['title', 'year', 'runtime', 'rating', 'watches', 'lists', 'likes', 'director', 'description', 'poster_link']
+
+
+class http_scraper:
+    '''
+    A browserless scraper that retrieves film data from letterboxd.com over plain HTTP and parses it from static HTML.
+
+    Attributes
+    ----------
+    session: requests.Session
+        A pooled HTTP session that is reused for every request.
+    timeout: float
+        The number of seconds to wait for a response before giving up.
+    base_url: str
+        The root URL of letterboxd.com, used to build links to pages and page fragments (equal to base_url parameter).
+    cache: page_cache or None
+        A persistent cache that pages are served from while they are fresh (equal to cache parameter).
+    metrics: metrics_registry
+        Records the time taken by each request (equal to metrics parameter, disabled if it is None).
+    rate_limiter: rate_limiter
+        Spaces out requests and slows down when the site is throttling or under load (equal to rate_limiter parameter, unlimited if it is None).
+    retry_policy: retry_policy
+        Retries requests that time out or are answered with a 429 or 5xx status (equal to retry_policy parameter, a single attempt if it is None).
+    '''
+    def __init__(self, pool_size: int = 10, timeout: float = 10, cache=None, metrics=None, base_url: str = 'https://letterboxd.com',
+                 rate_limiter: politeness.rate_limiter = None, retry_policy: politeness.retry_policy = None):
+        '''
+        See help(http_scraper) for accurate signature.
+        '''
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:106.0) Gecko/20100101 Firefox/106.0'})
+        self.timeout = timeout
+        self.base_url = base_url
+        self.cache = cache
+        self.metrics = metrics or NULL_METRICS
+        self.rate_limiter = rate_limiter or politeness.rate_limiter(rate=None)
+        self.retry_policy = retry_policy or politeness.retry_policy(max_attempts=1)
+
+    def __first_text(self, tree, xpath: str):
+        elements = tree.xpath(xpath)
+        if len(elements) == 0:
+            return None
+        text = ' '.join(elements[0].text_content().split())
+        if text == '':
+            return None
+        return text
+
+    def __stat_from_title(self, tree, xpath: str):
+        elements = tree.xpath(xpath)
+        if len(elements) == 0:
+            return None
+        title = elements[0].get('data-original-title') or elements[0].get('title')
+        if title is None or len(title.split()) < 3:
+            return None
+        return title.split()[2]
+
+    def __parse_rating(self, tree):
+        rating = self.__first_text(tree, '//a[starts-with(@class,"tooltip display-rating")]')
+        if rating is not None:
+            return rating
+        meta = tree.xpath('//meta[@name="twitter:data2"]/@content')
+        if len(meta) > 0 and meta[0].endswith('out of 5'):
+            return f'{float(meta[0].split()[0]):.1f}'
+        return None
+
+    def __parse_director(self, tree):
+        directors = tree.xpath('//a[starts-with(@href,"/director/")]')
+        if len(directors) == 0:
+            return None
+        director = ' '.join(directors[0].text_content().split())
+        next_directors = directors[0].xpath('following-sibling::a')
+        if len(next_directors) > 0:
+            return [director, ' '.join(next_directors[0].text_content().split())]
+        return director
+
+    def __parse_description(self, tree):
+        paragraphs = tree.xpath('//div[@class="review body-text -prose -hero prettify"]//div[starts-with(@class,"truncate")]//p')
+        if len(paragraphs) == 0:
+            paragraphs = tree.xpath('//div[@class="review body-text -prose -hero prettify"]//p')
+        description = '\n'.join(' '.join(p.text_content().split()) for p in paragraphs).strip()
+        if description == '':
+            return None
+        return description
+
+    def __parse_runtime(self, tree):
+        footer = self.__first_text(tree, '//p[@class="text-link text-footer"]')
+        if footer is None:
+            return None
+        match = re.search(r'([\d,]+)\s*mins?', footer)
+        if match is None:
+            return None
+        return f'{match.group(1)} mins'
+
+    def __parse_poster_link(self, tree):
+        src = tree.xpath('//div[starts-with(@class,"react-component poster")]//img/@src')
+        if len(src) > 0 and 'empty-poster' not in src[0]:
+            return src[0]
+        for script in tree.xpath('//script[@type="application/ld+json"]/text()'):
+            script = script.replace('/* <![CDATA[ */', '').replace('/* ]]> */', '')
+            try:
+                image = json.loads(script).get('image')
+            except ValueError:
+                continue
+            if image:
+                return image
+        return None
+
+    def __retry_after(self, response) -> float:
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    def __get_once(self, url: str, headers: dict):
+        self.rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            with self.metrics.timer('http_fetch_seconds'):
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            self.rate_limiter.record(time.perf_counter() - started, throttled=True)
+            raise
+        throttled = response.status_code in politeness.RETRY_STATUSES
+        self.rate_limiter.record(time.perf_counter() - started, throttled, self.__retry_after(response) if throttled else None)
+        if throttled:
+            response.raise_for_status()
+        return response
+
+    def __get(self, url: str, headers: dict = None):
+        return self.retry_policy.call(self.__get_once, url, headers or {})
+
+    def fetch_page(self, url: str) -> str:
+        '''
+        Fetches a page over HTTP using the pooled session, waiting for the rate limiter and retrying by the retry policy.
+        If there is a cache, fresh pages are served from it and stale pages are revalidated with their stored ETag and Last-Modified validators.
+        Parameters
+        ----------
+        url: str
+            The URL of the page to fetch.
+
+        Returns
+        -------
+        str
+            The HTML of the page.
+        '''
+        if self.cache is None:
+            response = self.__get(url)
+            response.raise_for_status()
+            return response.text
+        cached = self.cache.get(url)
+        if cached is not None and cached['fresh']:
+            self.metrics.increment('page_cache_hits_total')
+            return cached['html']
+        headers = {}
+        if cached is not None:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        response = self.__get(url, headers)
+        if response.status_code == 304 and cached is not None:
+            self.cache.touch(url)
+            return cached['html']
+        response.raise_for_status()
+        self.cache.put(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.text
+
+    def parse_film_page(self, page_html: str) -> dict:
+        '''
+        Parses film data from the static HTML of a film entry on letterboxd.com.
+        Fields that cannot be found are set to None, apart from 'top_250_position' which is set to NaN as in the browser path.
+        Parameters
+        ----------
+        page_html: str
+            The HTML of a film entry page, or of a page fragment containing film data.
+
+        Returns
+        -------
+        film_data_dic: dict
+            A dictionary containing the parsed film data with the same keys as the browser path.
+        '''
+        tree = lxml_html.fromstring(page_html)
+        film_data_dic = {}
+        film_data_dic['title'] = self.__first_text(tree, '//h1[@class="headline-1 js-widont prettify"]')
+        film_data_dic['year'] = self.__first_text(tree, '//a[starts-with(@href,"/films/year/")]')
+        film_data_dic['runtime'] = self.__parse_runtime(tree)
+        film_data_dic['rating'] = self.__parse_rating(tree)
+        film_data_dic['watches'] = self.__stat_from_title(tree, '//a[@class="has-icon icon-watched icon-16 tooltip"]')
+        film_data_dic['lists'] = self.__stat_from_title(tree, '//a[@class="has-icon icon-list icon-16 tooltip"]')
+        film_data_dic['likes'] = self.__stat_from_title(tree, '//a[@class="has-icon icon-like icon-liked icon-16 tooltip"]')
+        film_data_dic['director'] = self.__parse_director(tree)
+        top_250_pos = self.__first_text(tree, '//a[@class="has-icon icon-top250 icon-16 tooltip"]')
+        film_data_dic['top_250_position'] = top_250_pos if top_250_pos is not None else np.nan
+        film_data_dic['description'] = self.__parse_description(tree)
+        film_data_dic['poster_link'] = self.__parse_poster_link(tree)
+        return film_data_dic
+
+    def parse_film_links(self, page_html: str) -> list:
+        '''
+        Parses the links to film entries from the static HTML of a page of letterboxd's popular section.
+        Parameters
+        ----------
+        page_html: str
+            The HTML of a page of the popular section.
+
+        Returns
+        -------
+        link_list: list
+            A list containing links to film entries on letterboxd.com.
+        '''
+        tree = lxml_html.fromstring(page_html)
+        link_list = []
+        for film in tree.xpath('//*[@class="poster-list -p70 -grid"]/li'):
+            href = film.xpath('.//a/@href') or film.xpath('.//*[@data-target-link]/@data-target-link')
+            if len(href) > 0:
+                link_list.append(urljoin(self.base_url, href[0]))
+        return link_list
+
+    def get_film_links_from_page(self, page: int) -> list:
+        '''
+        Fetches a page of letterboxd's popular section and returns the links to film entries on it.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+
+        Returns
+        -------
+        link_list: list
+            A list containing links to film entries on letterboxd.com.
+        '''
+        return self.parse_film_links(self.fetch_page(f'{self.base_url}/films/ajax/popular/size/small/page/{page}/'))
+
+    def find_missing_fields(self, film_data_dic: dict) -> list:
+        '''
+        Returns a list of the required fields that could not be parsed.
+        Parameters
+        ----------
+        film_data_dic: dict
+            A dictionary of parsed film data.
+
+        Returns
+        -------
+        list
+            The names of the required fields that are None.
+        '''
+        return [field for field in REQUIRED_FIELDS if film_data_dic.get(field) is None]
+
+    def scrape_film_entry(self, link: str, page_html: str = None) -> tuple:
+        '''
+        Fetches and parses all chosen data from the page of a film entry.
+        If the film stats are not present in the page they are fetched from the page fragment letterboxd loads them from.
+        Parameters
+        ----------
+        link: str
+            The link to a film entry on letterboxd.com.
+        page_html: str
+            The HTML of the film entry if it has already been fetched, otherwise None.
+
+        Returns
+        -------
+        film_data_dic: dict
+            A dictionary containing the parsed film data.
+        missing_fields: list
+            The names of the required fields that could not be found in the static HTML.
+        '''
+        if page_html is None:
+            page_html = self.fetch_page(link)
+        film_data_dic = self.parse_film_page(page_html)
+        if film_data_dic['watches'] is None or film_data_dic['lists'] is None or film_data_dic['likes'] is None:
+            friendly_id = link.split('/')[4]
+            try:
+                stats_html = self.fetch_page(f'{self.base_url}/csi/film/{friendly_id}/stats/')
+            except page_not_cached:
+                # A replayed cache fails the film instead of leaving its stats to be found in the browser.
+                raise
+            except requests.RequestException:
+                stats_html = None
+            if stats_html:
+                stats_data_dic = self.parse_film_page(stats_html)
+                for field in ['watches', 'lists', 'likes', 'top_250_position']:
+                    if film_data_dic[field] is None or film_data_dic[field] is np.nan:
+                        film_data_dic[field] = stats_data_dic[field]
+        return film_data_dic, self.find_missing_fields(film_data_dic)
+
+    def scrape_film_stats(self, link: str) -> tuple:
+        '''
+        Fetches only the stats of a film that change over time, from the small page fragments letterboxd loads them from.
+        Stats that cannot be found in the fragments are parsed from the page of the film entry instead.
+        Parameters
+        ----------
+        link: str
+            The link to a film entry on letterboxd.com.
+
+        Returns
+        -------
+        stats_data_dic: dict
+            A dictionary containing the parsed 'rating', 'watches', 'lists', 'likes' and 'top_250_position'.
+        missing_fields: list
+            The names of the stats that could not be found.
+        '''
+        friendly_id = link.split('/')[4]
+        stats_data_dic = dict.fromkeys(STATS_FIELDS)
+        fragment_fields = {'stats': ['watches', 'lists', 'likes', 'top_250_position'], 'rating-histogram': ['rating']}
+        for fragment, fields in fragment_fields.items():
+            try:
+                fragment_html = self.fetch_page(f'{self.base_url}/csi/film/{friendly_id}/{fragment}/')
+            except page_not_cached:
+                raise
+            except requests.RequestException:
+                continue
+            if not fragment_html:
+                continue
+            fragment_data_dic = self.parse_film_page(fragment_html)
+            for field in fields:
+                stats_data_dic[field] = fragment_data_dic[field]
+        if any(value is None for value in stats_data_dic.values()):
+            film_data_dic = self.parse_film_page(self.fetch_page(link))
+            for field in STATS_FIELDS:
+                if stats_data_dic[field] is None:
+                    stats_data_dic[field] = film_data_dic[field]
+        return stats_data_dic, [field for field in STATS_FIELDS if stats_data_dic[field] is None]
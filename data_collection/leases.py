@@ -0,0 +1,254 @@
+from contextlib import contextmanager
+from sqlalchemy import BigInteger, Column, Float, MetaData, Table, Text, and_, func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+import os
+import socket
+import threading
+import time
+
+
+def default_worker_id() -> str:
+    '''
+    Returns an id for this scraper instance made of the host name and process id.
+    '''
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def page_range_key(first_page: int, last_page: int) -> str:
+    # Page numbers are zero-padded so that keys sort in page order.
+    return f'pages:{first_page:06d}-{last_page:06d}'
+
+
+def parse_page_range_key(key: str) -> list:
+    '''
+    Returns the page numbers covered by a key made by page_range_key.
+    '''
+    first_page, last_page = key[len('pages:'):].split('-')
+    return list(range(int(first_page), int(last_page) + 1))
+
+
+class lease:
+    '''
+    A claim on one item of work, valid until it expires unless it is renewed.
+
+    Attributes
+    ----------
+    key: str
+        The item claimed, either a page range ('pages:<first>-<last>') or a film link ('link:<link>').
+    owner: str
+        The id of the worker holding the lease.
+    token: int
+        A number that grows every time the item is claimed. A worker whose lease expired and was claimed by another worker can no longer renew or complete it.
+    expires: float
+        The time, in seconds since the epoch, after which the item can be claimed by another worker.
+    lost: bool
+        Whether renewing the lease failed because another worker claimed the item.
+    '''
+    __slots__ = ['key', 'owner', 'token', 'expires', 'lost']
+
+    def __init__(self, key: str, owner: str, token: int, expires: float):
+        '''
+        See help(lease) for accurate signature.
+        '''
+        self.key = key
+        self.owner = owner
+        self.token = token
+        self.expires = expires
+        self.lost = False
+
+    def __repr__(self) -> str:
+        return f'lease({self.key!r}, owner={self.owner!r}, token={self.token})'
+
+
+class lease_table:
+    '''
+    The items of a crawl shared by several scraper instances through a table in a common database, such as SQLite on a shared disk or PostgreSQL.
+    Workers claim items with time-limited leases. An item whose lease expires, e.g. because its worker stopped, can be claimed by another worker, and an item is given up as 'failed' once it has been claimed max_attempts times.
+    Every change is a single conditional UPDATE on the item's row that checks its token, so two workers never hold the same lease and completion is recorded exactly once.
+    Workers' clocks are compared with each other, so they should be kept in sync well within ttl.
+
+    Attributes
+    ----------
+    engine: sqlalchemy database connection
+        The database containing the table (equal to engine parameter).
+    table_name: str
+        The name of the table of items (equal to table_name parameter).
+    ttl: float
+        The number of seconds a lease lasts unless it is renewed (equal to ttl parameter).
+    max_attempts: int
+        The number of times an item is claimed before it is marked 'failed' (equal to max_attempts parameter).
+    '''
+    def __init__(self, engine, table_name: str = 'crawl_leases', ttl: float = 300, max_attempts: int = 3, clock=time.time):
+        '''
+        See help(lease_table) for accurate signature.
+        '''
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be a positive integer')
+        self.engine = engine
+        self.table_name = table_name
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.__clock = clock
+        self.__table = Table(table_name, MetaData(),
+                             Column('key', Text, primary_key=True),
+                             Column('status', Text, nullable=False, default='pending'),
+                             Column('owner', Text),
+                             Column('token', BigInteger, nullable=False, default=0),
+                             Column('lease_expires', Float),
+                             Column('attempts', BigInteger, nullable=False, default=0),
+                             Column('completed_by', Text),
+                             Column('completed_at', Float),
+                             Column('error', Text))
+        self.__table.metadata.create_all(engine)
+
+    def add_items(self, key_list: list):
+        '''
+        Adds items to the table as 'pending'. Items already in the table are left as they are, so every worker can add the same items when it starts.
+        Parameters
+        ----------
+        key_list: list of str
+            The keys of the items.
+        '''
+        rows = [{'key': key, 'status': 'pending', 'token': 0, 'attempts': 0} for key in dict.fromkeys(key_list)]
+        if len(rows) == 0:
+            return
+        dialect = self.engine.dialect.name
+        with self.engine.begin() as connection:
+            if dialect in ('postgresql', 'sqlite'):
+                insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+                connection.execute(insert(self.__table).on_conflict_do_nothing(index_elements=['key']), rows)
+            else:
+                existing = {key for (key,) in connection.execute(select(self.__table.c.key).where(self.__table.c.key.in_([row['key'] for row in rows])))}
+                new_rows = [row for row in rows if row['key'] not in existing]
+                if len(new_rows) > 0:
+                    connection.execute(self.__table.insert(), new_rows)
+
+    def add_page_ranges(self, start_page: int, pages: int, pages_per_item: int = 5):
+        '''
+        Adds the pages of the 'popular' section from start_page on as items of up to pages_per_item pages each.
+        '''
+        last_page = start_page + pages - 1
+        self.add_items([page_range_key(first_page, min(first_page + pages_per_item - 1, last_page))
+                        for first_page in range(start_page, last_page + 1, pages_per_item)])
+
+    def __claimable(self, now: float):
+        table = self.__table
+        return or_(table.c.status == 'pending', and_(table.c.status == 'leased', table.c.lease_expires < now))
+
+    def claim(self, worker_id: str, n: int = 1, prefix: str = '') -> list:
+        '''
+        Claims up to n items that are pending or whose lease has expired, in key order.
+        Parameters
+        ----------
+        worker_id: str
+            The id of the claiming worker.
+        n: int
+            The largest number of items to claim.
+        prefix: str
+            Only items whose keys start with prefix are claimed, e.g. 'link:'.
+
+        Returns
+        -------
+        list of lease
+            The leases obtained, empty if there is nothing left to claim.
+        '''
+        table = self.__table
+        now = self.__clock()
+        with self.engine.begin() as connection:
+            # Items whose workers keep stopping before finishing them are given up on.
+            connection.execute(table.update().where(table.c.status == 'leased', table.c.lease_expires < now, table.c.attempts >= self.max_attempts)
+                               .values(status='failed', owner=None, error='lease expired'))
+        leases = []
+        while len(leases) < n:
+            with self.engine.connect() as connection:
+                candidates = connection.execute(select(table.c.key, table.c.token).where(self.__claimable(now), table.c.key.startswith(prefix, autoescape=True)).order_by(table.c.key)
+                                                .limit(n - len(leases))).fetchall()
+            if len(candidates) == 0:
+                break
+            for key, token in candidates:
+                # Another worker that read the same candidate and claimed it first has changed its token, so this update matches no row.
+                with self.engine.begin() as connection:
+                    claimed = connection.execute(table.update().where(table.c.key == key, table.c.token == token, self.__claimable(now))
+                                                 .values(status='leased', owner=worker_id, token=token + 1, lease_expires=now + self.ttl,
+                                                         attempts=table.c.attempts + 1)).rowcount == 1
+                if claimed:
+                    leases.append(lease(key, worker_id, token + 1, now + self.ttl))
+        return leases
+
+    def __update_lease(self, held_lease: lease, **values) -> bool:
+        table = self.__table
+        with self.engine.begin() as connection:
+            return connection.execute(table.update().where(table.c.key == held_lease.key, table.c.token == held_lease.token, table.c.status == 'leased')
+                                      .values(**values)).rowcount == 1
+
+    def renew(self, held_lease: lease) -> bool:
+        '''
+        Extends a lease by ttl seconds from now. Returns False if the item has since been claimed by another worker.
+        '''
+        expires = self.__clock() + self.ttl
+        renewed = self.__update_lease(held_lease, lease_expires=expires)
+        if renewed:
+            held_lease.expires = expires
+        else:
+            held_lease.lost = True
+        return renewed
+
+    def complete(self, held_lease: lease) -> bool:
+        '''
+        Records that the item of a lease is done. Returns False, and records nothing, if the item has since been claimed by another worker or completed.
+        '''
+        return self.__update_lease(held_lease, status='done', completed_by=held_lease.owner, completed_at=self.__clock(), lease_expires=None)
+
+    def release(self, held_lease: lease, error=None) -> bool:
+        '''
+        Gives up a lease so that its item can be claimed again straight away, or marks the item 'failed' if it has been claimed max_attempts times.
+        Parameters
+        ----------
+        held_lease: lease
+            The lease to give up.
+        error: Exception or str or None
+            Why the item could not be finished, if it failed.
+        '''
+        table = self.__table
+        with self.engine.begin() as connection:
+            attempts = connection.execute(select(table.c.attempts).where(table.c.key == held_lease.key)).scalar()
+        failed = error is not None and attempts is not None and attempts >= self.max_attempts
+        return self.__update_lease(held_lease, status='failed' if failed else 'pending', owner=None, lease_expires=None,
+                                   error=None if error is None else (error if isinstance(error, str) else repr(error)))
+
+    @contextmanager
+    def keep_alive(self, held_lease: lease, interval: float = None):
+        '''
+        Renews a lease on a background thread every interval seconds, a third of ttl by default, while the block runs.
+        The lease's 'lost' attribute is set if another worker claims the item in the meantime.
+        '''
+        stopped = threading.Event()
+
+        def renew_periodically():
+            while not stopped.wait(interval or self.ttl / 3):
+                if not self.renew(held_lease):
+                    return
+
+        renewer = threading.Thread(target=renew_periodically, daemon=True)
+        renewer.start()
+        try:
+            yield held_lease
+        finally:
+            stopped.set()
+            renewer.join()
+
+    def summary(self) -> dict:
+        '''
+        Returns the number of items with each status.
+
+        Returns
+        -------
+        dict
+            A dictionary of the number of items that are 'pending', 'leased', 'done' and 'failed'.
+        '''
+        table = self.__table
+        summary = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        with self.engine.connect() as connection:
+            for status, count in connection.execute(select(table.c.status, func.count()).group_by(table.c.status)):
+                summary[status] = count
+        return summary
@@ -0,0 +1,286 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import json
+import random
+import threading
+import time
+
+
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+class null_timer:
+    '''
+    A timer that does nothing, returned by a disabled metrics_registry.
+    '''
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class metrics_timer:
+    '''
+    Times the block it wraps and records the duration in a histogram of a metrics_registry.
+    '''
+    def __init__(self, registry, name: str, labels: dict):
+        '''
+        See help(metrics_timer) for accurate signature.
+        '''
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.__start, self.labels)
+        return False
+
+
+NULL_TIMER = null_timer()
+
+
+class metrics_registry:
+    '''
+    Counters, gauges and latency histograms for a run of the scraper, exported in the Prometheus text format and as a JSON summary.
+    When the registry is disabled every method returns immediately and timers do nothing.
+
+    Attributes
+    ----------
+    enabled: bool
+        Whether anything is recorded (equal to enabled parameter).
+    prefix: str
+        The prefix added to the name of every exported metric (equal to prefix parameter).
+    buckets: list of float
+        The upper bounds in seconds of the histogram buckets (equal to buckets parameter).
+    max_samples: int
+        The number of durations kept per histogram, by reservoir sampling, to calculate the quantiles in the summary (equal to max_samples parameter).
+    '''
+    def __init__(self, enabled: bool = True, prefix: str = 'letterboxd_', buckets: list = None, max_samples: int = 2048):
+        '''
+        See help(metrics_registry) for accurate signature.
+        '''
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = sorted(buckets or DEFAULT_BUCKETS)
+        self.max_samples = max_samples
+        self.__random = random.Random(0)
+        self.__counters = {}
+        self.__gauges = {}
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+        self.__server = None
+
+    def __key(self, name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((labels or {}).items()))
+
+    def increment(self, name: str, amount: float = 1, labels: dict = None):
+        '''
+        Adds to a counter.
+        Parameters
+        ----------
+        name: str
+            The name of the counter, e.g. 'films_scraped_total'.
+        amount: float
+            The amount added.
+        labels: dict
+            Labels distinguishing this counter from others of the same name.
+        '''
+        if not self.enabled:
+            return
+        key = self.__key(name, labels)
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, labels: dict = None):
+        '''
+        Sets a gauge to its current value.
+        Parameters
+        ----------
+        name: str
+            The name of the gauge, e.g. 'spool_records'.
+        value: float
+            The current value.
+        labels: dict
+            Labels distinguishing this gauge from others of the same name.
+        '''
+        if not self.enabled:
+            return
+        key = self.__key(name, labels)
+        with self.__lock:
+            self.__gauges[key] = value
+
+    def observe(self, name: str, seconds: float, labels: dict = None):
+        '''
+        Records a duration in a histogram.
+        Parameters
+        ----------
+        name: str
+            The name of the histogram, e.g. 'page_load_seconds'.
+        seconds: float
+            The duration.
+        labels: dict
+            Labels distinguishing this histogram from others of the same name.
+        '''
+        if not self.enabled:
+            return
+        key = self.__key(name, labels)
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0, 'max': 0.0, 'samples': []}
+            histogram['counts'][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            histogram['max'] = max(histogram['max'], seconds)
+            if len(histogram['samples']) < self.max_samples:
+                histogram['samples'].append(seconds)
+            else:
+                replaced = self.__random.randrange(histogram['count'])
+                if replaced < self.max_samples:
+                    histogram['samples'][replaced] = seconds
+
+    def timer(self, name: str, labels: dict = None):
+        '''
+        Returns a context manager that records how long its block takes in a histogram, including blocks that raise.
+        Parameters
+        ----------
+        name: str
+            The name of the histogram.
+        labels: dict
+            Labels distinguishing this histogram from others of the same name.
+        '''
+        if not self.enabled:
+            return NULL_TIMER
+        return metrics_timer(self, name, labels)
+
+    def __format_labels(self, labels: tuple, extra: tuple = ()) -> str:
+        labels = labels + extra
+        if len(labels) == 0:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in labels) + '}'
+
+    def render_prometheus(self) -> str:
+        '''
+        Returns every metric in the Prometheus text exposition format.
+        '''
+        with self.__lock:
+            counters = dict(self.__counters)
+            gauges = dict(self.__gauges)
+            histograms = {key: {'counts': list(value['counts']), 'sum': value['sum'], 'count': value['count']} for key, value in self.__histograms.items()}
+        lines = []
+        typed = set()
+        for metric_type, values in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in sorted(values.items()):
+                if name not in typed:
+                    lines.append(f'# TYPE {self.prefix}{name} {metric_type}')
+                    typed.add(name)
+                lines.append(f'{self.prefix}{name}{self.__format_labels(labels)} {value:g}')
+        for (name, labels), histogram in sorted(histograms.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {self.prefix}{name} histogram')
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets + [float('inf')], histogram['counts']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f"{self.prefix}{name}_bucket{self.__format_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{self.prefix}{name}_sum{self.__format_labels(labels)} {histogram['sum']:.6f}")
+            lines.append(f"{self.prefix}{name}_count{self.__format_labels(labels)} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+    def __quantile(self, samples: list, quantile: float) -> float:
+        # Nearest-rank quantile of the sampled durations.
+        return round(samples[min(len(samples) - 1, int(quantile * len(samples)))], 6)
+
+    def summary(self) -> dict:
+        '''
+        Returns every counter and gauge, and the count, total, mean, median, 95th percentile and maximum of every histogram.
+
+        Returns
+        -------
+        dict
+            A dictionary with 'counters' and 'timings', and 'gauges' if any have been set, each mapping a metric name (with its labels in brackets, if any) to its values.
+        '''
+        with self.__lock:
+            counters = dict(self.__counters)
+            gauges = dict(self.__gauges)
+            histograms = {key: {**value, 'samples': sorted(value['samples'])} for key, value in self.__histograms.items()}
+        summary = {'counters': {}, 'timings': {}}
+        for (name, labels), value in sorted(counters.items()):
+            summary['counters'][name + self.__format_labels(labels)] = value
+        if len(gauges) > 0:
+            summary['gauges'] = {name + self.__format_labels(labels): value for (name, labels), value in sorted(gauges.items())}
+        for (name, labels), histogram in sorted(histograms.items()):
+            count = histogram['count']
+            summary['timings'][name + self.__format_labels(labels)] = {
+                'count': count,
+                'total_seconds': round(histogram['sum'], 6),
+                'mean_seconds': round(histogram['sum'] / count, 6),
+                'p50_seconds': self.__quantile(histogram['samples'], 0.5),
+                'p95_seconds': self.__quantile(histogram['samples'], 0.95),
+                'max_seconds': round(histogram['max'], 6)}
+        return summary
+
+    def write_summary(self, path: str = 'metrics_summary.json'):
+        '''
+        Writes the summary of the run to a JSON file.
+        Parameters
+        ----------
+        path: str
+            The path of the JSON file.
+        '''
+        with open(path, 'w') as summary_file:
+            json.dump(self.summary(), summary_file, indent=4)
+
+    def serve(self, port: int = 9100, host: str = '0.0.0.0'):
+        '''
+        Starts serving the metrics in the Prometheus text format at '/metrics' on a background thread.
+        Parameters
+        ----------
+        port: int
+            The port to listen on, or 0 to pick a free port.
+        host: str
+            The address to listen on.
+
+        Returns
+        -------
+        int
+            The port the endpoint is listening on.
+        '''
+        registry = self
+
+        class metrics_handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.__server = ThreadingHTTPServer((host, port), metrics_handler)
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        return self.__server.server_port
+
+    def close(self):
+        '''
+        Stops the metrics endpoint if it is running.
+        '''
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+
+NULL_METRICS = metrics_registry(enabled=False)
@@ -0,0 +1,225 @@
+import hashlib
+import os
+import requests
+import sqlite3
+import threading
+import time
+import zlib
+
+
+DEFAULT_TTLS = {'list': 60 * 60, 'fragment': 6 * 60 * 60, 'film': 7 * 24 * 60 * 60, 'other': 24 * 60 * 60}
+
+
+class page_not_cached(requests.RequestException):
+    '''
+    Raised in replay mode when a page has never been cached.
+    It is a requests.RequestException, so a missing page fails like a page that could not be fetched.
+    '''
+
+
+class page_cache:
+    '''
+    A persistent on-disk cache of fetched pages keyed by URL.
+    Pages are stored zlib-compressed in content-addressed files, so identical pages are only stored once, and an SQLite index records the fetch time, validators and last access of each URL. The least recently used URLs are evicted once the cache is larger than max_bytes.
+
+    Attributes
+    ----------
+    cache_dir: str
+        The directory the cache is stored in (equal to cache_dir parameter).
+    max_bytes: int
+        The maximum total size of the compressed pages (equal to max_bytes parameter).
+    ttls: dict
+        The number of seconds a page stays fresh for each class of URL: 'list', 'fragment', 'film' and 'other'.
+    replay: bool
+        Whether every page is served from the cache regardless of age and the network is never used (equal to replay parameter).
+    hits: int
+        The number of lookups that returned a fresh page.
+    misses: int
+        The number of lookups that did not.
+    '''
+    def __init__(self, cache_dir: str = 'page_cache', max_bytes: int = 512 * 1024 * 1024, ttls: dict = None, replay: bool = False):
+        '''
+        See help(page_cache) for accurate signature.
+        '''
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite'), check_same_thread=False)
+        self.__db.execute('''CREATE TABLE IF NOT EXISTS pages (
+                                 url TEXT PRIMARY KEY,
+                                 content_hash TEXT NOT NULL,
+                                 size INTEGER NOT NULL,
+                                 fetched_at REAL NOT NULL,
+                                 last_access REAL NOT NULL,
+                                 etag TEXT,
+                                 last_modified TEXT)''')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)')
+        self.__db.commit()
+
+    def __object_path(self, content_hash: str) -> str:
+        return os.path.join(self.cache_dir, 'objects', content_hash[:2], content_hash[2:])
+
+    def __read_object(self, content_hash: str) -> str:
+        with open(self.__object_path(content_hash), 'rb') as object_file:
+            return zlib.decompress(object_file.read()).decode()
+
+    def __remove_unreferenced_object(self, content_hash: str):
+        if self.__db.execute('SELECT 1 FROM pages WHERE content_hash = ?', (content_hash,)).fetchone() is None:
+            try:
+                os.remove(self.__object_path(content_hash))
+            except FileNotFoundError:
+                pass
+
+    def __evict(self):
+        total_bytes = self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)').fetchone()[0]
+        while total_bytes > self.max_bytes:
+            row = self.__db.execute('SELECT url, content_hash, size FROM pages ORDER BY last_access LIMIT 1').fetchone()
+            if row is None:
+                break
+            url, content_hash, size = row
+            self.__db.execute('DELETE FROM pages WHERE url = ?', (url,))
+            if self.__db.execute('SELECT 1 FROM pages WHERE content_hash = ?', (content_hash,)).fetchone() is None:
+                self.__remove_unreferenced_object(content_hash)
+                total_bytes -= size
+
+    def url_class(self, url: str) -> str:
+        '''
+        Returns the class of a URL, which decides how long its page stays fresh.
+        Parameters
+        ----------
+        url: str
+            The URL of a page on letterboxd.com.
+
+        Returns
+        -------
+        str
+            'fragment' for page fragments, 'list' for pages of film lists, 'film' for film entries and 'other' for anything else.
+        '''
+        if '/csi/' in url:
+            return 'fragment'
+        if '/films/' in url:
+            return 'list'
+        if '/film/' in url:
+            return 'film'
+        return 'other'
+
+    def get(self, url: str):
+        '''
+        Looks up the cached page for a URL.
+        Parameters
+        ----------
+        url: str
+            The URL of the page.
+
+        Returns
+        -------
+        dict or None
+            None if the URL has never been cached, otherwise a dictionary of the page 'html', its 'etag' and 'last_modified' validators and whether it is still 'fresh'.
+        '''
+        with self.__lock:
+            row = self.__db.execute('SELECT content_hash, fetched_at, etag, last_modified FROM pages WHERE url = ?', (url,)).fetchone()
+            if row is None:
+                self.misses += 1
+                if self.replay:
+                    raise page_not_cached(url)
+                return None
+            content_hash, fetched_at, etag, last_modified = row
+            try:
+                html = self.__read_object(content_hash)
+            except FileNotFoundError:
+                self.__db.execute('DELETE FROM pages WHERE url = ?', (url,))
+                self.__db.commit()
+                self.misses += 1
+                if self.replay:
+                    raise page_not_cached(url)
+                return None
+            fresh = self.replay or time.time() - fetched_at < self.ttls[self.url_class(url)]
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.__db.execute('UPDATE pages SET last_access = ? WHERE url = ?', (time.time(), url))
+            self.__db.commit()
+        return {'html': html, 'etag': etag, 'last_modified': last_modified, 'fresh': fresh}
+
+    def put(self, url: str, html: str, etag: str = None, last_modified: str = None):
+        '''
+        Stores the page fetched from a URL, replacing any older copy.
+        Parameters
+        ----------
+        url: str
+            The URL of the page.
+        html: str
+            The HTML of the page.
+        etag: str
+            The ETag response header, if there was one.
+        last_modified: str
+            The Last-Modified response header, if there was one.
+        '''
+        content = html.encode()
+        content_hash = hashlib.sha256(content).hexdigest()
+        object_path = self.__object_path(content_hash)
+        with self.__lock:
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                with open(f'{object_path}.part', 'wb') as object_file:
+                    object_file.write(zlib.compress(content, 6))
+                os.replace(f'{object_path}.part', object_path)
+            old_row = self.__db.execute('SELECT content_hash FROM pages WHERE url = ?', (url,)).fetchone()
+            now = time.time()
+            self.__db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              (url, content_hash, os.path.getsize(object_path), now, now, etag, last_modified))
+            if old_row is not None and old_row[0] != content_hash:
+                self.__remove_unreferenced_object(old_row[0])
+            self.__evict()
+            self.__db.commit()
+
+    def touch(self, url: str):
+        '''
+        Marks the cached page for a URL as freshly fetched, e.g. after the server answered 304 Not Modified.
+        Parameters
+        ----------
+        url: str
+            The URL of the page.
+        '''
+        with self.__lock:
+            now = time.time()
+            self.__db.execute('UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?', (now, now, url))
+            self.__db.commit()
+
+    def urls(self, url_class: str = None) -> list:
+        '''
+        Returns every cached URL, e.g. to re-run parsers over a historical crawl in replay mode.
+        Parameters
+        ----------
+        url_class: str
+            Only return URLs of this class, or every URL if None.
+
+        Returns
+        -------
+        list of str
+            The cached URLs.
+        '''
+        with self.__lock:
+            urls = [url for (url,) in self.__db.execute('SELECT url FROM pages ORDER BY url')]
+        return [url for url in urls if url_class is None or self.url_class(url) == url_class]
+
+    def total_bytes(self) -> int:
+        '''
+        Returns the total size of the compressed pages stored in the cache.
+        '''
+        with self.__lock:
+            return self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)').fetchone()[0]
+
+    def close(self):
+        '''
+        Closes the cache index.
+        '''
+        with self.__lock:
+            self.__db.close()
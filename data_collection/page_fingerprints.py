@@ -0,0 +1,166 @@
+from datetime import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+def page_fingerprint(link_list: list) -> str:
+    '''
+    Returns a BLAKE2b digest of the links listed on a page, in order, so that a page whose films or their order changed has a different fingerprint.
+    '''
+    return hashlib.blake2b('\n'.join(link_list).encode(), digest_size=16).hexdigest()
+
+
+class page_fingerprint_store:
+    '''
+    The fingerprint of each page of the 'popular' section and the popularity rank of each film listed on it, kept across runs in a small SQLite database.
+    A page is marked complete once all of its films have been stored. When a later run lists the same links on a complete page in the same order, the page is unchanged and its films need no further work.
+    The rank of a film is its position in the whole 'popular' section, counting films_per_page films on every earlier page. Ranks are only updated from pages that changed, and each film's rank at the start of the run is kept, so the films that are new, moved or dropped in a run can be reported without visiting their pages.
+
+    Attributes
+    ----------
+    path: str
+        The path of the SQLite database (equal to path parameter).
+    films_per_page: int
+        The number of films listed on each page of the 'popular' section (equal to films_per_page parameter).
+    run_id: str
+        The id that the changes made by this run are recorded with.
+    '''
+    def __init__(self, path: str = 'page_fingerprints.sqlite', films_per_page: int = 72):
+        '''
+        See help(page_fingerprint_store) for accurate signature.
+        '''
+        self.path = path
+        self.films_per_page = films_per_page
+        self.run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.__pages_checked = {'unchanged': 0, 'changed': 0}
+        self.__lock = threading.Lock()
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('''CREATE TABLE IF NOT EXISTS pages (
+                                 page INTEGER PRIMARY KEY,
+                                 fingerprint TEXT NOT NULL,
+                                 complete INTEGER NOT NULL DEFAULT 0,
+                                 checked_at REAL NOT NULL)''')
+        self.__db.execute('''CREATE TABLE IF NOT EXISTS ranks (
+                                 friendly_id TEXT PRIMARY KEY,
+                                 page INTEGER,
+                                 rank INTEGER,
+                                 previous_rank INTEGER,
+                                 changed_run TEXT)''')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS ranks_page ON ranks (page)')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS ranks_changed_run ON ranks (changed_run)')
+        self.__db.commit()
+
+    def record_page(self, page: int, link_list: list) -> bool:
+        '''
+        Compares the links listed on a page with its fingerprint from earlier runs, recording the new fingerprint and ranks in a single transaction if the page changed.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+        link_list: list
+            The links to film entries on the page, in the order they are listed.
+
+        Returns
+        -------
+        bool
+            Whether the page is unchanged since a run that stored all of its films, so that its links can be skipped.
+        '''
+        fingerprint = page_fingerprint(link_list)
+        friendly_ids = [link.split('/')[4] for link in link_list]
+        with self.__lock, self.__db:
+            stored = self.__db.execute('SELECT fingerprint, complete FROM pages WHERE page = ?', (page,)).fetchone()
+            if stored is not None and stored[0] == fingerprint:
+                self.__db.execute('UPDATE pages SET checked_at = ? WHERE page = ?', (time.time(), page))
+                self.__pages_checked['unchanged'] += 1
+                return stored[1] == 1
+            self.__pages_checked['changed'] += 1
+            self.__db.execute('INSERT OR REPLACE INTO pages (page, fingerprint, complete, checked_at) VALUES (?, ?, 0, ?)', (page, fingerprint, time.time()))
+            # A film keeps the rank it had at the start of the run as its previous rank, however many pages it moves across during the run.
+            listed = set(friendly_ids)
+            dropped = [(self.run_id, self.run_id, friendly_id) for (friendly_id,) in self.__db.execute('SELECT friendly_id FROM ranks WHERE page = ?', (page,))
+                       if friendly_id not in listed]
+            self.__db.executemany('''UPDATE ranks SET previous_rank = CASE WHEN changed_run = ? THEN previous_rank ELSE rank END,
+                                         page = NULL, rank = NULL, changed_run = ? WHERE friendly_id = ?''', dropped)
+            first_rank = (page - 1) * self.films_per_page + 1
+            self.__db.executemany('''INSERT INTO ranks (friendly_id, page, rank, previous_rank, changed_run) VALUES (?, ?, ?, NULL, ?)
+                                     ON CONFLICT (friendly_id) DO UPDATE SET
+                                         previous_rank = CASE WHEN changed_run = excluded.changed_run THEN previous_rank ELSE rank END,
+                                         page = excluded.page, rank = excluded.rank, changed_run = excluded.changed_run''',
+                                  [(friendly_id, page, first_rank + position, self.run_id) for position, friendly_id in enumerate(friendly_ids)])
+            return False
+
+    def finish_page(self, page: int, failed_links: list = ()):
+        '''
+        Marks a page complete unless any of its films could not be scraped, so that it is skipped while it is unchanged.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+        failed_links: list
+            The links that could not be scraped, which may include links on other pages.
+        '''
+        failed_ids = [link.split('/')[4] for link in failed_links]
+        with self.__lock, self.__db:
+            placeholders = ', '.join('?' * len(failed_ids))
+            if len(failed_ids) > 0 and self.__db.execute(f'SELECT 1 FROM ranks WHERE page = ? AND friendly_id IN ({placeholders})', (page, *failed_ids)).fetchone() is not None:
+                return
+            self.__db.execute('UPDATE pages SET complete = 1 WHERE page = ?', (page,))
+
+    def get_rank(self, friendly_id: str) -> int:
+        '''
+        Returns the latest popularity rank of a film, or None if it is not listed on any page that has been recorded.
+        '''
+        with self.__lock:
+            row = self.__db.execute('SELECT rank FROM ranks WHERE friendly_id = ?', (friendly_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def rank_changes(self) -> list:
+        '''
+        Returns the films whose rank changed in this run, largest moves first.
+
+        Returns
+        -------
+        list of dict
+            The 'friendly_id', 'change' ('new', 'moved' or 'dropped'), 'previous_rank' and 'rank' of each film. Ranks are None for films that were not listed.
+        '''
+        with self.__lock:
+            rows = self.__db.execute('SELECT friendly_id, previous_rank, rank FROM ranks WHERE changed_run = ? AND previous_rank IS NOT rank',
+                                     (self.run_id,)).fetchall()
+        changes = []
+        for friendly_id, previous_rank, rank in rows:
+            change = 'new' if previous_rank is None else 'dropped' if rank is None else 'moved'
+            changes.append({'friendly_id': friendly_id, 'change': change, 'previous_rank': previous_rank, 'rank': rank})
+        order = {'moved': 0, 'new': 1, 'dropped': 2}
+        changes.sort(key=lambda entry: (order[entry['change']], -abs((entry['previous_rank'] or 0) - (entry['rank'] or 0)), entry['rank'] or entry['previous_rank']))
+        return changes
+
+    def summary(self) -> dict:
+        '''
+        Returns the number of pages this run found 'unchanged' and 'changed', and the number of films that are 'new', 'moved' or 'dropped'.
+        '''
+        summary = {f'pages_{status}': count for status, count in self.__pages_checked.items()}
+        summary.update({'new': 0, 'moved': 0, 'dropped': 0})
+        for entry in self.rank_changes():
+            summary[entry['change']] += 1
+        return summary
+
+    def write_rank_report(self, path: str = 'rank_changes.jsonl'):
+        '''
+        Appends the rank changes of this run to a JSON Lines file, one entry per film with the run_id.
+        Parameters
+        ----------
+        path: str
+            The path of the JSON Lines file.
+        '''
+        with open(path, 'a') as report_file:
+            for entry in self.rank_changes():
+                report_file.write(json.dumps({'run_id': self.run_id, **entry}) + '\n')
+
+    def close(self):
+        with self.__lock:
+            self.__db.close()
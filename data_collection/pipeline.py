@@ -0,0 +1,204 @@
+from data_collection.metrics import NULL_METRICS
+import queue
+import threading
+import time
+
+
+class pipeline_stage:
+    '''
+    A single stage of a pipeline, run by a number of worker threads that take items from a bounded input queue.
+
+    Attributes
+    ----------
+    name: str
+        The name of the stage (equal to name parameter).
+    func: callable
+        The function applied to each item. Returning None drops the item, and if fan_out is True each element of the returned list is passed on separately.
+    workers: int
+        The number of threads running the stage (equal to workers parameter).
+    fan_out: bool
+        Whether func returns a list of items for the next stage (equal to fan_out parameter).
+    batch_size: int
+        The largest number of waiting items passed to func at once (equal to batch_size parameter). With a batch_size above 1, func takes a list of items and returns a list of results, and a worker takes whatever is already queued up to batch_size instead of waiting for a full batch.
+    input_queue: queue.Queue
+        The bounded queue of items waiting for the stage, of size queue_size.
+    processed: int
+        The number of items the stage has finished.
+    failed: int
+        The number of items for which func raised an exception.
+    '''
+    def __init__(self, name: str, func, workers: int = 1, queue_size: int = 100, fan_out: bool = False, batch_size: int = 1):
+        '''
+        See help(pipeline_stage) for accurate signature.
+        '''
+        if workers < 1:
+            raise ValueError('workers must be a positive integer')
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive integer')
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.fan_out = fan_out
+        self.batch_size = batch_size
+        self.input_queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+
+
+class pipeline:
+    '''
+    A chain of stages connected by bounded queues.
+    Each stage runs on its own threads, so a slow stage fills its input queue and blocks the stages before it instead of stalling everything. Closing the pipeline lets every queue drain before the threads exit.
+
+    Attributes
+    ----------
+    stages: list of pipeline_stage
+        The stages in the order items pass through them.
+    report_interval: float or None
+        The number of seconds between printed reports of the queue depths, or None to disable them (equal to report_interval parameter).
+    errors: list of tuple
+        The stage name, item and exception for every item that failed.
+    metrics: metrics_registry
+        Records the time each stage takes per item (equal to metrics parameter, disabled if it is None).
+    '''
+    __stop = object()
+
+    def __init__(self, report_interval: float = None, metrics=None):
+        '''
+        See help(pipeline) for accurate signature.
+        '''
+        self.stages = []
+        self.report_interval = report_interval
+        self.errors = []
+        self.metrics = metrics or NULL_METRICS
+        self.__threads = []
+        self.__finished_workers = {}
+        self.__lock = threading.Lock()
+        self.__done = threading.Event()
+
+    def add_stage(self, name: str, func, workers: int = 1, queue_size: int = 100, fan_out: bool = False, batch_size: int = 1):
+        '''
+        Appends a stage to the end of the pipeline. See help(pipeline_stage) for the parameters.
+        '''
+        self.stages.append(pipeline_stage(name, func, workers, queue_size, fan_out, batch_size))
+        self.__finished_workers[name] = 0
+        return self
+
+    def __pass_on(self, index: int, item):
+        if index + 1 < len(self.stages):
+            self.stages[index + 1].input_queue.put(item)
+
+    def __take_batch(self, stage: pipeline_stage) -> tuple:
+        batch = []
+        item = stage.input_queue.get()
+        while item is not self.__stop:
+            batch.append(item)
+            if len(batch) == stage.batch_size:
+                return batch, False
+            try:
+                item = stage.input_queue.get_nowait()
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def __run_worker(self, index: int):
+        stage = self.stages[index]
+        stopped = False
+        while not stopped:
+            batch, stopped = self.__take_batch(stage)
+            if len(batch) == 0:
+                continue
+            try:
+                with self.metrics.timer('pipeline_stage_seconds', {'stage': stage.name}):
+                    result = stage.func(batch) if stage.batch_size > 1 else stage.func(batch[0])
+            except Exception as error:
+                print(f"Stage '{stage.name}' failed: {error!r}")
+                with self.__lock:
+                    stage.failed += len(batch)
+                    self.errors.extend((stage.name, item, error) for item in batch)
+                continue
+            with self.__lock:
+                stage.processed += len(batch)
+            if result is None:
+                continue
+            for output in (result if stage.fan_out or stage.batch_size > 1 else [result]):
+                if output is not None:
+                    self.__pass_on(index, output)
+        with self.__lock:
+            self.__finished_workers[stage.name] += 1
+            last_worker = self.__finished_workers[stage.name] == stage.workers
+        # The last worker of a stage to finish stops the next stage, so every item ahead of the stop markers is processed first.
+        if last_worker and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self.stages[index + 1].input_queue.put(self.__stop)
+
+    def __report_periodically(self):
+        while not self.__done.wait(self.report_interval):
+            depths = ', '.join(f'{name}: {depth}' for name, depth in self.queue_depths().items())
+            print(f'Queue depths - {depths}')
+
+    def start(self):
+        '''
+        Starts the worker threads of every stage.
+        '''
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self.__run_worker, args=(index,), name=f'{stage.name}-worker', daemon=True)
+                thread.start()
+                self.__threads.append(thread)
+        if self.report_interval is not None:
+            threading.Thread(target=self.__report_periodically, daemon=True).start()
+        return self
+
+    def put(self, item):
+        '''
+        Feeds an item into the first stage, blocking while its queue is full.
+        '''
+        self.stages[0].input_queue.put(item)
+
+    def close(self):
+        '''
+        Signals that no more items will be fed in and blocks until every queue has drained and every worker has exited.
+        '''
+        for _ in range(self.stages[0].workers):
+            self.stages[0].input_queue.put(self.__stop)
+        for thread in self.__threads:
+            thread.join()
+        self.__done.set()
+
+    def run(self, items) -> 'pipeline':
+        '''
+        Starts the pipeline, feeds in every item and waits for them all to pass through.
+        Parameters
+        ----------
+        items: iterable
+            The items fed into the first stage.
+        '''
+        self.start()
+        for item in items:
+            self.put(item)
+        self.close()
+        return self
+
+    def queue_depths(self) -> dict:
+        '''
+        Returns the number of items waiting in front of each stage.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each stage name to the size of its input queue.
+        '''
+        return {stage.name: stage.input_queue.qsize() for stage in self.stages}
+
+    def summary(self) -> dict:
+        '''
+        Returns the number of items each stage has processed and failed.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each stage name to a dictionary of 'processed' and 'failed' counts.
+        '''
+        with self.__lock:
+            return {stage.name: {'processed': stage.processed, 'failed': stage.failed} for stage in self.stages}
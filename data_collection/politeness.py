@@ -0,0 +1,216 @@
+from data_collection.metrics import NULL_METRICS
+from datetime import datetime
+import json
+import random
+import requests
+import threading
+import time
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    '''
+    Returns whether a failed request is worth trying again: connection errors, timeouts, and 429 and 5xx responses.
+    '''
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+class rate_limiter:
+    '''
+    A token bucket shared by every thread that sends requests to the site, whose rate is adjusted by additive increase and multiplicative decrease (AIMD).
+    The rate grows by a fixed step after each fast, successful response and is cut by a factor after a throttled or failed response, or one slower than latency_target.
+    A rate of None or 0 disables the limiter.
+
+    Attributes
+    ----------
+    rate: float or None
+        The current number of requests per second, starting at the rate parameter.
+    min_rate: float
+        The lowest rate the limiter slows down to (equal to min_rate parameter, a tenth of rate if it is None).
+    max_rate: float
+        The highest rate the limiter speeds up to (equal to max_rate parameter, five times rate if it is None).
+    burst: int
+        The number of requests that can be sent at once after the limiter has been idle (equal to burst parameter).
+    increase: float
+        The number of requests per second added to the rate after each fast, successful response (equal to increase parameter, a twentieth of rate if it is None).
+    decrease: float
+        The factor the rate is multiplied by after a throttled or slow response (equal to decrease parameter).
+    latency_target: float
+        The number of seconds above which a response is taken as a sign that the site is under load (equal to latency_target parameter).
+    metrics: metrics_registry
+        Records the time spent waiting for tokens and the number of slowdowns (equal to metrics parameter, disabled if it is None).
+    '''
+    def __init__(self, rate: float = 1, min_rate: float = None, max_rate: float = None, burst: int = 1, increase: float = None,
+                 decrease: float = 0.5, latency_target: float = 2, metrics=None):
+        '''
+        See help(rate_limiter) for accurate signature.
+        '''
+        self.rate = rate or None
+        self.min_rate = min_rate or (rate or 0) / 10
+        self.max_rate = max_rate or (rate or 0) * 5
+        self.burst = burst
+        self.increase = increase or (rate or 0) / 20
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.metrics = metrics or NULL_METRICS
+        self.__tokens = burst
+        self.__updated = time.monotonic()
+        self.__paused_until = 0
+        self.__last_decrease = 0
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Waits until a request may be sent. Tokens are reserved in arrival order, so concurrent callers are spaced out rather than woken together.
+        '''
+        if self.rate is None:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            wait = max(-self.__tokens / self.rate, self.__paused_until - now)
+        if wait > 0:
+            with self.metrics.timer('rate_limit_wait_seconds'):
+                time.sleep(wait)
+
+    def record(self, seconds: float, throttled: bool = False, retry_after: float = None):
+        '''
+        Adjusts the rate after a response.
+        Parameters
+        ----------
+        seconds: float
+            The time the request took.
+        throttled: bool
+            Whether the request failed or was answered with a 429 or 5xx status.
+        retry_after: float
+            The number of seconds the site asked to wait for in a Retry-After header, if any. No request is sent until they have passed.
+        '''
+        if self.rate is None:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            if retry_after is not None:
+                self.__paused_until = max(self.__paused_until, now + retry_after)
+            if throttled or seconds > self.latency_target:
+                # Responses to requests sent before the last decrease do not count against the new rate.
+                if now - self.__last_decrease >= 1 / self.rate:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self.__last_decrease = now
+                    self.metrics.increment('rate_limit_decreases_total')
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class retry_policy:
+    '''
+    Retries a failing call with capped exponential backoff and full jitter, up to a maximum number of attempts.
+
+    Attributes
+    ----------
+    max_attempts: int
+        The number of times a call is tried before its last error is raised (equal to max_attempts parameter).
+    base_delay: float
+        The number of seconds the backoff starts from (equal to base_delay parameter).
+    max_delay: float
+        The longest backoff in seconds (equal to max_delay parameter).
+    retry_on: callable
+        A function that returns whether an error is worth retrying (equal to retry_on parameter).
+    metrics: metrics_registry
+        Counts the retries (equal to metrics parameter, disabled if it is None).
+    '''
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1, max_delay: float = 30, retry_on=is_retryable, metrics=None):
+        '''
+        See help(retry_policy) for accurate signature.
+        '''
+        if max_attempts < 1:
+            raise ValueError('max_attempts must be a positive integer')
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.metrics = metrics or NULL_METRICS
+        self.__random = random.Random()
+
+    def backoff(self, attempt: int) -> float:
+        '''
+        Returns the number of seconds to wait before trying again after a number of failed attempts, starting from 1.
+        '''
+        return self.__random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, function, *args, **kwargs):
+        '''
+        Calls a function, retrying it while it raises retryable errors and it has attempts left.
+
+        Returns
+        -------
+        The value returned by the function.
+        '''
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return function(*args, **kwargs)
+            except Exception as error:
+                if attempt == self.max_attempts or not self.retry_on(error):
+                    raise
+                self.metrics.increment('retries_total')
+                time.sleep(self.backoff(attempt))
+
+
+class dead_letter_list:
+    '''
+    The links that could not be scraped in a run, with the error each one failed with, so that they can be inspected or retried later.
+    '''
+    def __init__(self):
+        '''
+        See help(dead_letter_list) for accurate signature.
+        '''
+        self.__entries = []
+        self.__lock = threading.Lock()
+
+    def add(self, link: str, error, stage: str = 'scrape'):
+        '''
+        Records a link that failed.
+        Parameters
+        ----------
+        link: str
+            The link to a film entry on letterboxd.com.
+        error: Exception or str
+            The error the link failed with.
+        stage: str
+            The step that failed, e.g. 'scrape' or 'refresh'.
+        '''
+        entry = {'link': link, 'stage': stage, 'error': error if isinstance(error, str) else repr(error), 'time': datetime.now().isoformat(timespec='seconds')}
+        with self.__lock:
+            self.__entries.append(entry)
+
+    def links(self) -> list:
+        '''
+        Returns the links that failed, in the order they were recorded.
+        '''
+        with self.__lock:
+            return [entry['link'] for entry in self.__entries]
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__entries)
+
+    def __iter__(self):
+        with self.__lock:
+            return iter(list(self.__entries))
+
+    def write(self, path: str = 'dead_letters.jsonl'):
+        '''
+        Appends every entry to a JSON Lines file.
+        Parameters
+        ----------
+        path: str
+            The path of the JSON Lines file.
+        '''
+        with open(path, 'a') as dead_letter_file:
+            for entry in self:
+                dead_letter_file.write(json.dumps(entry) + '\n')
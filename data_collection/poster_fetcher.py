@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+from data_collection.metrics import NULL_METRICS
+from requests.adapters import HTTPAdapter
+from urllib.parse import parse_qs, urlparse
+import json
+import os
+import requests
+import threading
+
+
+class poster_fetcher:
+    '''
+    Downloads film posters concurrently with a shared HTTP session, streaming each image to disk in chunks, or appending it to a raw_archive.
+    A download is skipped when the poster's version ('?v=...') is unchanged since it was last stored, and otherwise made conditional on the stored ETag and Last-Modified validators.
+
+    Attributes
+    ----------
+    session: requests.Session
+        A pooled HTTP session with keep-alive that is reused for every download.
+    timeout: float
+        The number of seconds to wait for the server before giving up (equal to timeout parameter).
+    chunk_size: int
+        The number of bytes written to disk at a time (equal to chunk_size parameter).
+    validators_path: str
+        The path of the JSON file the poster versions and validators are stored in (equal to validators_path parameter).
+    bytes_downloaded: int
+        The number of poster bytes downloaded since the fetcher was created.
+    metrics: metrics_registry
+        Records the time taken by each download and the bytes downloaded (equal to metrics parameter, disabled if it is None).
+    archive: raw_archive or None
+        The archive posters are stored in instead of at their paths (equal to archive parameter).
+    '''
+    def __init__(self, max_in_flight: int = 8, timeout: float = 10, chunk_size: int = 65536, validators_path: str = 'poster_validators.json',
+                 metrics=None, archive=None):
+        '''
+        See help(poster_fetcher) for accurate signature.
+        '''
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_in_flight, pool_maxsize=max_in_flight)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.validators_path = validators_path
+        self.bytes_downloaded = 0
+        self.metrics = metrics or NULL_METRICS
+        self.archive = archive
+        self.__executor = ThreadPoolExecutor(max_workers=max_in_flight)
+        self.__futures = []
+        self.__lock = threading.Lock()
+        self.__validators = {}
+        if os.path.exists(validators_path):
+            with open(validators_path) as validators_file:
+                self.__validators = json.load(validators_file)
+
+    def __poster_version(self, poster_link: str):
+        return parse_qs(urlparse(poster_link).query).get('v', [None])[0]
+
+    def fetch(self, friendly_id: str, poster_link: str, path: str) -> str:
+        '''
+        Downloads a single poster to disk, or to the archive if the fetcher has one, unless the stored copy is still current.
+        Parameters
+        ----------
+        friendly_id: str
+            The 'friendly_id' of the film the poster belongs to.
+        poster_link: str
+            The URL of the poster image.
+        path: str or None
+            The path the poster is saved to, unused if the fetcher has an archive.
+
+        Returns
+        -------
+        str
+            'skipped' if the version was unchanged, 'not_modified' if the server confirmed the stored copy is current, otherwise 'downloaded'.
+        '''
+        version = self.__poster_version(poster_link)
+        with self.__lock:
+            stored = dict(self.__validators.get(friendly_id, {}))
+        file_exists = self.archive.has_poster(friendly_id) if self.archive is not None else os.path.exists(path)
+        if file_exists and version is not None and stored.get('version') == version:
+            return 'skipped'
+        headers = {}
+        if file_exists and stored.get('url') == poster_link:
+            if stored.get('etag'):
+                headers['If-None-Match'] = stored['etag']
+            if stored.get('last_modified'):
+                headers['If-Modified-Since'] = stored['last_modified']
+        with self.session.get(poster_link, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 304:
+                return 'not_modified'
+            response.raise_for_status()
+            if self.archive is not None:
+                image = b''.join(response.iter_content(chunk_size=self.chunk_size))
+                self.archive.put_poster(friendly_id, image)
+                n_bytes = len(image)
+            else:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                n_bytes = 0
+                with open(f'{path}.part', 'wb') as image_file:
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        image_file.write(chunk)
+                        n_bytes += len(chunk)
+                os.replace(f'{path}.part', path)
+            self.metrics.increment('poster_bytes_downloaded_total', n_bytes)
+            with self.__lock:
+                self.bytes_downloaded += n_bytes
+                self.__validators[friendly_id] = {'url': poster_link,
+                                                  'version': version,
+                                                  'etag': response.headers.get('ETag'),
+                                                  'last_modified': response.headers.get('Last-Modified')}
+        return 'downloaded'
+
+    def __fetch_and_call(self, friendly_id: str, poster_link: str, path: str, on_fetched) -> str:
+        with self.metrics.timer('poster_download_seconds'):
+            status = self.fetch(friendly_id, poster_link, path)
+        self.metrics.increment('posters_total', labels={'status': status})
+        if on_fetched is not None:
+            on_fetched(status)
+        return status
+
+    def submit(self, friendly_id: str, poster_link: str, path: str, on_fetched=None):
+        '''
+        Queues a poster to be downloaded on one of the fetcher's threads.
+        Parameters
+        ----------
+        friendly_id: str
+            The 'friendly_id' of the film the poster belongs to.
+        poster_link: str
+            The URL of the poster image.
+        path: str or None
+            The path the poster is saved to, unused if the fetcher has an archive.
+        on_fetched: callable or None
+            A function called on the download thread with the status once the poster is on disk. The returned future is not done until it has returned.
+
+        Returns
+        -------
+        future: concurrent.futures.Future
+            A future whose result is the status returned by fetch.
+        '''
+        future = self.__executor.submit(self.__fetch_and_call, friendly_id, poster_link, path, on_fetched)
+        with self.__lock:
+            self.__futures = [pending for pending in self.__futures if not pending.done()]
+            self.__futures.append(future)
+        return future
+
+    def save_validators(self):
+        '''
+        Writes the stored poster versions and validators to disk.
+        '''
+        with self.__lock:
+            validators = dict(self.__validators)
+        os.makedirs(os.path.dirname(self.validators_path) or '.', exist_ok=True)
+        with open(f'{self.validators_path}.part', 'w') as validators_file:
+            json.dump(validators, validators_file)
+        os.replace(f'{self.validators_path}.part', self.validators_path)
+
+    def wait(self):
+        '''
+        Blocks until every queued download has finished and saves the validators.
+        Downloads that failed are reported and dropped.
+        '''
+        with self.__lock:
+            futures = self.__futures
+            self.__futures = []
+        wait(futures)
+        for future in futures:
+            if future.exception() is not None:
+                print(f'Failed to download poster: {future.exception()}')
+        self.save_validators()
+
+    def close(self):
+        '''
+        Waits for every queued download and shuts down the download threads.
+        '''
+        self.wait()
+        self.__executor.shutdown()
+        self.session.close()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+
+
+INDEX_ENTRY = struct.Struct('<c16sQI')
+RECORD = b'r'
+POSTER = b'p'
+SEGMENT_FILES = {'records': '.jsonl', 'posters': '.pack', 'index': '.idx'}
+
+
+def archive_key(friendly_id: str) -> bytes:
+    '''
+    Returns the 16 byte BLAKE2b digest a film is indexed by.
+    '''
+    return hashlib.blake2b(friendly_id.encode(), digest_size=16).digest()
+
+
+class raw_archive:
+    '''
+    An append-only store of raw film data made of numbered segments, instead of a directory per film.
+    Each segment has three files: 'segment-<n>.jsonl' with one JSON record per line, 'segment-<n>.pack' with poster images back to back, and 'segment-<n>.idx' with a fixed-size entry per record or poster giving its kind, the archive_key of its 'friendly_id', its offset and its length.
+    A segment is sealed once either data file would grow past segment_bytes, and when the archive is closed. Sealed segments are never written again, so they can be shipped whole. Segments left unsealed by a run that stopped early are sealed when the archive is next opened, or later by seal_leftovers if seal_leftovers is False, e.g. once on_sealed knows where to ship them.
+    The indexes of every segment are loaded into one dictionary, so a film's record or poster is found in O(1) and read from a memory-mapped segment file. A film stored again is read from its latest entry.
+
+    Attributes
+    ----------
+    root_dir: str
+        The directory the segments are kept in (equal to root_dir parameter).
+    segment_bytes: int
+        The size in bytes at which a segment is sealed and a new one started (equal to segment_bytes parameter).
+    on_sealed: callable or None
+        A function called with the number and paths of each segment once it is sealed (equal to on_sealed parameter).
+    '''
+    def __init__(self, root_dir: str = 'raw_data_archive', segment_bytes: int = 64 * 1024 * 1024, on_sealed=None, seal_leftovers: bool = True):
+        '''
+        See help(raw_archive) for accurate signature.
+        '''
+        self.root_dir = root_dir
+        self.segment_bytes = segment_bytes
+        self.on_sealed = on_sealed
+        self.__index = {}
+        self.__maps = {}
+        self.__sealed = []
+        self.__active = None
+        self.__files = {}
+        self.__lock = threading.RLock()
+        os.makedirs(root_dir, exist_ok=True)
+        segments = sorted(int(match.group(1)) for match in map(re.compile(r'segment-(\d+)\.idx$').match, os.listdir(root_dir)) if match)
+        self.__next_segment = segments[-1] + 1 if len(segments) > 0 else 0
+        self.__leftovers = []
+        for segment in segments:
+            self.__load_index(segment)
+            if os.path.exists(self.__marker_path(segment)):
+                self.__sealed.append(segment)
+            else:
+                self.__leftovers.append(segment)
+        if seal_leftovers:
+            self.seal_leftovers()
+
+    def seal_leftovers(self):
+        '''
+        Seals the segments left unsealed by a run that stopped early, passing each to on_sealed. New data is never written to them.
+        '''
+        with self.__lock:
+            leftovers = self.__leftovers
+            self.__leftovers = []
+        for segment in leftovers:
+            self.__seal_segment(segment)
+
+    def segment_paths(self, segment: int) -> dict:
+        '''
+        Returns the paths of the 'records', 'posters' and 'index' files of a segment.
+        '''
+        return {name: os.path.join(self.root_dir, f'segment-{segment:06d}{suffix}') for name, suffix in SEGMENT_FILES.items()}
+
+    def __marker_path(self, segment: int) -> str:
+        return os.path.join(self.root_dir, f'segment-{segment:06d}.sealed')
+
+    def __load_index(self, segment: int):
+        with open(self.segment_paths(segment)['index'], 'rb') as index_file:
+            index_bytes = index_file.read()
+        # A torn entry at the end, left by a run that stopped mid-write, is ignored.
+        for offset in range(0, len(index_bytes) - len(index_bytes) % INDEX_ENTRY.size, INDEX_ENTRY.size):
+            kind, key, data_offset, length = INDEX_ENTRY.unpack_from(index_bytes, offset)
+            self.__index[(kind, key)] = (segment, data_offset, length)
+
+    def __open_segment(self):
+        self.__active = self.__next_segment
+        self.__next_segment += 1
+        paths = self.segment_paths(self.__active)
+        self.__files = {name: open(path, 'ab') for name, path in paths.items()}
+
+    def __seal_segment(self, segment: int):
+        with open(self.__marker_path(segment), 'w'):
+            pass
+        self.__sealed.append(segment)
+        if self.on_sealed is not None:
+            self.on_sealed(segment, self.segment_paths(segment))
+
+    def __close_active(self) -> int:
+        segment = self.__active
+        for segment_file in self.__files.values():
+            segment_file.close()
+        self.__files = {}
+        self.__active = None
+        return segment
+
+    def __append(self, kind: bytes, friendly_id: str, data: bytes):
+        sealed = None
+        with self.__lock:
+            data_file_name = 'records' if kind == RECORD else 'posters'
+            if self.__active is not None:
+                size = self.__files[data_file_name].tell()
+                if size > 0 and size + len(data) > self.segment_bytes:
+                    sealed = self.__close_active()
+            if self.__active is None:
+                self.__open_segment()
+            data_file = self.__files[data_file_name]
+            offset = data_file.tell()
+            data_file.write(data + b'\n' if kind == RECORD else data)
+            data_file.flush()
+            key = archive_key(friendly_id)
+            self.__files['index'].write(INDEX_ENTRY.pack(kind, key, offset, len(data)))
+            self.__files['index'].flush()
+            self.__index[(kind, key)] = (self.__active, offset, len(data))
+        # The segment is handed on outside the lock, so on_sealed can read from the archive.
+        if sealed is not None:
+            self.__seal_segment(sealed)
+
+    def put_record(self, film_data_dic: dict):
+        '''
+        Appends the JSON record of a film to the active segment.
+        Parameters
+        ----------
+        film_data_dic: dict
+            A dictionary containing all scraped data for a single film.
+        '''
+        self.__append(RECORD, film_data_dic['friendly_id'], json.dumps(dict(film_data_dic), default=str).encode())
+
+    def put_poster(self, friendly_id: str, image: bytes):
+        '''
+        Appends a film's poster image to the active segment.
+        Parameters
+        ----------
+        friendly_id: str
+            The 'friendly_id' of the film the poster belongs to.
+        image: bytes
+            The poster image.
+        '''
+        self.__append(POSTER, friendly_id, image)
+
+    def __map(self, segment: int, name: str, end: int):
+        mapped = self.__maps.get((segment, name))
+        if mapped is None or len(mapped) < end:
+            if mapped is not None:
+                mapped.close()
+            with open(self.segment_paths(segment)[name], 'rb') as segment_file:
+                mapped = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.__maps[(segment, name)] = mapped
+        return mapped
+
+    def __read(self, kind: bytes, friendly_id: str) -> bytes:
+        with self.__lock:
+            location = self.__index.get((kind, archive_key(friendly_id)))
+            if location is None:
+                return None
+            segment, offset, length = location
+            if length == 0:
+                return b''
+            # The active segment keeps growing, so it is remapped when an entry lies past the end of its current mapping.
+            mapped = self.__map(segment, 'records' if kind == RECORD else 'posters', offset + length)
+            return mapped[offset:offset + length]
+
+    def get_record(self, friendly_id: str) -> dict:
+        '''
+        Returns the latest JSON record of a film, or None if it is not in the archive.
+        '''
+        record = self.__read(RECORD, friendly_id)
+        return None if record is None else json.loads(record)
+
+    def get_poster(self, friendly_id: str) -> bytes:
+        '''
+        Returns the latest poster image of a film, or None if it is not in the archive.
+        '''
+        return self.__read(POSTER, friendly_id)
+
+    def has_record(self, friendly_id: str) -> bool:
+        with self.__lock:
+            return (RECORD, archive_key(friendly_id)) in self.__index
+
+    def has_poster(self, friendly_id: str) -> bool:
+        with self.__lock:
+            return (POSTER, archive_key(friendly_id)) in self.__index
+
+    def sealed_segments(self) -> list:
+        '''
+        Returns the numbers of the sealed segments still in the archive.
+        '''
+        with self.__lock:
+            return list(self.__sealed)
+
+    def seal(self):
+        '''
+        Seals the active segment, if anything has been written to it, so that the next write starts a new segment.
+        '''
+        with self.__lock:
+            if self.__active is None:
+                return
+            sealed = self.__close_active()
+        self.__seal_segment(sealed)
+
+    def remove_segment(self, segment: int):
+        '''
+        Deletes the files of a sealed segment, e.g. once it has been shipped, and forgets the films stored in it.
+        '''
+        with self.__lock:
+            if segment not in self.__sealed:
+                raise ValueError(f'segment {segment} is not sealed')
+            self.__sealed.remove(segment)
+            self.__index = {entry: location for entry, location in self.__index.items() if location[0] != segment}
+            for name in SEGMENT_FILES:
+                mapped = self.__maps.pop((segment, name), None)
+                if mapped is not None:
+                    mapped.close()
+            for path in list(self.segment_paths(segment).values()) + [self.__marker_path(segment)]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self):
+        '''
+        Seals the active segment and unmaps every segment file.
+        '''
+        self.seal()
+        with self.__lock:
+            for mapped in self.__maps.values():
+                mapped.close()
+            self.__maps = {}
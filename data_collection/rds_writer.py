@@ -0,0 +1,203 @@
+from data_collection.metrics import NULL_METRICS
+from sqlalchemy import BigInteger, Column, Float, MetaData, Table, Text, bindparam, text
+from sqlalchemy.dialects import postgresql, sqlite
+import atexit
+import csv
+import io
+import math
+import threading
+
+
+FILM_DATA_COLUMNS = [('friendly_id', Text), ('uuid', Text), ('title', Text), ('year', BigInteger), ('runtime', BigInteger),
+                     ('rating', Float), ('watches', BigInteger), ('lists', BigInteger), ('likes', BigInteger), ('director', Text),
+                     ('top_250_position', BigInteger), ('description', Text), ('poster_link', Text), ('data_obtained_time', Text)]
+
+
+class rds_writer:
+    '''
+    A buffered writer that stores cleaned film data in a database table in batches.
+    Rows are flushed in a single transaction every 'batch_size' rows or 'flush_interval' seconds, and when the writer is closed or the program exits.
+    On PostgreSQL rows are loaded with COPY, on other databases with a multi-row executemany. With update_columns only those columns of the existing rows are updated in place, matched on 'friendly_id'.
+
+    Attributes
+    ----------
+    engine: sqlalchemy database connection
+        The database the rows are written to (equal to engine parameter).
+    table_name: str
+        The name of the table the rows are written to (equal to table_name parameter).
+    batch_size: int
+        The number of buffered rows that triggers a flush (equal to batch_size parameter).
+    flush_interval: float
+        The maximum number of seconds a row stays in the buffer (equal to flush_interval parameter).
+    upsert: bool
+        Whether rows with an existing 'friendly_id' update the stored row instead of adding a duplicate (equal to upsert parameter).
+    update_columns: list of str or None
+        The columns updated in the stored rows instead of inserting new rows, or None to insert (equal to update_columns parameter).
+    rows_written: int
+        The number of rows written since the writer was created.
+    metrics: metrics_registry
+        Records the time taken by each flush and the rows written (equal to metrics parameter, disabled if it is None).
+    '''
+    def __init__(self, engine, table_name: str = 'film_data', batch_size: int = 50, flush_interval: float = 30, upsert: bool = False,
+                 update_columns: list = None, metrics=None):
+        '''
+        See help(rds_writer) for accurate signature.
+        '''
+        self.engine = engine
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.upsert = upsert
+        self.update_columns = update_columns
+        self.rows_written = 0
+        self.metrics = metrics or NULL_METRICS
+        self.__table = Table(table_name, MetaData(), *[Column(name, column_type) for name, column_type in FILM_DATA_COLUMNS])
+        self.__buffer = []
+        self.__lock = threading.RLock()
+        self.__table_ready = False
+        self.__closed = threading.Event()
+        self.__flusher = threading.Thread(target=self.__flush_periodically, daemon=True)
+        self.__flusher.start()
+        atexit.register(self.close)
+
+    def __flush_periodically(self):
+        while not self.__closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as error:
+                # The rows stay in the buffer, so they are written by a later flush once the database is reachable again.
+                print(f'Failed to flush {self.table_name} rows: {error!r}. Retrying in {self.flush_interval} seconds...')
+                self.metrics.increment('rds_flush_failures_total')
+
+    def __to_row(self, film_data_dic: dict) -> dict:
+        row = {}
+        for name, _ in FILM_DATA_COLUMNS:
+            value = film_data_dic.get(name)
+            if isinstance(value, float) and math.isnan(value):
+                value = None
+            elif hasattr(value, 'item'):
+                value = value.item()
+            if name == 'data_obtained_time' and value is not None:
+                value = str(value)
+            row[name] = value
+        return row
+
+    def __prepare_table(self, connection):
+        if self.__table_ready:
+            return
+        self.__table.metadata.create_all(connection)
+        if self.upsert:
+            self.__remove_duplicates(connection)
+            connection.execute(text(f'CREATE UNIQUE INDEX IF NOT EXISTS {self.table_name}_friendly_id_key ON {self.table_name} (friendly_id)'))
+        self.__table_ready = True
+
+    def __remove_duplicates(self, connection):
+        # Tables written without upsert can hold several rows per film, which would stop the unique index on 'friendly_id' from being created.
+        duplicated = connection.execute(text(f'SELECT friendly_id FROM {self.table_name} GROUP BY friendly_id HAVING COUNT(*) > 1')).fetchall()
+        if len(duplicated) == 0:
+            return
+        row_id = {'postgresql': 'ctid', 'sqlite': 'rowid'}.get(self.engine.dialect.name)
+        if row_id is None:
+            raise RuntimeError(f"{self.table_name} has several rows for {len(duplicated)} films, so upsert cannot add a unique index on 'friendly_id'. "
+                               f"Delete all but the latest row of each film, e.g. by 'data_obtained_time', and try again.")
+        # The row scraped most recently is kept, and the last one inserted if several were scraped at the same time.
+        removed = connection.execute(text(f'DELETE FROM {self.table_name} WHERE {row_id} IN ('
+                                          f'SELECT {row_id} FROM (SELECT {row_id}, ROW_NUMBER() OVER (PARTITION BY friendly_id '
+                                          f'ORDER BY data_obtained_time DESC NULLS LAST, {row_id} DESC) AS row_number FROM {self.table_name}) AS ranked '
+                                          f'WHERE row_number > 1)')).rowcount
+        print(f'Removed {removed} duplicate rows of {len(duplicated)} films from {self.table_name} before adding a unique index on friendly_id.')
+
+    def __upsert_statement(self, insert_statement):
+        update_columns = {name: insert_statement.excluded[name] for name, _ in FILM_DATA_COLUMNS if name != 'friendly_id'}
+        return insert_statement.on_conflict_do_update(index_elements=['friendly_id'], set_=update_columns)
+
+    def __copy_rows(self, connection, rows: list):
+        column_names = ', '.join(name for name, _ in FILM_DATA_COLUMNS)
+        copy_buffer = io.StringIO()
+        csv_writer = csv.writer(copy_buffer)
+        for row in rows:
+            csv_writer.writerow(['\\N' if value is None else value for value in row.values()])
+        copy_buffer.seek(0)
+        target = self.table_name
+        if self.upsert:
+            target = f'{self.table_name}_staging'
+            connection.execute(text(f'CREATE TEMP TABLE {target} (LIKE {self.table_name} INCLUDING DEFAULTS) ON COMMIT DROP'))
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(f"COPY {target} ({column_names}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", copy_buffer)
+        if self.upsert:
+            update_columns = ', '.join(f'{name} = EXCLUDED.{name}' for name, _ in FILM_DATA_COLUMNS if name != 'friendly_id')
+            # DISTINCT ON keeps the last buffered row for a film that was written twice in one batch.
+            connection.execute(text(f'INSERT INTO {self.table_name} ({column_names}) '
+                                    f'SELECT DISTINCT ON (friendly_id) {column_names} FROM {target} ORDER BY friendly_id, data_obtained_time DESC '
+                                    f'ON CONFLICT (friendly_id) DO UPDATE SET {update_columns}'))
+
+    def __insert_rows(self, connection, rows: list):
+        dialect = self.engine.dialect.name
+        if self.upsert and dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            latest_rows = {row['friendly_id']: row for row in rows}
+            connection.execute(self.__upsert_statement(insert(self.__table)), list(latest_rows.values()))
+        else:
+            connection.execute(self.__table.insert(), rows)
+
+    def __update_rows(self, connection, rows: list):
+        statement = self.__table.update().where(self.__table.c.friendly_id == bindparam('match_friendly_id'))
+        latest_rows = {row['friendly_id']: row for row in rows}
+        connection.execute(statement, [{'match_friendly_id': friendly_id, **{name: row[name] for name in self.update_columns}}
+                                       for friendly_id, row in latest_rows.items()])
+
+    def write(self, film_data_dic: dict):
+        '''
+        Adds the data for a single film to the buffer, flushing the buffer if it is full.
+        Parameters
+        ----------
+        film_data_dic: dict
+            A dictionary containing all cleaned data for a single film.
+        '''
+        with self.__lock:
+            self.__buffer.append(self.__to_row(film_data_dic))
+            if len(self.__buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        '''
+        Writes every buffered row to the table in a single transaction.
+        '''
+        with self.__lock:
+            if len(self.__buffer) == 0:
+                return
+            self.__write_rows(self.__buffer)
+            self.__buffer = []
+
+    def __write_rows(self, rows: list):
+        with self.metrics.timer('rds_flush_seconds'), self.engine.begin() as connection:
+            self.__prepare_table(connection)
+            if self.update_columns is not None:
+                self.__update_rows(connection, rows)
+            elif self.engine.dialect.name == 'postgresql' and self.engine.dialect.driver == 'psycopg2':
+                self.__copy_rows(connection, rows)
+            else:
+                self.__insert_rows(connection, rows)
+        self.rows_written += len(rows)
+        self.metrics.increment('rds_rows_written_total', len(rows))
+
+    def write_batch(self, film_data_dic_list: list):
+        '''
+        Writes the data for a batch of films in a single transaction straight away, without buffering it, e.g. for a write_behind_spool.
+        If the transaction fails the error is raised and nothing is left buffered, so the batch can be retried without writing its rows twice.
+        Parameters
+        ----------
+        film_data_dic_list: list of dict
+            A dictionary containing all cleaned data for each film.
+        '''
+        if len(film_data_dic_list) == 0:
+            return
+        with self.__lock:
+            self.__write_rows([self.__to_row(film_data_dic) for film_data_dic in film_data_dic_list])
+
+    def close(self):
+        '''
+        Flushes any buffered rows and stops the periodic flush.
+        '''
+        self.__closed.set()
+        self.flush()
@@ -0,0 +1,104 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Column, MetaData, Table, Text, inspect, select
+import heapq
+import math
+
+
+class refresh_scheduler:
+    '''
+    Decides which films already stored in the film_data table have their stats refreshed next.
+    Each film's priority is the time since its data was obtained, weighted by its popularity rank so that the most watched films, whose stats change fastest, are refreshed more often. Films are ranked by their stored 'watches'.
+
+    Attributes
+    ----------
+    engine: sqlalchemy database connection
+        The database containing the film_data table (equal to engine parameter).
+    table_name: str
+        The name of the table containing scraped film data (equal to table_name parameter).
+    budget: int
+        The maximum number of films scheduled per run (equal to budget parameter).
+    min_age: float
+        The number of seconds before a film's stats may be refreshed again (equal to min_age parameter).
+    '''
+    def __init__(self, engine, table_name: str = 'film_data', budget: int = 100, min_age: float = 24 * 60 * 60):
+        '''
+        See help(refresh_scheduler) for accurate signature.
+        '''
+        if budget < 1:
+            raise ValueError('budget must be a positive integer')
+        self.engine = engine
+        self.table_name = table_name
+        self.budget = budget
+        self.min_age = min_age
+        self.__table = Table(table_name, MetaData(), Column('friendly_id', Text), Column('watches', BigInteger), Column('data_obtained_time', Text))
+
+    def __obtained_timestamp(self, data_obtained_time) -> float:
+        try:
+            return datetime.fromisoformat(str(data_obtained_time)).timestamp()
+        except ValueError:
+            return 0
+
+    def load_films(self) -> dict:
+        '''
+        Reads the 'watches' and latest 'data_obtained_time' of every stored film with a single query.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each 'friendly_id' to a tuple of its 'watches' (None if unknown) and the timestamp its data was last obtained.
+        '''
+        films = {}
+        if not inspect(self.engine).has_table(self.table_name):
+            return films
+        statement = select(self.__table.c.friendly_id, self.__table.c.watches, self.__table.c.data_obtained_time)
+        with self.engine.connect() as connection:
+            for friendly_id, watches, data_obtained_time in connection.execute(statement):
+                obtained_timestamp = self.__obtained_timestamp(data_obtained_time)
+                if friendly_id not in films or obtained_timestamp > films[friendly_id][1]:
+                    films[friendly_id] = (watches, obtained_timestamp)
+        return films
+
+    def priority(self, age: float, rank: int) -> float:
+        '''
+        Returns the refresh priority of a film.
+        Parameters
+        ----------
+        age: float
+            The number of seconds since the film's data was obtained.
+        rank: int
+            The film's popularity rank, starting from 1 for the most watched film.
+
+        Returns
+        -------
+        float
+            The priority, higher for staler and more popular films.
+        '''
+        return age / math.log2(rank + 1)
+
+    def schedule(self, films: dict = None, now: float = None) -> list:
+        '''
+        Returns the films to refresh in this run, most urgent first.
+        Parameters
+        ----------
+        films: dict
+            The stored films as returned by load_films, which is called if this is None.
+        now: float
+            The current timestamp, or None to use the current time.
+
+        Returns
+        -------
+        list of str
+            At most 'budget' 'friendly_id's, ordered by descending priority, leaving out films refreshed less than 'min_age' seconds ago.
+        '''
+        if films is None:
+            films = self.load_films()
+        if now is None:
+            now = datetime.now().timestamp()
+        # Films without a stored 'watches' count are ranked as the least popular.
+        ranked_ids = sorted(films, key=lambda friendly_id: (films[friendly_id][0] is None, -(films[friendly_id][0] or 0), friendly_id))
+        priorities = []
+        for rank, friendly_id in enumerate(ranked_ids, start=1):
+            age = now - films[friendly_id][1]
+            if age >= self.min_age:
+                priorities.append((self.priority(age, rank), friendly_id))
+        return [friendly_id for _, friendly_id in heapq.nlargest(self.budget, priorities)]
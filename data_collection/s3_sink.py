@@ -0,0 +1,211 @@
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor, wait
+from data_collection.metrics import NULL_METRICS
+from datetime import datetime
+import boto3
+import hashlib
+import json
+import threading
+import uuid
+
+
+class s3_sink:
+    '''
+    Uploads raw film data to an s3 bucket straight from memory, using one shared client and a bounded pool of upload threads.
+    In batch mode the JSON records for a page of films are combined into a single JSON Lines object with a manifest instead of one object per film.
+
+    Attributes
+    ----------
+    bucket: str
+        The name of the s3 bucket (equal to bucket parameter).
+    client: boto3 s3 client
+        A client shared by every upload, with a connection pool sized to max_workers.
+    batch_records: bool
+        Whether JSON records are batched into one object per page (equal to batch_records parameter).
+    run_id: str
+        The id of this run. Batches are uploaded under 'raw_data/batches/<run_id>/', so that later runs never overwrite them.
+    max_attempts: int
+        The number of times an upload is attempted before it is recorded as failed (equal to max_attempts parameter).
+    failed_keys: list of str
+        The keys of objects that could not be uploaded.
+    metrics: metrics_registry
+        Records the time taken by each upload (equal to metrics parameter, disabled if it is None).
+    '''
+    def __init__(self, bucket: str = 'letterboxd-data-bucket', max_workers: int = 8, max_attempts: int = 5, batch_records: bool = False, client=None,
+                 metrics=None):
+        '''
+        See help(s3_sink) for accurate signature.
+        '''
+        self.bucket = bucket
+        self.max_attempts = max_attempts
+        self.batch_records = batch_records
+        self.run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        if client is None:
+            config = Config(max_pool_connections=max_workers, retries={'max_attempts': max_attempts, 'mode': 'standard'})
+            client = boto3.client('s3', config=config)
+        self.client = client
+        self.failed_keys = []
+        self.metrics = metrics or NULL_METRICS
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.__slots = threading.BoundedSemaphore(max_workers * 2)
+        self.__futures = []
+        self.__records = []
+        self.__lock = threading.Lock()
+
+    def __put_object(self, key: str, body, content_type: str) -> bool:
+        try:
+            with self.metrics.timer('s3_upload_seconds'):
+                if isinstance(body, str):
+                    self.client.upload_file(body, self.bucket, key, ExtraArgs={'ContentType': content_type})
+                else:
+                    self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType=content_type)
+            return True
+        except (BotoCoreError, ClientError) as error:
+            print(f'Failed to upload {key} to s3: {error}')
+            self.metrics.increment('s3_upload_failures_total')
+            with self.__lock:
+                self.failed_keys.append(key)
+            return False
+        finally:
+            self.__slots.release()
+
+    def upload_bytes(self, key: str, body, content_type: str = 'application/octet-stream'):
+        '''
+        Queues an object to be uploaded from memory, or streamed from disk if body is a path. Blocks if too many uploads are already waiting.
+        Parameters
+        ----------
+        key: str
+            The key of the object in the bucket.
+        body: bytes or str
+            The contents of the object, or the path of a file containing them.
+        content_type: str
+            The MIME type of the object.
+
+        Returns
+        -------
+        future: concurrent.futures.Future
+            Resolves to whether the object was uploaded.
+        '''
+        self.__slots.acquire()
+        future = self.__executor.submit(self.__put_object, key, body, content_type)
+        with self.__lock:
+            self.__futures = [pending for pending in self.__futures if not pending.done()]
+            self.__futures.append(future)
+        return future
+
+    def upload_film(self, film_data_dic: dict, poster=None):
+        '''
+        Queues the raw data for a single film to be uploaded.
+        In batch mode the JSON record is held until flush_batch is called, otherwise it is uploaded as 'raw_data/<friendly_id>/data.json'.
+        Parameters
+        ----------
+        film_data_dic: dict
+            A dictionary containing all scraped data for a single film.
+        poster: bytes or str
+            The film's poster image or the path it was saved to, or None if it is uploaded separately.
+        '''
+        friendly_id = film_data_dic['friendly_id']
+        record = self.__record(film_data_dic)
+        if self.batch_records:
+            with self.__lock:
+                self.__records.append((friendly_id, record))
+        else:
+            self.upload_bytes(f'raw_data/{friendly_id}/data.json', record, 'application/json')
+        if poster is not None:
+            self.upload_poster(friendly_id, poster)
+
+    def __record(self, film_data_dic: dict) -> bytes:
+        return json.dumps(dict(film_data_dic), default=str).encode()
+
+    def upload_records(self, film_data_dic_list: list, batch_name: str) -> list:
+        '''
+        Uploads the JSON records of a list of films and waits for those uploads only, as one batch in batch mode, otherwise one object per film.
+        The records are never added to the records held for flush_batch, so threads uploading their own films do not take each other's records.
+        Parameters
+        ----------
+        film_data_dic_list: list of dict
+            A dictionary containing all scraped data for each film.
+        batch_name: str
+            The name of the batch in batch mode.
+
+        Returns
+        -------
+        failed_keys: list of str
+            The keys of this call's objects that could not be uploaded.
+        '''
+        records = [(film_data_dic['friendly_id'], self.__record(film_data_dic)) for film_data_dic in film_data_dic_list]
+        if self.batch_records:
+            uploads = self.__upload_batch(batch_name, records)
+        else:
+            uploads = {f'raw_data/{friendly_id}/data.json': self.upload_bytes(f'raw_data/{friendly_id}/data.json', record, 'application/json')
+                       for friendly_id, record in records}
+        return [key for key, future in uploads.items() if not future.result()]
+
+    def upload_poster(self, friendly_id: str, poster):
+        '''
+        Queues a film's poster to be uploaded as 'raw_data/<friendly_id>/images/<friendly_id>_poster.jpg'.
+        Parameters
+        ----------
+        friendly_id: str
+            The 'friendly_id' of the film the poster belongs to.
+        poster: bytes or str
+            The poster image or the path it was saved to.
+        '''
+        self.upload_bytes(f'raw_data/{friendly_id}/images/{friendly_id}_poster.jpg', poster, 'image/jpeg')
+
+    def flush_batch(self, batch_name: str):
+        '''
+        Uploads the held JSON records as one JSON Lines object, together with a manifest listing the byte range of each film.
+        Parameters
+        ----------
+        batch_name: str
+            The name of the batch, e.g. the popular page the films were listed on.
+        '''
+        with self.__lock:
+            records = self.__records
+            self.__records = []
+        self.__upload_batch(batch_name, records)
+
+    def __upload_batch(self, batch_name: str, records: list) -> dict:
+        if len(records) == 0:
+            return {}
+        entries = []
+        offset = 0
+        for friendly_id, record in records:
+            entries.append({'friendly_id': friendly_id, 'offset': offset, 'length': len(record)})
+            offset += len(record) + 1
+        body = b'\n'.join(record for _, record in records) + b'\n'
+        key = f'raw_data/batches/{self.run_id}/{batch_name}.jsonl'
+        manifest = {'key': key, 'records': len(entries), 'sha256': hashlib.sha256(body).hexdigest(), 'entries': entries}
+        manifest_key = f'raw_data/batches/{self.run_id}/{batch_name}.manifest.json'
+        return {key: self.upload_bytes(key, body, 'application/x-ndjson'),
+                manifest_key: self.upload_bytes(manifest_key, json.dumps(manifest).encode(), 'application/json')}
+
+    def wait(self) -> list:
+        '''
+        Blocks until every upload queued before the call has finished, including uploads waited for by other threads at the same time.
+
+        Returns
+        -------
+        failed_keys: list of str
+            The keys of objects that could not be uploaded.
+        '''
+        with self.__lock:
+            futures = list(self.__futures)
+        wait(futures)
+        with self.__lock:
+            self.__futures = [pending for pending in self.__futures if not pending.done()]
+        return self.failed_keys
+
+    def close(self, batch_name: str = 'final'):
+        '''
+        Uploads any held records, waits for every upload to finish and shuts down the upload threads.
+        Parameters
+        ----------
+        batch_name: str
+            The name given to any records still held in batch mode.
+        '''
+        self.flush_batch(batch_name)
+        self.wait()
+        self.__executor.shutdown()
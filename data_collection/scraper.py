@@ -1,6 +1,28 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from data_collection.cleaning import clean_batch, clean_film_batch, film_record
+from data_collection.config import parse_run_config
+from data_collection.dedup import scraped_link_index
+from data_collection.dom_scripts import FILM_DATA_SCRIPT, FILM_LINKS_SCRIPT
+from data_collection.driver_pool import create_firefox_driver, driver_pool, profile_directories
+from data_collection.frontier import crawl_frontier
+from data_collection.http_engine import STATS_FIELDS, http_scraper
+from data_collection.leases import default_worker_id, lease_table, parse_page_range_key
+from data_collection.metrics import metrics_registry
+from data_collection.page_cache import page_cache, page_not_cached
+from data_collection.page_fingerprints import page_fingerprint_store
+from data_collection.pipeline import pipeline
+from data_collection.politeness import dead_letter_list, is_retryable, rate_limiter, retry_policy
+from data_collection.poster_fetcher import poster_fetcher
+from data_collection.raw_archive import raw_archive
+from data_collection.rds_writer import rds_writer
+from data_collection.refresh import refresh_scheduler
+from data_collection.s3_sink import s3_sink
+from data_collection.spool import write_behind_spool
+from data_collection.tabular_sinks import csv_sink, parquet_sink
 from datetime import datetime
 from selenium import webdriver
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
@@ -8,15 +30,19 @@ from selenium.webdriver.support.ui import WebDriverWait
 from sqlalchemy import create_engine
 import numpy as np
 import pandas as pd
-import boto3
+import copy
 import json
 import os
 import requests
+import queue
 import shutil
+import threading
 import time
 import uuid
 
 
+DEFAULT_TIMEOUTS = {'page_load': 30, 'element': 10, 'cookies': 10, 'http': 10}
+
 class scraper:
     '''
     A webscraper used to retrieve film data from the 'Popular' section of letterboxd.com
@@ -24,15 +50,31 @@ class scraper:
     Attributes
     ----------
     driver: selenium webdriver instance
-        A driven firefox browser that will be used to navigate letterboxd.com and retrieve data.
+        A driven firefox browser that will be used to navigate letterboxd.com and retrieve data. It is started and navigated to start_url the first time it is used.
+    base_url: str
+        The root URL of the site that is scraped (equal to base_url parameter).
+    politeness_delay: float
+        The number of seconds between requests to the site at the start of a run, or 0 to send requests as fast as possible (equal to politeness_delay parameter).
+    timeouts: dict
+        The number of seconds to wait for a 'page_load', an 'element' to appear, the 'cookies' pop-up and an 'http' response (DEFAULT_TIMEOUTS updated with timeouts parameter).
+    rate_limiter: rate_limiter
+        Spaces out the requests of every thread and webdriver, speeding up while the site responds quickly and slowing down when it throttles or slows.
+    retry_policy: retry_policy
+        Retries page loads and requests that time out or are throttled, with capped exponential backoff, up to max_attempts times. Film entries whose description does not load are reloaded on the same schedule.
+    dead_letters: dead_letter_list
+        The links that could not be scraped or refreshed in this run, and why.
+    lean_browser: bool
+        Whether webdrivers block images, media, web fonts and ad and tracker hosts, and stop waiting for page loads once the DOM is ready (equal to lean_browser parameter).
+    browser_profiles: profile_directories or None
+        Firefox profiles kept in browser_profile_dir and reused by every webdriver, so that Firefox starts warm. None if browser_profile_dir is not given.
     engine: sqlalchemy database connection
-        A connection to my AWS RDS database using the sqlalchemy package.
+        A connection to my AWS RDS database using the sqlalchemy package, or to database_url if it is given.
     film_data_dic_list: list of dict
         An empty list that will be populated with dictionaries containing film data.
     start_page: int
-        The number of the first page in the 'popular' section that the scraper will be scraped for links to film entries (equal to start_page parameter).
+        The number of the first page in the 'popular' section that the scraper will be scraped for links to film entries (equal to start_page parameter, prompted for if it is None).
     pages: int
-        The number of pages in the 'popular' section that the scraper will obtain links to film entries from.
+        The number of pages in the 'popular' section that the scraper will obtain links to film entries from (equal to pages parameter, prompted for if it is None).
     s3_storage_bool: bool
         Boolean corresponding to whether data will be stored in an s3 bucket.
     keep_raw_data_bool: bool
@@ -41,17 +83,94 @@ class scraper:
         Boolean corresponding to whether tabular data will be stored in an RDS database.
     csv_bool: bool
         Boolean corresponding to whether tabular data will be saved locally as a .csv.
+    parquet_bool: bool
+        Boolean corresponding to whether tabular data will be saved locally as Parquet files partitioned by scrape date.
     start_url: str
         The URL of the page the driver will navigate to upon initialisation.
+    scrape_engine: str
+        The engine used to scrape film entries, either 'selenium' or 'http' (equal to scrape_engine parameter).
+    http_scraper: http_scraper
+        A browserless scraper that fetches film entries over plain HTTP, used when scrape_engine is 'http'.
+    page_cache: page_cache or None
+        A persistent cache of pages fetched by http_scraper, stored in page_cache_dir if it is given. With page_cache_replay every page is served from the cache without using the network.
+    metrics: metrics_registry
+        Timers and counters for each step of scraping and storing films, disabled unless metrics is True.
+    workers: int
+        The number of film entries scraped concurrently, each with its own pooled webdriver (equal to workers parameter).
+    pages_per_driver: int
+        The number of pages a pooled webdriver loads before it is replaced (equal to pages_per_driver parameter).
+    driver_pool: driver_pool or None
+        The pool of webdrivers used by scrape_links_concurrently, created on first use.
+    dom_extraction: str
+        How data is read from pages loaded in the webdriver (equal to dom_extraction parameter). 'elements' waits for and reads each element separately, 'script' waits once and reads the whole page with a single execute_script call.
+    link_index: scraped_link_index
+        An in-memory index of the films already stored in the RDS database, loaded with one query on first use.
+    rds_writer: rds_writer
+        A buffered writer that stores tabular data in the RDS database every rds_batch_size films, upserting on 'friendly_id' if rds_upsert is True.
+    stats_writer: rds_writer
+        A buffered writer that updates the stats and 'data_obtained_time' of films already in the RDS database, used by refresh_stats.
+    raw_archive: raw_archive or None
+        Append-only segment files in raw_archive_dir that raw data is kept in instead of a directory per film, if raw_archive_dir is given. Each segment is uploaded to the s3 bucket whole once it is sealed at raw_segment_bytes.
+    poster_fetcher: poster_fetcher
+        Downloads posters concurrently, skipping posters whose version is unchanged since the last scrape.
+    s3_sink: s3_sink
+        Uploads raw data to the s3 bucket from memory on a pool of threads, batching JSON records per page if s3_batch_records is True.
+    csv_sink: csv_sink
+        A batched writer that appends tabular data to 'film_data.csv'.
+    parquet_sink: parquet_sink
+        A streaming writer that saves tabular data as typed Parquet row groups under 'film_data_parquet'.
+    page_fingerprints: page_fingerprint_store or None
+        The fingerprint of each page of the 'popular' section and the rank of each film listed on it, kept in page_fingerprint_path if it is given. Pages that are unchanged since a run that stored all of their films are skipped.
+    spool_path: str or None
+        The path of a durable local spool that films are committed to instead of being stored inline (equal to spool_path parameter).
+    storage_spool: write_behind_spool or None
+        The spool at spool_path, opened once the data storage options are chosen. Background threads drain it to the s3 bucket, the RDS database, the .csv file and the Parquet dataset, as chosen, and films left in it by an earlier run are stored when it is opened.
     '''
-    def __init__(self):
+    def __init__(self, scrape_engine: str = 'selenium', workers: int = 1, pages_per_driver: int = 50, bloom_filter: bool = False,
+                 rds_batch_size: int = 50, rds_upsert: bool = False, s3_batch_records: bool = False, dom_extraction: str = 'elements',
+                 page_cache_dir: str = None, page_cache_replay: bool = False, start_page: int = None, pages: int = None,
+                 metrics: bool = False, base_url: str = 'https://letterboxd.com', database_url: str = None,
+                 politeness_delay: float = 1, max_attempts: int = 3, timeouts: dict = None, lean_browser: bool = False,
+                 browser_profile_dir: str = None, raw_archive_dir: str = None, raw_segment_bytes: int = 64 * 1024 * 1024, spool_path: str = None,
+                 page_fingerprint_path: str = None, films_per_page: int = 72):
         '''
         See help(scraper) for accurate signature.
         '''
-        options = webdriver.FirefoxOptions()
-        options.add_argument("--headless")
-        options.add_argument("window-size=1920,1080")
-        self.driver = webdriver.Firefox(options=options)
+        self.__driver = None
+        self.base_url = base_url
+        self.politeness_delay = politeness_delay
+        self.metrics = metrics_registry(enabled=metrics)
+        unknown_steps = set(timeouts or {}) - set(DEFAULT_TIMEOUTS)
+        if len(unknown_steps) > 0:
+            raise ValueError(f"timeouts can only be set for {', '.join(DEFAULT_TIMEOUTS)}, not {', '.join(sorted(unknown_steps))}")
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.rate_limiter = rate_limiter(1 / politeness_delay if politeness_delay > 0 else None, metrics=self.metrics)
+        self.retry_policy = retry_policy(max_attempts, retry_on=lambda error: is_retryable(error) or isinstance(error, TimeoutException), metrics=self.metrics)
+        self.dead_letters = dead_letter_list()
+        self.lean_browser = lean_browser
+        self.browser_profiles = None
+        if browser_profile_dir is not None:
+            self.browser_profiles = profile_directories(browser_profile_dir)
+
+        if scrape_engine not in ('selenium', 'http'):
+            raise ValueError(f"scrape_engine must be 'selenium' or 'http', not '{scrape_engine}'")
+        self.scrape_engine = scrape_engine
+        self.page_cache = None
+        if page_cache_dir is not None:
+            self.page_cache = page_cache(page_cache_dir, replay=page_cache_replay)
+        self.http_scraper = http_scraper(timeout=self.timeouts['http'], cache=self.page_cache, metrics=self.metrics, base_url=base_url,
+                                         rate_limiter=self.rate_limiter, retry_policy=self.retry_policy)
+        if workers < 1:
+            raise ValueError('workers must be a positive integer')
+        self.workers = workers
+        if dom_extraction not in ('elements', 'script'):
+            raise ValueError(f"dom_extraction must be 'elements' or 'script', not '{dom_extraction}'")
+        self.dom_extraction = dom_extraction
+        self.__prefetch_executor = ThreadPoolExecutor(max_workers=1)
+        self.__prefetched_links = {}
+        self.pages_per_driver = pages_per_driver
+        self.driver_pool = None
+        self.__use_driver_pool = False
         
         DATABASE_TYPE = 'postgresql'
         DBAPI = 'psycopg2'
@@ -60,35 +179,103 @@ class scraper:
         PASSWORD = 'password'
         PORT = 5432
         DATABASE = 'postgres'
-        self.engine = create_engine(f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}")
+        if database_url is None:
+            database_url = f"{DATABASE_TYPE}+{DBAPI}://{USER}:{PASSWORD}@{ENDPOINT}:{PORT}/{DATABASE}"
+        self.engine = create_engine(database_url)
+        self.link_index = scraped_link_index(self.engine, use_bloom_filter=bloom_filter)
+        self.rds_writer = rds_writer(self.engine, batch_size=rds_batch_size, upsert=rds_upsert, metrics=self.metrics)
+        self.stats_writer = rds_writer(self.engine, batch_size=rds_batch_size, update_columns=STATS_FIELDS + ['data_obtained_time'], metrics=self.metrics)
         
-        while True:
+        if start_page is not None and start_page < 1:
+            raise ValueError('start_page must be a positive integer')
+        self.start_page = start_page
+        while self.start_page is None:
             start_page_prompt = int(input('Please choose a starting page: '))
             if start_page_prompt > 0:
                 self.start_page = start_page_prompt
-                break
             else:
                 print('Please choose a positive integer...')
         
-        while True:
+        if pages is not None and pages < 1:
+            raise ValueError('pages must be a positive integer')
+        self.pages = pages
+        while self.pages is None:
             pages_prompt = int(input('Please choose a number of pages to scrape: '))
             if pages_prompt > 0:
                 self.pages = pages_prompt
-                break
             else:
                 print('Please choose a positive integer...')
         self.s3_storage_bool = True
         self.keep_raw_data_bool = True
         self.rds_bool = True
         self.csv_bool = False
-        self.start_url = f"https://letterboxd.com/films/popular/page/{self.start_page}"
-        self.driver.get(self.start_url)
+        self.parquet_bool = False
+        self.s3_sink = s3_sink('letterboxd-data-bucket', batch_records=s3_batch_records, metrics=self.metrics)
+        self.raw_archive = None
+        self.__segments_to_remove = []
+        # Worker and pipeline threads queue raw data for removal while the main thread removes it.
+        self.__removal_lock = threading.Lock()
+        if raw_archive_dir is not None:
+            # Segments left unsealed by an earlier run are shipped once the data storage options are chosen.
+            self.raw_archive = raw_archive(raw_archive_dir, segment_bytes=raw_segment_bytes, on_sealed=self.__ship_segment, seal_leftovers=False)
+        self.poster_fetcher = poster_fetcher(metrics=self.metrics, archive=self.raw_archive)
+        self.__poster_downloads = {}
+        self.__raw_data_to_remove = []
+        self.csv_sink = csv_sink('film_data.csv')
+        self.parquet_sink = parquet_sink('film_data_parquet')
+        self.spool_path = spool_path
+        self.storage_spool = None
+        self.page_fingerprints = None
+        if page_fingerprint_path is not None:
+            self.page_fingerprints = page_fingerprint_store(page_fingerprint_path, films_per_page=films_per_page)
+        self.start_url = f"{self.base_url}/films/popular/page/{self.start_page}"
+
+    @property
+    def driver(self):
+        if self.__driver is None:
+            self.__driver = self.__create_driver()
+            self.__driver.set_page_load_timeout(self.timeouts['page_load'])
+            self.__load_page(self.__driver, self.start_url)
+            if self.scrape_engine == 'http':
+                # The http engine only starts the browser to fall back on, so the cookie pop-up is closed when the browser first opens.
+                self.accept_cookies()
+        return self.__driver
+
+    @driver.setter
+    def driver(self, driver):
+        self.__driver = driver
+
+    def __create_driver(self):
+        return create_firefox_driver(self.lean_browser, self.browser_profiles)
+
+    def __wait_until(self, context, delay: float, condition):
+        with self.metrics.timer('element_wait_seconds'):
+            try:
+                return WebDriverWait(context, delay).until(condition)
+            except TimeoutException:
+                self.metrics.increment('timeouts_total')
+                raise
+
+    def __load_page_once(self, driver, url: str):
+        self.rate_limiter.acquire()
+        started = time.perf_counter()
+        try:
+            with self.metrics.timer('page_load_seconds'):
+                driver.get(url)
+        except TimeoutException:
+            self.metrics.increment('timeouts_total')
+            self.rate_limiter.record(time.perf_counter() - started, throttled=True)
+            raise
+        self.rate_limiter.record(time.perf_counter() - started)
+
+    def __load_page(self, driver, url: str):
+        self.retry_policy.call(self.__load_page_once, driver, url)
 
     def __scrape_image_data(self, film_data_dic: dict):
 
-        delay = 10
+        delay = self.timeouts['element']
         driver = self.driver
-        WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.XPATH, '//div[starts-with(@class,"react-component poster")]')))
+        self.__wait_until(driver, delay, EC.presence_of_element_located((By.XPATH, '//div[starts-with(@class,"react-component poster")]')))
         poster_container = driver.find_element(by=By.XPATH, value='//div[starts-with(@class,"react-component poster")]')
         img_tag = poster_container.find_element(by=By.TAG_NAME, value = 'img')
         poster_link = img_tag.get_attribute('src')
@@ -96,20 +283,20 @@ class scraper:
 
     def __scrape_text_element(self, film_data_dic: dict, element_name: str, xpath: str):
         
-        delay = 10
+        delay = self.timeouts['element']
         driver = self.driver
 
-        WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.XPATH, xpath)))
+        self.__wait_until(driver, delay, EC.presence_of_element_located((By.XPATH, xpath)))
         scraped_text = driver.find_element(by=By.XPATH, value=xpath).text.partition('  ')[0]
         film_data_dic[element_name] = scraped_text
         # print(f'{element}: {scraped_text}')
 
     def __scrape_film_stat_element(self, film_data_dic: dict, element_name: str, xpath: str):
 
-        delay = 10
+        delay = self.timeouts['element']
         driver = self.driver
 
-        WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.XPATH, xpath)))
+        self.__wait_until(driver, delay, EC.presence_of_element_located((By.XPATH, xpath)))
         stat_container = driver.find_element(by=By.XPATH, value=xpath)
         stat = stat_container.get_attribute('data-original-title').split()[2]
         film_data_dic[element_name] = stat
@@ -117,7 +304,7 @@ class scraper:
 
     def __scrape_all_text_data(self, film_data_dic: dict):
 
-        delay = 10
+        delay = self.timeouts['element']
         driver = self.driver
 
         self.__scrape_text_element(film_data_dic, 'title', '//h1[@class="headline-1 js-widont prettify"]')
@@ -129,7 +316,7 @@ class scraper:
         self.__scrape_film_stat_element(film_data_dic, 'lists', '//a[@class="has-icon icon-list icon-16 tooltip"]')
         self.__scrape_film_stat_element(film_data_dic, 'likes', '//a[@class="has-icon icon-like icon-liked icon-16 tooltip"]')
 
-        WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.XPATH, '//a[starts-with(@href,"/director/")]')))
+        self.__wait_until(driver, delay, EC.presence_of_element_located((By.XPATH, '//a[starts-with(@href,"/director/")]')))
         director = driver.find_element(by=By.XPATH, value='//a[starts-with(@href,"/director/")]').text
         try:
             next_director = driver.find_element(by=By.XPATH, value='//a[starts-with(@href,"/director/")]/following-sibling::a').text
@@ -146,7 +333,7 @@ class scraper:
             # print(f'Top 250 position: {top_250_pos}')
         except:
             film_data_dic['top_250_position'] = np.nan
-        WebDriverWait(driver, delay).until(EC.presence_of_element_located((By.XPATH, '//div[@class="review body-text -prose -hero prettify"]')))
+        self.__wait_until(driver, delay, EC.presence_of_element_located((By.XPATH, '//div[@class="review body-text -prose -hero prettify"]')))
         try:
             more_button = driver.find_element(by=By.XPATH, value='//span[@class="condense_control condense_control_more"]')
             more_button.click()
@@ -156,25 +343,137 @@ class scraper:
         film_data_dic['description'] = description
         # print(f'Description: {description}')
     
-    def __clean_scraped_data(self, film_data_dic: dict) -> dict:
-        film_data_dic['year'] = int(film_data_dic['year'])
-        film_data_dic['runtime'] = int(film_data_dic['runtime'].split()[0].replace(',', ''))
-        film_data_dic['rating'] = float(film_data_dic['rating'])
-        watches = film_data_dic['watches'].replace(',', '')
-        film_data_dic['watches'] = int(watches)
-        lists = film_data_dic['lists'].replace(',', '')
-        film_data_dic['lists'] = int(lists)
-        likes = film_data_dic['likes'].replace(',', '')
-        film_data_dic['likes'] = int(likes)
-        director = film_data_dic['director']
-        if len(director) == 2:
-            film_data_dic['director'] = f'{director[0]}, {director[1]}'
+    def __scrape_all_data_script(self, film_data_dic: dict):
+
+        delay = self.timeouts['element']
+        scraped_data = self.__wait_until(self.driver, delay, lambda driver: driver.execute_script(FILM_DATA_SCRIPT))
+        for field in ['title', 'year', 'runtime', 'rating', 'watches', 'lists', 'likes', 'director', 'top_250_position', 'description', 'poster_link']:
+            film_data_dic[field] = scraped_data[field]
+        if film_data_dic['top_250_position'] is None:
+            film_data_dic['top_250_position'] = np.nan
+
+    def __scrape_film_entry_selenium(self, link: str) -> dict:
+
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            film_data_dic = {}
+            driver = self.driver
+            self.__load_page(driver, link)
+
+            friendly_id = link.split('/')[4]
+            print(f'Scraping data for {friendly_id}...')
+            film_data_dic['friendly_id'] = friendly_id
+
+            film_uuid = uuid.uuid4()
+            # print(f'UUID: {film_uuid}')
+            film_data_dic['uuid'] = str(film_uuid)
+
+            if self.dom_extraction == 'script':
+                self.__scrape_all_data_script(film_data_dic)
+            else:
+                self.__scrape_all_text_data(film_data_dic)
+            if film_data_dic['description'] != '':
+                break
+            if attempt == self.retry_policy.max_attempts:
+                raise TimeoutException(f"'description' of {friendly_id} was still empty after {attempt} attempts")
+            print("Failed to scrape 'description'. Reloading link...")
+            self.metrics.increment('description_reloads_total')
+            time.sleep(self.retry_policy.backoff(attempt))
+        if self.dom_extraction != 'script':
+            self.__scrape_image_data(film_data_dic)
+        return film_data_dic
+
+    def __scrape_film_entry_browser(self, link: str) -> dict:
+
+        if not self.__use_driver_pool:
+            return self.__scrape_film_entry_selenium(link)
+        driver = self.__get_driver_pool().acquire()
+        crashed = False
         try:
-            film_data_dic['top_250_position'] = int(film_data_dic['top_250_position'])
-        except:
-            pass
+            return self.__worker_scraper(driver).__scrape_film_entry_selenium(link)
+        except WebDriverException:
+            crashed = True
+            raise
+        finally:
+            self.driver_pool.release(driver, crashed=crashed)
+
+    def __scrape_film_entry_http(self, link: str, page_html: str = None) -> dict:
+
+        friendly_id = link.split('/')[4]
+        print(f'Scraping data for {friendly_id}...')
+        film_data_dic = {'friendly_id': friendly_id, 'uuid': str(uuid.uuid4())}
+        try:
+            scraped_data_dic, missing_fields = self.http_scraper.scrape_film_entry(link, page_html)
+        except page_not_cached:
+            # Replaying the cache never loads pages in the browser either.
+            raise
+        except requests.RequestException:
+            print(f'Failed to fetch {friendly_id} over HTTP. Falling back to browser...')
+            return self.__scrape_film_entry_browser(link)
+        film_data_dic.update(scraped_data_dic)
+        if len(missing_fields) > 0:
+            print(f"Could not find {', '.join(missing_fields)} in static HTML. Falling back to browser...")
+            browser_data_dic = self.__scrape_film_entry_browser(link)
+            for field in missing_fields:
+                film_data_dic[field] = browser_data_dic[field]
         return film_data_dic
 
+    def __scrape_film_stats_selenium(self, link: str) -> dict:
+
+        self.__load_page(self.driver, link)
+        stats_data_dic = {}
+        self.__scrape_text_element(stats_data_dic, 'rating', '//a[starts-with(@class,"tooltip display-rating")]')
+        self.__scrape_film_stat_element(stats_data_dic, 'watches', '//a[@class="has-icon icon-watched icon-16 tooltip"]')
+        self.__scrape_film_stat_element(stats_data_dic, 'lists', '//a[@class="has-icon icon-list icon-16 tooltip"]')
+        self.__scrape_film_stat_element(stats_data_dic, 'likes', '//a[@class="has-icon icon-like icon-liked icon-16 tooltip"]')
+        try:
+            stats_data_dic['top_250_position'] = self.driver.find_element(by=By.XPATH, value='//a[@class="has-icon icon-top250 icon-16 tooltip"]').text
+        except:
+            stats_data_dic['top_250_position'] = np.nan
+        return stats_data_dic
+
+    def __scrape_film_stats(self, link: str) -> dict:
+
+        if self.scrape_engine == 'http':
+            try:
+                stats_data_dic, missing_fields = self.http_scraper.scrape_film_stats(link)
+            except page_not_cached:
+                raise
+            except requests.RequestException:
+                missing_fields = STATS_FIELDS
+            if len(missing_fields) == 0:
+                return stats_data_dic
+            print(f"Could not find {', '.join(missing_fields)} over HTTP. Falling back to browser...")
+        return self.__scrape_film_stats_selenium(link)
+
+    def __report_parse_errors(self, parse_errors: list):
+        for parse_error in parse_errors:
+            print(f"Could not parse '{parse_error['field']}' of {parse_error['friendly_id']} from {parse_error['value']!r}.")
+            self.metrics.increment('parse_errors_total', labels={'field': parse_error['field']})
+
+    def clean_scraped_data(self, film_data_dic_list: list) -> list:
+        '''
+        Converts the scraped text of a batch of films to typed film records, cleaning each field for the whole batch at once.
+        Values that cannot be parsed are reported and stored as missing instead of failing the batch.
+        Parameters
+        ----------
+        film_data_dic_list: list of dict
+            A list of dictionaries containing the scraped data for each film.
+
+        Returns
+        -------
+        film_record_list: list of film_record
+            The cleaned data for each film, in the same order.
+        '''
+        film_record_list, parse_errors = clean_film_batch(film_data_dic_list)
+        self.__report_parse_errors(parse_errors)
+        return film_record_list
+
+    def __clean_and_store_raw_data_local(self, film_data_dic_list: list) -> list:
+        film_record_list = self.clean_scraped_data(film_data_dic_list)
+        for film_data_dic in film_record_list:
+            self.__store_raw_data_local(film_data_dic)
+        return film_record_list
+
     def __store_raw_data_local(self, film_data_dic: dict):
         '''
         Stores scraped data for single film locally.
@@ -185,6 +484,10 @@ class scraper:
         '''
         friendly_id = film_data_dic['friendly_id']
         film_data_dic['data_obtained_time'] = str(film_data_dic['data_obtained_time'])
+        if self.raw_archive is not None:
+            self.raw_archive.put_record(film_data_dic)
+            self.__poster_downloads[friendly_id] = self.poster_fetcher.submit(friendly_id, film_data_dic['poster_link'], None)
+            return
         try:
             os.mkdir('raw_data')
         except:
@@ -194,14 +497,15 @@ class scraper:
         except:
             pass      
         with open(f'raw_data/{friendly_id}/data.json', 'w') as film_data_dic_file:
-            json.dump(film_data_dic, film_data_dic_file)      
-        image_request = requests.get(film_data_dic['poster_link'])
-        try:
-            os.mkdir(f'raw_data/{friendly_id}/images')
-        except:
-            pass
-        with open(f'raw_data/{friendly_id}/images/{friendly_id}_poster.jpg', 'wb') as image_file:
-            image_file.write(image_request.content)
+            json.dump(dict(film_data_dic), film_data_dic_file)      
+        poster_path = f'raw_data/{friendly_id}/images/{friendly_id}_poster.jpg'
+        on_fetched = None
+        if self.s3_storage_bool == True:
+            def on_fetched(status: str):
+                # Posters that were skipped or not modified were uploaded by the run that downloaded them.
+                if status == 'downloaded':
+                    self.s3_sink.upload_poster(friendly_id, poster_path)
+        self.__poster_downloads[friendly_id] = self.poster_fetcher.submit(friendly_id, film_data_dic['poster_link'], poster_path, on_fetched)
 
     def __store_raw_data_s3(self, film_data_dic: dict):
         '''
@@ -212,30 +516,94 @@ class scraper:
             A dictionary containing all scraped data for a single film.
         '''
         friendly_id = film_data_dic['friendly_id']
-
-        s3_client = boto3.client('s3')
-        s3_client.upload_file(f'raw_data/{friendly_id}/data.json', 'letterboxd-data-bucket', f'raw_data/{friendly_id}/data.json')
-        s3_client.upload_file(f'raw_data/{friendly_id}/images/{friendly_id}_poster.jpg', 'letterboxd-data-bucket', f'raw_data/{friendly_id}/images/{friendly_id}_poster.jpg')
+        poster_path = f'raw_data/{friendly_id}/images/{friendly_id}_poster.jpg'
+        if friendly_id in self.__poster_downloads or not os.path.exists(poster_path):
+            # Posters still downloading are uploaded by the poster fetcher once they are on disk.
+            self.s3_sink.upload_film(film_data_dic)
+        else:
+            self.s3_sink.upload_film(film_data_dic, poster_path)
 
     def __store_tabular_data_rds(self, film_data_dic: dict):
-        film_data_df = pd.DataFrame([film_data_dic]).set_index('friendly_id')
-        film_data_df['top_250_position'] = film_data_df['top_250_position'].astype('Int64')
-        film_data_df.to_sql('film_data', self.engine, if_exists='append')
+        self.rds_writer.write(film_data_dic)
+        self.link_index.add(film_data_dic['friendly_id'])
 
-    def __remove_local_raw_data(self):
-        shutil.rmtree('raw_data', ignore_errors=True)
+    def __store_raw_data_s3_batch(self, film_data_dic_list: list):
+        # Called by storage_spool on its s3 thread. Posters are uploaded by the poster fetcher, so only the records are uploaded here.
+        failed_keys = self.s3_sink.upload_records(film_data_dic_list, f'spool_{uuid.uuid4().hex[:8]}')
+        if len(failed_keys) > 0:
+            raise RuntimeError(f"Failed to upload {', '.join(failed_keys)}")
+
+    def __store_tabular_data_rds_batch(self, film_data_dic_list: list):
+        # Called by storage_spool on its RDS thread.
+        self.rds_writer.write_batch(film_data_dic_list)
+        for film_data_dic in film_data_dic_list:
+            self.link_index.add(film_data_dic['friendly_id'])
+
+    def __apply_data_storage_options(self):
+        self.__open_spool()
+        if self.raw_archive is not None:
+            self.raw_archive.seal_leftovers()
+
+    def __open_spool(self):
+        if self.spool_path is None:
+            return
+        if self.storage_spool is not None:
+            self.storage_spool.close()
+        sinks = {}
+        if self.s3_storage_bool == True and self.raw_archive is None:
+            sinks['s3'] = self.__store_raw_data_s3_batch
+        if self.rds_bool == True:
+            sinks['rds'] = self.__store_tabular_data_rds_batch
+        if self.csv_bool == True:
+            sinks['csv'] = self.csv_sink.write_batch
+        if self.parquet_bool == True:
+            sinks['parquet'] = self.parquet_sink.write_batch
+        self.storage_spool = write_behind_spool(self.spool_path, sinks, retry_policy=self.retry_policy, metrics=self.metrics)
+
+    def __remove_local_raw_data(self, film_data_dic: dict):
+        # Removal waits until the film's poster download and uploads have finished.
+        with self.__removal_lock:
+            self.__raw_data_to_remove.append(film_data_dic['friendly_id'])
+
+    def __ship_segment(self, segment: int, paths: dict):
+        # Called by raw_archive on the thread that sealed the segment.
+        if self.s3_storage_bool == True:
+            for path in paths.values():
+                self.s3_sink.upload_bytes(f'raw_data/segments/{os.path.basename(path)}', path)
+        if self.keep_raw_data_bool == False:
+            # Removal waits until the segment's uploads have finished.
+            with self.__removal_lock:
+                self.__segments_to_remove.append(segment)
+
+    def __take_pending_raw_data(self) -> tuple:
+        # Taken before the uploads are waited for, so that nothing queued after the wait started is removed before it is uploaded.
+        with self.__removal_lock:
+            pending = (self.__raw_data_to_remove[:], self.__segments_to_remove[:])
+            self.__raw_data_to_remove.clear()
+            self.__segments_to_remove.clear()
+        return pending
+
+    def __remove_raw_data(self, pending: tuple):
+        friendly_ids, segments = pending
+        for friendly_id in friendly_ids:
+            shutil.rmtree(f'raw_data/{friendly_id}', ignore_errors=True)
+        for segment in segments:
+            self.raw_archive.remove_segment(segment)
         
     def __save_tabular_data_csv(self, film_data_dic: dict):
-        film_data_df = pd.DataFrame([film_data_dic]).set_index('friendly_id')
-        film_data_df['top_250_position'] = film_data_df['top_250_position'].astype('Int64')
-        output_path='film_data.csv'
-        film_data_df.to_csv(output_path, mode='a', header=not os.path.exists(output_path))
+        self.csv_sink.write(film_data_dic)
+
+    def __save_tabular_data_parquet(self, film_data_dic: dict):
+        self.parquet_sink.write(film_data_dic)
 
     def accept_cookies(self):
         '''
-        Closes the 'accept cookies' pop-up.
+        Closes the 'accept cookies' pop-up. The lean browser blocks the pop-up's script, so there is nothing to close.
         '''
-        delay = 10
+        if self.lean_browser:
+            print('Cookie pop-up blocked by the lean browser.\n')
+            return True
+        delay = self.timeouts['cookies']
         try:
             WebDriverWait(self.driver, delay).until(EC.presence_of_element_located((By.XPATH, '//*[@class="fc-button fc-cta-consent fc-primary-button"]')))
             print('Accept cookies button ready...')
@@ -257,21 +625,80 @@ class scraper:
         link_list: list
             A list containing links to film entries on letterboxd.com.
         '''
-        delay = 10
-        WebDriverWait(self.driver, delay).until(EC.presence_of_element_located((By.XPATH, '//*[@class="poster-list -p70 -grid"]/li')))
+        delay = self.timeouts['element']
+        if self.dom_extraction == 'script':
+            link_list = self.__wait_until(self.driver, delay, lambda driver: driver.execute_script(FILM_LINKS_SCRIPT))
+            print('Links scraped.\n')
+            return link_list
+        self.__wait_until(self.driver, delay, EC.presence_of_element_located((By.XPATH, '//*[@class="poster-list -p70 -grid"]/li')))
         print('Poster list ready...')
         film_container = self.driver.find_element(by=By.XPATH, value='//*[@class="poster-list -p70 -grid"]')
         film_list = film_container.find_elements(by=By.XPATH, value='./li')
         link_list = []
 
         for film in film_list:
-            WebDriverWait(film, delay).until(EC.presence_of_element_located((By.TAG_NAME, 'a')))
+            self.__wait_until(film, delay, EC.presence_of_element_located((By.TAG_NAME, 'a')))
             a_tag = film.find_element(By.TAG_NAME, 'a')
             link = a_tag.get_attribute('href')
             link_list.append(link)
         print('Links scraped.\n')
         return link_list
 
+    def prefetch_film_links(self, page: int):
+        '''
+        Starts fetching the links on a page of letterboxd's popular section over HTTP in the background, while the current page's films are scraped.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+        '''
+        self.__prefetched_links[page] = self.__prefetch_executor.submit(self.http_scraper.get_film_links_from_page, page)
+
+    def get_film_links_from_page(self, page: int) -> list:
+        '''
+        Returns all links to film entries on a page of letterboxd's popular section.
+        Uses the links prefetched by prefetch_film_links if there are any. Otherwise the page is fetched over HTTP when scrape_engine is 'http', or loaded in the webdriver if that fails or scrape_engine is 'selenium'.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+
+        Returns
+        -------
+        link_list: list
+            A list containing links to film entries on letterboxd.com.
+        '''
+        prefetched = self.__prefetched_links.pop(page, None)
+        if prefetched is not None:
+            try:
+                link_list = prefetched.result()
+            except page_not_cached as error:
+                return self.__skip_uncached_page(page, error)
+            except requests.RequestException:
+                link_list = []
+            if len(link_list) > 0:
+                print(f'Page {page} prefetched.')
+                return link_list
+        elif self.scrape_engine == 'http':
+            try:
+                link_list = self.http_scraper.get_film_links_from_page(page)
+            except page_not_cached as error:
+                return self.__skip_uncached_page(page, error)
+            except requests.RequestException:
+                link_list = []
+            if len(link_list) > 0:
+                print(f'Page {page} fetched.')
+                return link_list
+        self.__load_page(self.driver, f'{self.base_url}/films/popular/size/small/page/{page}/')
+        print(f'Page {page} loaded.')
+        return self.get_film_links_from_single_page()
+
+    def __skip_uncached_page(self, page: int, error: page_not_cached) -> list:
+        # Replaying the cache never loads pages in the browser, so a page missing from it has no links.
+        print(f'Page {page} is not in the page cache. Skipping page...')
+        self.dead_letters.add(f'{self.base_url}/films/popular/page/{page}/', error, 'discovery')
+        return []
+
     def check_if_link_already_scraped(self, link: str) -> bool:
         '''
         Checks if there is already data from this link in the RDS database and returns a corresponding boolean.
@@ -287,15 +714,89 @@ class scraper:
             A boolean corresponding to whether the link has already been scraped.
         '''
         link_id = link.split('/')[4]
-        statement = f"""SELECT friendly_id FROM film_data WHERE friendly_id = '{link_id}'"""
-        if len(self.engine.execute(statement).fetchall()) == 0:
-            return False
+        return link_id in self.link_index
+
+    def check_links_already_scraped(self, link_list: list) -> dict:
+        '''
+        Checks a whole page of links against the RDS database at once and returns a boolean for each link.
+        Uses the in-memory index of stored films, so at most one query is sent for the page.
+        Parameters
+        ----------
+        link_list: list
+            A list of links to film entries on letterboxd.com.
+
+        Returns
+        -------
+        dict
+            A dictionary mapping each link to whether it has already been scraped.
+        '''
+        scraped_ids = self.link_index.filter_scraped([link.split('/')[4] for link in link_list])
+        return {link: link.split('/')[4] in scraped_ids for link in link_list}
+
+    def get_links_to_scrape(self, page: int, frontier: crawl_frontier = None, link_list: list = None) -> list:
+        '''
+        Returns the links on a page of the popular section whose films are not in the RDS database yet.
+        With a frontier, a page whose links were recorded by an earlier run is not listed again and only its pending links are returned. Newly listed links are recorded in the frontier, and links that are already scraped are marked as skipped.
+        With page_fingerprints, the ranks of the films on a newly listed page are recorded, and no links are returned for a page that is unchanged since a run that stored all of its films.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section.
+        frontier: crawl_frontier
+            The checkpoint of the crawl, or None.
+        link_list: list
+            The links on the page if they have already been listed, otherwise None.
+
+        Returns
+        -------
+        list
+            The links to scrape, in the order they are listed on the page.
+        '''
+        if frontier is not None and frontier.has_page(page):
+            link_list = frontier.pending_links(page)
+            print(f'Resuming page {page} with {len(link_list)} links pending.')
         else:
-            return True
-        
-    def scrape_data_from_film_entry(self, link: str) -> dict:
+            if link_list is None:
+                link_list = self.get_film_links_from_page(page)
+            if len(link_list) == 0:
+                # A page that could not be listed is not recorded, so it is listed again by the next run.
+                return []
+            if frontier is not None:
+                frontier.add_page(page, link_list)
+            if self.page_fingerprints is not None and self.page_fingerprints.record_page(page, link_list):
+                print(f'Page {page} is unchanged. Skipping its {len(link_list)} links...')
+                self.metrics.increment('pages_unchanged_total')
+                self.metrics.increment('films_skipped_total', len(link_list))
+                if frontier is not None:
+                    frontier.mark_skipped(link_list)
+                return []
+        already_scraped = self.check_links_already_scraped(link_list)
+        for link in link_list:
+            if already_scraped[link] == True:
+                link_id = link.split('/')[4]
+                print(f'Data for {link_id} already exists. Skipping to next link...')
+        skipped_links = [link for link in link_list if already_scraped[link] == True]
+        self.metrics.increment('films_skipped_total', len(skipped_links))
+        if frontier is not None:
+            frontier.mark_skipped(skipped_links)
+        return [link for link in link_list if already_scraped[link] == False]
+
+    def __scrape_raw_film_entry(self, link: str) -> dict:
+        with self.metrics.timer('film_scrape_seconds', {'engine': self.scrape_engine}):
+            if self.scrape_engine == 'http':
+                film_data_dic = self.__scrape_film_entry_http(link)
+            else:
+                film_data_dic = self.__scrape_film_entry_selenium(link)
+        self.metrics.increment('films_scraped_total')
+
+        timestamp = datetime.now()
+        # print(f'data_obtained_time: {timestamp}')
+        film_data_dic['data_obtained_time'] = timestamp
+        return film_data_dic
+
+    def scrape_data_from_film_entry(self, link: str) -> film_record:
         '''
-        Scrapes all chosen data from the page of a film entry and stores it in a dictionary.
+        Scrapes all chosen data from the page of a film entry and stores it in a film record.
         Parameters
         ----------
         link: str
@@ -303,38 +804,456 @@ class scraper:
         
         Returns
         -------
-        film_data_dic: dict
-            A dictionary containing all scraped data for a single film.
+        film_data_dic: film_record
+            The cleaned data for a single film.
         '''
-        while True:
-            film_data_dic = {}
-            driver = self.driver
-            driver.get(link)
+        return self.__clean_and_store_raw_data_local([self.__scrape_raw_film_entry(link)])[0]
 
-            friendly_id = link.split('/')[4]
-            print(f'Scraping data for {friendly_id}...')
-            film_data_dic['friendly_id'] = friendly_id
+    def __worker_scraper(self, driver):
+        worker = copy.copy(self)
+        worker.driver = driver
+        return worker
 
-            film_uuid = uuid.uuid4()
-            # print(f'UUID: {film_uuid}')
-            film_data_dic['uuid'] = str(film_uuid)
+    def __prepare_pooled_driver(self, driver):
+        driver.set_page_load_timeout(self.timeouts['page_load'])
+        self.__load_page(driver, self.start_url)
+        self.__worker_scraper(driver).accept_cookies()
 
-            self.__scrape_all_text_data(film_data_dic)
-            if film_data_dic['description'] != '':
-                break
-            print("Failed to scrape 'description'. Reloading link...")
-        self.__scrape_image_data(film_data_dic)
+    def __get_driver_pool(self):
+        if self.driver_pool is None:
+            self.driver_pool = driver_pool(self.workers, self.pages_per_driver, driver_factory=self.__create_driver, on_new_driver=self.__prepare_pooled_driver)
+        return self.driver_pool
 
-        timestamp = datetime.now()
-        # print(f'data_obtained_time: {timestamp}')
-        film_data_dic['data_obtained_time'] = timestamp
-        film_data_dic = self.__clean_scraped_data(film_data_dic)
-        # print('\n')
-        time.sleep(1)
-        self.__store_raw_data_local(film_data_dic)
+    def scrape_links_concurrently(self, link_list: list) -> list:
+        '''
+        Scrapes a list of film entries concurrently, with 'workers' threads sharing a pool of webdrivers.
+        Each new webdriver accepts cookies once and is then reused for many films. A link whose webdriver crashes is retried once with a fresh webdriver.
+        When scrape_engine is 'http' the threads fetch film entries without webdrivers.
+        Parameters
+        ----------
+        link_list: list
+            A list of links to film entries on letterboxd.com.
+
+        Returns
+        -------
+        film_data_dic_list: list of film_record
+            The cleaned data for each film, in the same order as link_list. Links that could not be scraped are left out.
+        '''
+        if self.scrape_engine == 'http':
+            return self.__scrape_links_concurrently_http(link_list)
+        self.__get_driver_pool()
+        link_queue = queue.Queue()
+        for index, link in enumerate(link_list):
+            link_queue.put((index, link, 0))
+        results = {}
+        max_attempts = 2
+
+        def scrape_from_queue():
+            while True:
+                try:
+                    index, link, attempts = link_queue.get_nowait()
+                except queue.Empty:
+                    return
+                driver = self.driver_pool.acquire()
+                crashed = False
+                try:
+                    results[index] = self.__worker_scraper(driver).__scrape_raw_film_entry(link)
+                except WebDriverException as error:
+                    crashed = True
+                    if attempts + 1 < max_attempts:
+                        print(f'Webdriver failed while scraping {link}. Retrying with a new webdriver...')
+                        link_queue.put((index, link, attempts + 1))
+                    else:
+                        print(f'Failed to scrape {link}. Skipping to next link...')
+                        self.metrics.increment('films_failed_total')
+                        self.dead_letters.add(link, error)
+                except Exception as error:
+                    # Any other error only loses this film, not the worker thread and its webdriver.
+                    print(f'Failed to scrape {link}: {error!r}. Skipping to next link...')
+                    self.metrics.increment('films_failed_total')
+                    self.dead_letters.add(link, error)
+                finally:
+                    self.driver_pool.release(driver, crashed=crashed)
+
+        threads = [threading.Thread(target=scrape_from_queue) for _ in range(min(self.workers, len(link_list)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.__clean_and_store_raw_data_local([results[index] for index in sorted(results)])
+
+    def __scrape_and_store_links(self, link_list: list) -> list:
+        # Returns the links that could not be scraped.
+        failed_links = []
+        if self.workers == 1:
+            film_data_dic_list = []
+            try:
+                for link in link_list:
+                    try:
+                        film_data_dic_list.append(self.__scrape_raw_film_entry(link))
+                    except Exception as error:
+                        print(f'Failed to scrape {link}: {error!r}. Skipping to next link...')
+                        self.metrics.increment('films_failed_total')
+                        self.dead_letters.add(link, error)
+                        failed_links.append(link)
+            finally:
+                # The links are cleaned as one batch once all of their films have been scraped, and the films scraped so far are stored even if the run is interrupted.
+                for film_data_dic in self.__clean_and_store_raw_data_local(film_data_dic_list):
+                    self.implement_data_storage_options(film_data_dic)
+        else:
+            film_data_dic_list = self.scrape_links_concurrently(link_list)
+            for film_data_dic in film_data_dic_list:
+                self.implement_data_storage_options(film_data_dic)
+            scraped_ids = {film_data_dic['friendly_id'] for film_data_dic in film_data_dic_list}
+            failed_links = [link for link in link_list if link.split('/')[4] not in scraped_ids]
+        return failed_links
+
+    def __unfinished_pages(self, pages: list, frontier: crawl_frontier = None) -> list:
+        if frontier is None or len(pages) == 0:
+            return pages
+        done_pages = [page for page in pages if frontier.is_page_done(page)]
+        if len(done_pages) == len(pages):
+            # A crawl that was finished is not resumed, so the same pages are crawled again from scratch.
+            print(f'Pages {min(pages)} to {max(pages)} were all finished by an earlier run. Starting a new crawl...')
+            frontier.reset_pages(pages)
+            return pages
+        if len(done_pages) > 0:
+            print(f"Skipping {len(done_pages)} pages finished by an earlier run: {', '.join(map(str, done_pages))}.")
+        return [page for page in pages if page not in done_pages]
 
+    def scrape_pages(self, pages: list, frontier: crawl_frontier = None):
+        '''
+        Scrapes and stores every film on a list of pages of the 'popular' section that is not in the RDS database yet, one page at a time.
+        The links on the next page are prefetched while the current page is scraped. With a frontier, pages that are done are skipped and each page is finished in the frontier once its films have been written to storage, so a restarted run resumes from the first unfinished page. Once every page is done, the next run starts a new crawl of them.
+        Parameters
+        ----------
+        pages: list of int
+            The numbers of the pages in the 'popular' section to scrape.
+        frontier: crawl_frontier
+            The checkpoint of the crawl, or None.
+        '''
+        pages = self.__unfinished_pages(pages, frontier)
+        for i, page in enumerate(pages):
+            if i + 1 < len(pages) and (frontier is None or not frontier.has_page(pages[i + 1])):
+                self.prefetch_film_links(pages[i + 1])
+            link_list = None
+            if i == 0 and page == self.start_page and self.__driver is not None and (frontier is None or not frontier.has_page(page)):
+                # The start page is already loaded in the main webdriver.
+                link_list = self.get_film_links_from_single_page()
+            links_to_scrape = self.get_links_to_scrape(page, frontier, link_list)
+            failed_links = self.__scrape_and_store_links(links_to_scrape)
+            self.finish_page(page)
+            if frontier is not None or self.page_fingerprints is not None:
+                # The page is only checkpointed or marked complete once its rows have left the buffers and the Parquet files are finalised, so a crash never loses stored films.
+                self.flush_storage()
+            if frontier is not None:
+                frontier.finish_page(page, failed_links)
+            if self.page_fingerprints is not None:
+                self.page_fingerprints.finish_page(page, failed_links)
+
+    def __scrape_links_concurrently_http(self, link_list: list) -> list:
+        # Film entries are fetched without a webdriver, so pooled webdrivers are only started for fallbacks to the browser.
+        def scrape_link(link: str):
+            try:
+                return self.__scrape_raw_film_entry(link)
+            except Exception as error:
+                # Any error only loses this film, not the films already scraped by the other threads.
+                print(f'Failed to scrape {link}: {error!r}. Skipping to next link...')
+                self.metrics.increment('films_failed_total')
+                self.dead_letters.add(link, error)
+                return None
+
+        self.__use_driver_pool = True
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                film_data_dic_list = list(executor.map(scrape_link, link_list))
+        finally:
+            self.__use_driver_pool = False
+        return self.__clean_and_store_raw_data_local([film_data_dic for film_data_dic in film_data_dic_list if film_data_dic is not None])
+
+    def __discover_links_stage(self, page: int, frontier: crawl_frontier = None) -> list:
+        return self.get_links_to_scrape(page, frontier)
+
+    def __fetch_stage(self, link: str) -> tuple:
+        started = time.perf_counter()
+        if self.scrape_engine == 'http':
+            try:
+                fetched = self.http_scraper.fetch_page(link)
+            except requests.RequestException:
+                fetched = None
+        else:
+            fetched = self.__scrape_film_entry_browser(link)
+        fetch_seconds = time.perf_counter() - started
+        return link, fetched, fetch_seconds
+
+    def __extraction_stage(self, fetched: tuple) -> dict:
+        link, page, fetch_seconds = fetched
+        started = time.perf_counter()
+        if self.scrape_engine == 'http':
+            film_data_dic = self.__scrape_film_entry_http(link, page)
+        else:
+            film_data_dic = page
+        # Time spent waiting in the queue between the stages is left out, as in scrape_data_from_film_entry.
+        self.metrics.observe('film_scrape_seconds', fetch_seconds + time.perf_counter() - started, {'engine': self.scrape_engine})
+        return film_data_dic
+
+    def __cleaning_stage(self, film_data_dic_list: list) -> list:
+        self.metrics.increment('films_scraped_total', len(film_data_dic_list))
+        for film_data_dic in film_data_dic_list:
+            film_data_dic['data_obtained_time'] = datetime.now()
+        return self.clean_scraped_data(film_data_dic_list)
+
+    def __raw_storage_stage(self, film_data_dic: dict) -> dict:
+        self.__store_raw_data_local(film_data_dic)
+        self.__store_raw_data(film_data_dic)
         return film_data_dic
 
+    def __tabular_storage_stage(self, film_data_dic: dict):
+        self.__store_tabular_data(film_data_dic)
+
+    def __release_lease(self, leases: lease_table, held_lease, error=None):
+        leases.release(held_lease, error)
+        if error is not None:
+            print(f'Released {held_lease.key}: {error!r}')
+
+    def __scrape_leased_links(self, leases: lease_table, link_leases: list, summary: dict):
+        with ExitStack() as stack:
+            for held_lease in link_leases:
+                stack.enter_context(leases.keep_alive(held_lease))
+            try:
+                failed_links = set(self.__scrape_and_store_links([held_lease.key[len('link:'):] for held_lease in link_leases]))
+                self.flush_storage()
+            except BaseException:
+                for held_lease in link_leases:
+                    self.__release_lease(leases, held_lease)
+                raise
+        for held_lease in link_leases:
+            if held_lease.key[len('link:'):] in failed_links:
+                self.__release_lease(leases, held_lease, 'failed to scrape')
+                summary['released'] += 1
+            else:
+                summary['completed' if leases.complete(held_lease) else 'lost'] += 1
+
+    def __scrape_leased_pages(self, leases: lease_table, held_lease, lease_links: bool, summary: dict):
+        pages = parse_page_range_key(held_lease.key)
+        try:
+            with leases.keep_alive(held_lease):
+                if lease_links:
+                    link_list = []
+                    for page in pages:
+                        link_list += self.get_links_to_scrape(page)
+                    leases.add_items([f'link:{link}' for link in link_list])
+                else:
+                    self.scrape_pages(pages)
+                    self.flush_storage()
+        except (TimeoutException, WebDriverException, requests.RequestException) as error:
+            self.__release_lease(leases, held_lease, error)
+            summary['released'] += 1
+            return
+        except BaseException:
+            self.__release_lease(leases, held_lease)
+            raise
+        summary['completed' if leases.complete(held_lease) else 'lost'] += 1
+
+    def run_leased(self, leases: lease_table, worker_id: str = None, lease_links: bool = False, links_per_claim: int = 24,
+                   poll_interval: float = 10) -> dict:
+        '''
+        Scrapes items claimed from a lease table shared with other scraper instances, until every item is done or failed.
+        A page range is scraped as by scrape_pages. With lease_links, the links on a page range are instead added to the table as items of their own, so that the films of one page are spread across workers, and links are claimed links_per_claim at a time.
+        Leases are renewed while their items are scraped, and an item is completed once its films have been written to storage. Items that fail are released to be claimed again. While other workers hold leases, the worker waits poll_interval seconds between claims, so that it takes over any lease that expires.
+        Parameters
+        ----------
+        leases: lease_table
+            The table of items shared by the workers.
+        worker_id: str
+            The id of this worker, or None for one made of the host name and process id.
+        lease_links: bool
+            Whether page ranges are split into one item per film link.
+        links_per_claim: int
+            The number of link items claimed at once.
+        poll_interval: float
+            The number of seconds to wait before claiming again when every remaining item is leased by another worker.
+
+        Returns
+        -------
+        dict
+            The number of items this worker 'completed', 'released' after a failure, and 'lost' because their lease expired and they were claimed by another worker.
+        '''
+        worker_id = worker_id or default_worker_id()
+        summary = {'completed': 0, 'released': 0, 'lost': 0}
+        while True:
+            # Films already split off their pages are scraped before another page range is claimed.
+            claimed = leases.claim(worker_id, links_per_claim, prefix='link:') if lease_links else []
+            if len(claimed) == 0:
+                claimed = leases.claim(worker_id, prefix='pages:')
+            if len(claimed) == 0:
+                if leases.summary()['leased'] == 0:
+                    return summary
+                time.sleep(poll_interval)
+                continue
+            if claimed[0].key.startswith('link:'):
+                self.__scrape_leased_links(leases, claimed, summary)
+            else:
+                self.__scrape_leased_pages(leases, claimed[0], lease_links, summary)
+
+    def run_pipeline(self, pages: list, concurrency: dict = None, queue_size: int = 50, report_interval: float = 30,
+                     frontier: crawl_frontier = None) -> dict:
+        '''
+        Scrapes and stores every film on a list of pages of the 'popular' section as a pipeline of stages connected by bounded queues.
+        The stages are 'discovery', 'fetch', 'extraction', 'cleaning', 'raw_storage' and 'tabular_storage', and each runs on its own threads so that a slow storage step applies backpressure instead of stopping the fetches. Film pages that need a browser are loaded with pooled webdrivers.
+        Parameters
+        ----------
+        pages: list of int
+            The numbers of the pages in the 'popular' section to scrape.
+        concurrency: dict
+            The number of threads for any of the 'fetch', 'extraction', 'cleaning' and 'raw_storage' stages. 'discovery' and 'tabular_storage' always run on one thread, as they use the main webdriver and the tabular sinks.
+        queue_size: int
+            The maximum number of items waiting in front of each stage.
+        report_interval: float or None
+            The number of seconds between printed reports of the queue depths, or None to disable them.
+        frontier: crawl_frontier
+            The checkpoint of the crawl, or None. Pages that are done are not scraped again unless every page is done, and the other pages are finished once every film has been stored.
+
+        Returns
+        -------
+        dict
+            The number of items each stage processed and failed.
+        '''
+        pages = self.__unfinished_pages(pages, frontier)
+        if len(pages) == 0:
+            return {}
+        stage_workers = {'fetch': self.workers, 'extraction': 2, 'cleaning': 1, 'raw_storage': 2}
+        stage_workers.update(concurrency or {})
+        film_pipeline = pipeline(report_interval=report_interval, metrics=self.metrics)
+        film_pipeline.add_stage('discovery', lambda page: self.__discover_links_stage(page, frontier), 1, queue_size, fan_out=True)
+        film_pipeline.add_stage('fetch', self.__fetch_stage, stage_workers['fetch'], queue_size)
+        film_pipeline.add_stage('extraction', self.__extraction_stage, stage_workers['extraction'], queue_size)
+        # Cleaning takes every film waiting in its queue at once, so it is vectorised over whole batches when fetching runs ahead.
+        film_pipeline.add_stage('cleaning', self.__cleaning_stage, stage_workers['cleaning'], queue_size, batch_size=queue_size)
+        film_pipeline.add_stage('raw_storage', self.__raw_storage_stage, stage_workers['raw_storage'], queue_size)
+        film_pipeline.add_stage('tabular_storage', self.__tabular_storage_stage, 1, queue_size)
+        self.__use_driver_pool = True
+        try:
+            film_pipeline.run(pages)
+        finally:
+            self.__use_driver_pool = False
+        self.s3_sink.flush_batch(f'popular_pages_{min(pages)}_{max(pages)}')
+        self.flush_storage()
+        failed_links = []
+        for stage, item, error in film_pipeline.errors:
+            if isinstance(item, str):
+                failed_links.append(item)
+            elif isinstance(item, tuple):
+                failed_links.append(item[0])
+            elif isinstance(item, (dict, film_record)):
+                failed_links.append(f"{self.base_url}/film/{item['friendly_id']}/")
+            else:
+                continue
+            self.dead_letters.add(failed_links[-1], error, stage)
+        if frontier is not None:
+            for page in pages:
+                if frontier.has_page(page):
+                    frontier.finish_page(page, failed_links)
+        if self.page_fingerprints is not None:
+            failed_pages = {item for _, item, _ in film_pipeline.errors if isinstance(item, int)}
+            for page in pages:
+                if page not in failed_pages:
+                    self.page_fingerprints.finish_page(page, failed_links)
+        return film_pipeline.summary()
+
+    def refresh_stats(self, budget: int = 100, min_age: float = 24 * 60 * 60) -> list:
+        '''
+        Refreshes the rating, watches, lists, likes and top 250 position of films already in the RDS database, updating their rows in place.
+        Films are chosen by a refresh_scheduler, stalest and most popular first. Posters, descriptions and raw data are left untouched.
+        Parameters
+        ----------
+        budget: int
+            The maximum number of films refreshed in this run.
+        min_age: float
+            The number of seconds before a film's stats may be refreshed again.
+
+        Returns
+        -------
+        stats_data_dic_list: list of dict
+            A list of dictionaries containing the 'friendly_id', cleaned stats and new 'data_obtained_time' of each refreshed film.
+        '''
+        scheduler = refresh_scheduler(self.engine, budget=budget, min_age=min_age)
+        scraped_stats_list = []
+        for friendly_id in scheduler.schedule():
+            print(f'Refreshing stats for {friendly_id}...')
+            try:
+                stats_data_dic = self.__scrape_film_stats(f'{self.base_url}/film/{friendly_id}/')
+            except (TimeoutException, WebDriverException, requests.RequestException) as error:
+                print(f'Failed to refresh stats for {friendly_id}. Skipping to next film...')
+                self.dead_letters.add(f'{self.base_url}/film/{friendly_id}/', error, 'refresh')
+                continue
+            stats_data_dic['friendly_id'] = friendly_id
+            stats_data_dic['data_obtained_time'] = datetime.now()
+            scraped_stats_list.append(stats_data_dic)
+        stats_data_dic_list, parse_errors = clean_batch(scraped_stats_list)
+        self.__report_parse_errors(parse_errors)
+        # Stored stats are only overwritten with stats that could all be parsed.
+        unparsed_ids = {parse_error['friendly_id'] for parse_error in parse_errors}
+        for friendly_id in unparsed_ids:
+            self.dead_letters.add(f'{self.base_url}/film/{friendly_id}/', 'stats could not be parsed', 'refresh')
+        stats_data_dic_list = [stats_data_dic for stats_data_dic in stats_data_dic_list if stats_data_dic['friendly_id'] not in unparsed_ids]
+        for stats_data_dic in stats_data_dic_list:
+            self.stats_writer.write(stats_data_dic)
+        self.metrics.increment('stats_refreshed_total', len(stats_data_dic_list))
+        self.stats_writer.flush()
+        return stats_data_dic_list
+
+    def close(self):
+        '''
+        Drains the storage spool, flushes any buffered tabular data and quits the main webdriver and every pooled webdriver.
+        '''
+        if self.storage_spool is not None:
+            self.storage_spool.close()
+        self.poster_fetcher.close()
+        if self.raw_archive is not None:
+            # Sealing the last segment ships it, so the archive is closed before the s3 uploads are waited for.
+            self.raw_archive.close()
+        pending = self.__take_pending_raw_data()
+        self.s3_sink.close()
+        self.__remove_raw_data(pending)
+        self.rds_writer.close()
+        self.stats_writer.close()
+        self.csv_sink.close()
+        self.parquet_sink.close()
+        self.__prefetch_executor.shutdown(cancel_futures=True)
+        if self.page_cache is not None:
+            self.page_cache.close()
+        if self.page_fingerprints is not None:
+            self.page_fingerprints.close()
+        self.metrics.close()
+        if self.driver_pool is not None:
+            self.driver_pool.close()
+        if self.__driver is not None:
+            self.__driver.quit()
+
+    def set_data_storage_options(self, s3_storage: bool = True, keep_raw_data: bool = True, rds: bool = True, csv: bool = False, parquet: bool = False):
+        '''
+        Chooses how data is stored without prompting the user, for runs without a terminal.
+        Parameters
+        ----------
+        s3_storage: bool
+            Whether raw data is stored in the s3 bucket.
+        keep_raw_data: bool
+            Whether a local copy of raw data is kept.
+        rds: bool
+            Whether tabular data is stored in the RDS database.
+        csv: bool
+            Whether tabular data is saved as a .csv.
+        parquet: bool
+            Whether tabular data is saved as Parquet files.
+        '''
+        self.s3_storage_bool = s3_storage
+        self.keep_raw_data_bool = keep_raw_data
+        self.rds_bool = rds
+        self.csv_bool = csv
+        self.parquet_bool = parquet
+        self.__apply_data_storage_options()
+
     def data_storage_options_prompt(self):
         '''
         Prompts the user for how they would like to store their data.
@@ -383,44 +1302,159 @@ class scraper:
             else:
                 print('Please choose yes or no...')
 
+        while True:
+            parquet_prompt = input('Save tabular data as .parquet? (Y/N)').lower().strip()
+            if parquet_prompt[0] == 'n':
+                self.parquet_bool = False
+                break
+            elif parquet_prompt[0] == 'y':
+                self.parquet_bool = True
+                break
+            else:
+                print('Please choose yes or no...')
+        self.__apply_data_storage_options()
+
     def implement_data_storage_options(self, film_data_dic: dict):
         '''
         Implements the data storage options chosen in the prompt.
         Parameters
         ----------
-        film_data_dic: dict
-            A dictionary containing all scraped data for a single film.
+        film_data_dic: film_record or dict
+            All cleaned data for a single film.
         '''
-        if self.s3_storage_bool == True:
+        self.__store_raw_data(film_data_dic)
+        self.__store_tabular_data(film_data_dic)
+
+    def __store_raw_data(self, film_data_dic: dict):
+        with self.metrics.timer('raw_storage_seconds'):
+            self.__store_raw_data_options(film_data_dic)
+
+    def __store_raw_data_options(self, film_data_dic: dict):
+        if self.raw_archive is not None:
+            # Archived raw data is shipped and removed a segment at a time.
+            return
+        if self.s3_storage_bool == True and self.storage_spool is None:
             self.__store_raw_data_s3(film_data_dic)
         if self.keep_raw_data_bool == False:
-            self.__remove_local_raw_data()
-        if self.rds_bool == True:
-            self.__store_tabular_data_rds(film_data_dic)
-        if self.csv_bool == True:
-            self.__save_tabular_data_csv(film_data_dic)
+            self.__remove_local_raw_data(film_data_dic)
+
+    def __store_tabular_data(self, film_data_dic: dict):
+        with self.metrics.timer('tabular_storage_seconds'):
+            self.__store_tabular_data_options(film_data_dic)
+
+    def __store_tabular_data_options(self, film_data_dic: dict):
+        if self.storage_spool is not None:
+            # The spool also holds the film's record for the s3 bucket.
+            self.storage_spool.append(film_data_dic)
+        else:
+            if self.rds_bool == True:
+                self.__store_tabular_data_rds(film_data_dic)
+            if self.csv_bool == True:
+                self.__save_tabular_data_csv(film_data_dic)
+            if self.parquet_bool == True:
+                self.__save_tabular_data_parquet(film_data_dic)
+        self.__poster_downloads.pop(film_data_dic['friendly_id'], None)
+
+    def finish_page(self, page: int):
+        '''
+        Waits for the poster downloads and s3 uploads queued for a page of films, uploading the page's batched records if s3_batch_records is True.
+        Parameters
+        ----------
+        page: int
+            The number of the page in the 'popular' section the films were listed on.
+        '''
+        pending = self.__take_pending_raw_data()
+        self.poster_fetcher.wait()
+        self.s3_sink.flush_batch(f'popular_page_{page}')
+        self.s3_sink.wait()
+        self.__remove_raw_data(pending)
+
+    def flush_storage(self):
+        '''
+        Writes all buffered tabular data to the RDS database, the .csv file and the Parquet dataset, finalising the open Parquet files so they can be read, and waits for queued poster downloads and s3 uploads to finish.
+        Films committed to storage_spool are already durable, so they are left for its threads to store.
+        '''
+        pending = self.__take_pending_raw_data()
+        self.poster_fetcher.wait()
+        self.s3_sink.wait()
+        self.__remove_raw_data(pending)
+        self.rds_writer.flush()
+        self.csv_sink.flush()
+        self.parquet_sink.finalise()
     
         
 if __name__ == "__main__":
-    lbox_scraper = scraper()
-    lbox_scraper.data_storage_options_prompt()
-    lbox_scraper.accept_cookies()
-    next_page = lbox_scraper.start_page + 1
-    pages = lbox_scraper.pages
-    for i in range(pages):
-        link_list = lbox_scraper.get_film_links_from_single_page()
-        for link in link_list:
-            if lbox_scraper.check_if_link_already_scraped(link) == True:
-                link_id = link.split('/')[4]
-                print(f'Data for {link_id} already exists. Skipping to next link...')
-                continue
-            film_data_dic = lbox_scraper.scrape_data_from_film_entry(link)
-            lbox_scraper.implement_data_storage_options(film_data_dic)
-        if next_page == lbox_scraper.start_page + pages:
-            break
-        next_page_url = f'https://letterboxd.com/films/popular/size/small/page/{next_page}/'
-        lbox_scraper.driver.get(next_page_url)
-        print(f'Page {next_page} loaded.')
-        next_page += 1
-        
-    lbox_scraper.driver.quit()
+    config = parse_run_config()
+    start_page, pages = config.start_page, config.pages
+    if config.refresh_stats:
+        # A stats refresh does not list any pages, so there is nothing to prompt for.
+        start_page, pages = start_page or 1, pages or 1
+    lbox_scraper = scraper(scrape_engine=config.engine,
+                           workers=config.workers,
+                           bloom_filter=config.bloom_filter,
+                           rds_batch_size=config.rds_batch_size,
+                           rds_upsert=config.rds_upsert,
+                           s3_batch_records=config.s3_batch_records,
+                           dom_extraction=config.dom_extraction,
+                           page_cache_dir=config.page_cache_dir,
+                           page_cache_replay=config.page_cache_replay,
+                           start_page=start_page,
+                           pages=pages,
+                           metrics=config.metrics,
+                           politeness_delay=config.politeness_delay,
+                           max_attempts=config.max_attempts,
+                           timeouts=config.timeouts,
+                           lean_browser=config.lean_browser,
+                           browser_profile_dir=config.browser_profile_dir,
+                           raw_archive_dir=config.raw_archive_dir,
+                           raw_segment_bytes=int(config.raw_segment_mb * 1024 * 1024),
+                           spool_path=config.spool_path,
+                           page_fingerprint_path=config.page_fingerprints,
+                           films_per_page=config.films_per_page)
+    if config.metrics and config.metrics_port is not None:
+        lbox_scraper.metrics.serve(config.metrics_port)
+    if config.refresh_stats:
+        if config.engine == 'selenium':
+            lbox_scraper.accept_cookies()
+        refreshed = lbox_scraper.refresh_stats(budget=config.refresh_budget)
+        print(f'Refreshed stats for {len(refreshed)} films.')
+    elif config.distributed:
+        # Every instance adds the same page ranges, and ranges already in the table are left as they are.
+        lease_engine = create_engine(config.lease_database_url) if config.lease_database_url is not None else lbox_scraper.engine
+        leases = lease_table(lease_engine, ttl=config.lease_ttl, max_attempts=config.max_attempts)
+        leases.add_page_ranges(lbox_scraper.start_page, lbox_scraper.pages, config.pages_per_lease)
+        lbox_scraper.set_data_storage_options(config.s3, config.keep_raw_data, config.rds, config.csv, config.parquet)
+        if config.engine == 'selenium':
+            lbox_scraper.accept_cookies()
+        print(lbox_scraper.run_leased(leases, config.worker_id, lease_links=config.lease_links))
+        print(leases.summary())
+    else:
+        frontier = None
+        if config.batch:
+            lbox_scraper.set_data_storage_options(config.s3, config.keep_raw_data, config.rds, config.csv, config.parquet)
+            frontier = crawl_frontier(config.frontier, max_attempts=config.max_attempts)
+        else:
+            lbox_scraper.data_storage_options_prompt()
+        if config.engine == 'selenium':
+            lbox_scraper.accept_cookies()
+        pages = list(range(lbox_scraper.start_page, lbox_scraper.start_page + lbox_scraper.pages))
+        if config.pipeline:
+            summary = lbox_scraper.run_pipeline(pages, config.pipeline_concurrency, frontier=frontier)
+            print(summary)
+        else:
+            lbox_scraper.scrape_pages(pages, frontier)
+        if frontier is not None:
+            print(frontier.summary())
+            frontier.close()
+
+    if lbox_scraper.storage_spool is not None:
+        print(lbox_scraper.storage_spool.status())
+    if lbox_scraper.page_fingerprints is not None:
+        lbox_scraper.page_fingerprints.write_rank_report(config.rank_report)
+        print(lbox_scraper.page_fingerprints.summary())
+    lbox_scraper.close()
+    if len(lbox_scraper.dead_letters) > 0:
+        lbox_scraper.dead_letters.write(config.dead_letters)
+        print(f'{len(lbox_scraper.dead_letters)} links could not be scraped. See {config.dead_letters}.')
+    if config.metrics:
+        lbox_scraper.metrics.write_summary(config.metrics_summary)
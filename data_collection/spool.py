@@ -0,0 +1,175 @@
+from data_collection.metrics import NULL_METRICS
+from data_collection import politeness
+import json
+import sqlite3
+import threading
+import time
+
+
+def to_json_value(value):
+    # numpy scalars are stored as the python numbers they hold, and anything else json cannot store, e.g. a datetime, as a string.
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+class write_behind_spool:
+    '''
+    A durable local spool of scraped films, written ahead of storage and drained to each storage sink by background threads.
+    append commits a film to a SQLite write-ahead log and returns, so scraping does not wait for the network. Each sink has its own thread, which writes films in order, a batch at a time. A failing batch is retried with backoff until it succeeds, so a slow or unavailable sink only holds up itself. A film is removed from the spool once every sink has acknowledged it.
+    The position each sink has acknowledged is kept across runs. Films that were spooled but not acknowledged when a run stopped are written when the spool is next opened. A sink that is not registered when the spool is opened has its position forgotten.
+    Appended films survive a crash of the scraper, and with fsync also a power failure, at the cost of waiting for the disk on every append.
+    A film can be written twice if a run stops between a sink writing a batch and acknowledging it.
+
+    Attributes
+    ----------
+    path: str
+        The path of the SQLite database holding the spool (equal to path parameter).
+    sinks: dict
+        Maps the name of each sink to a function that writes a list of film dictionaries to it, raising if the write fails (equal to sinks parameter).
+    batch_size: int
+        The largest number of films written to a sink at once (equal to batch_size parameter).
+    retry_policy: retry_policy
+        Sets the backoff between attempts to write a failing batch, and the number of attempts made once the spool is closing before the batch is left for the next run (equal to retry_policy parameter, 3 attempts if it is None).
+    metrics: metrics_registry
+        Records the time taken by each batch, failed batches, the number of spooled films and each sink's lag (equal to metrics parameter, disabled if it is None).
+    '''
+    def __init__(self, path: str = 'storage_spool.sqlite', sinks: dict = None, batch_size: int = 100, fsync: bool = False,
+                 retry_policy: politeness.retry_policy = None, metrics=None):
+        '''
+        See help(write_behind_spool) for accurate signature.
+        '''
+        self.path = path
+        self.sinks = dict(sinks or {})
+        self.batch_size = batch_size
+        self.metrics = metrics or NULL_METRICS
+        self.retry_policy = retry_policy or politeness.retry_policy(metrics=self.metrics)
+        self.__condition = threading.Condition()
+        self.__closing = False
+        self.__db = sqlite3.connect(path, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+        # AUTOINCREMENT keeps sequence numbers from being reused once acknowledged films are removed.
+        self.__db.execute('CREATE TABLE IF NOT EXISTS records (seq INTEGER PRIMARY KEY AUTOINCREMENT, record TEXT NOT NULL)')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS acks (sink TEXT PRIMARY KEY, seq INTEGER NOT NULL)')
+        with self.__db:
+            self.__last_seq = self.__db.execute('SELECT COALESCE(MAX(seq), 0) FROM records').fetchone()[0]
+            acked = dict(self.__db.execute('SELECT sink, seq FROM acks'))
+            self.__db.executemany('DELETE FROM acks WHERE sink = ?', [(name,) for name in acked if name not in self.sinks])
+            # A new sink only receives films spooled from now on.
+            self.__acked = {name: acked.get(name, self.__last_seq) for name in self.sinks}
+            self.__db.executemany('INSERT OR REPLACE INTO acks (sink, seq) VALUES (?, ?)', list(self.__acked.items()))
+        self.__truncate()
+        self.__report()
+        self.__drainers = [threading.Thread(target=self.__drain, args=(name, write), daemon=True) for name, write in self.sinks.items()]
+        for drainer in self.__drainers:
+            drainer.start()
+
+    def __report(self):
+        status = self.status()
+        self.metrics.set_gauge('spool_records', status['records'])
+        for name, lag in status['lag'].items():
+            self.metrics.set_gauge('spool_lag_records', lag, {'sink': name})
+
+    def __truncate(self):
+        if len(self.__acked) > 0:
+            with self.__db:
+                self.__db.execute('DELETE FROM records WHERE seq <= ?', (min(self.__acked.values()),))
+
+    def append(self, film_data_dic: dict) -> int:
+        '''
+        Commits a film to the spool, to be written to every sink in the background.
+        Parameters
+        ----------
+        film_data_dic: film_record or dict
+            All cleaned data for a single film.
+
+        Returns
+        -------
+        int
+            The film's sequence number in the spool.
+        '''
+        record = json.dumps(dict(film_data_dic), default=to_json_value)
+        with self.__condition:
+            with self.__db:
+                seq = self.__db.execute('INSERT INTO records (record) VALUES (?)', (record,)).lastrowid
+            self.__last_seq = seq
+            self.__condition.notify_all()
+        self.__report()
+        return seq
+
+    def __next_batch(self, name: str) -> list:
+        with self.__condition:
+            while self.__acked[name] >= self.__last_seq and not self.__closing:
+                self.__condition.wait()
+            rows = self.__db.execute('SELECT seq, record FROM records WHERE seq > ? ORDER BY seq LIMIT ?', (self.__acked[name], self.batch_size)).fetchall()
+        return rows
+
+    def __acknowledge(self, name: str, seq: int):
+        with self.__condition:
+            with self.__db:
+                self.__db.execute('UPDATE acks SET seq = ? WHERE sink = ?', (seq, name))
+            self.__acked[name] = seq
+            self.__truncate()
+            self.__condition.notify_all()
+        self.__report()
+
+    def __drain(self, name: str, write):
+        while True:
+            rows = self.__next_batch(name)
+            if len(rows) == 0:
+                return
+            film_data_dic_list = [json.loads(record) for _, record in rows]
+            attempt = 0
+            while True:
+                try:
+                    with self.metrics.timer('spool_write_seconds', {'sink': name}):
+                        write(film_data_dic_list)
+                    break
+                except Exception as error:
+                    attempt += 1
+                    self.metrics.increment('spool_write_failures_total', labels={'sink': name})
+                    print(f'Failed to write {len(rows)} films to {name}: {error!r}. Retrying...')
+                    if self.__closing and attempt >= self.retry_policy.max_attempts:
+                        # The films stay in the spool and are written when it is next opened.
+                        print(f'Leaving {self.status()["lag"][name]} films spooled for {name}.')
+                        return
+                    time.sleep(self.retry_policy.backoff(attempt))
+            self.__acknowledge(name, rows[-1][0])
+
+    def status(self) -> dict:
+        '''
+        Returns the number of films in the spool and the number each sink has yet to acknowledge.
+
+        Returns
+        -------
+        dict
+            A dictionary of the number of spooled 'records' and the 'lag' of each sink.
+        '''
+        with self.__condition:
+            lag = {name: self.__last_seq - seq for name, seq in self.__acked.items()}
+            return {'records': max(lag.values(), default=0), 'lag': lag}
+
+    def wait(self, timeout: float = None) -> bool:
+        '''
+        Blocks until every sink has acknowledged every film appended so far, or timeout seconds have passed.
+
+        Returns
+        -------
+        bool
+            Whether the spool was drained.
+        '''
+        with self.__condition:
+            target = self.__last_seq
+            return self.__condition.wait_for(lambda: all(seq >= target for seq in self.__acked.values()), timeout)
+
+    def close(self):
+        '''
+        Drains the spool to every sink, giving up on a sink after max_attempts failed attempts at a batch, and closes the database.
+        '''
+        with self.__condition:
+            self.__closing = True
+            self.__condition.notify_all()
+        for drainer in self.__drainers:
+            drainer.join()
+        self.__report()
+        with self.__condition:
+            self.__db.close()
@@ -0,0 +1,221 @@
+from datetime import datetime
+import math
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import uuid
+
+
+FILM_DATA_SCHEMA = pa.schema([('friendly_id', pa.string()),
+                              ('uuid', pa.string()),
+                              ('title', pa.string()),
+                              ('year', pa.int32()),
+                              ('runtime', pa.int32()),
+                              ('rating', pa.float64()),
+                              ('watches', pa.int64()),
+                              ('lists', pa.int64()),
+                              ('likes', pa.int64()),
+                              ('director', pa.string()),
+                              ('top_250_position', pa.int32()),
+                              ('description', pa.string()),
+                              ('poster_link', pa.string()),
+                              ('data_obtained_time', pa.timestamp('us'))])
+
+
+def to_typed_row(film_data_dic: dict) -> dict:
+    '''
+    Converts a cleaned film dictionary to plain python values matching FILM_DATA_SCHEMA.
+    Parameters
+    ----------
+    film_data_dic: dict
+        A dictionary containing all cleaned data for a single film.
+
+    Returns
+    -------
+    row: dict
+        A dictionary with one value per schema field, using None for missing values.
+    '''
+    row = {}
+    for field in FILM_DATA_SCHEMA:
+        value = film_data_dic.get(field.name)
+        if isinstance(value, float) and math.isnan(value):
+            value = None
+        elif hasattr(value, 'item'):
+            value = value.item()
+        if field.name == 'data_obtained_time' and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        row[field.name] = value
+    return row
+
+
+class parquet_sink:
+    '''
+    A streaming writer that saves tabular film data as Parquet files partitioned by scrape date.
+    Rows are buffered and written as a typed row group every 'batch_size' rows. Each partition directory (scrape_date=YYYY-MM-DD) gets one open file at a time, which is finalised by finalise or when the sink is closed.
+    Open files are hidden (named '.part-*') until they are finalised, so readers of the dataset never see a file without a footer, e.g. one left by a run that crashed.
+
+    Attributes
+    ----------
+    root_dir: str
+        The directory the partitioned dataset is written to (equal to root_dir parameter).
+    batch_size: int
+        The number of rows in each row group (equal to batch_size parameter).
+    rows_written: int
+        The number of rows written since the sink was created.
+    '''
+    def __init__(self, root_dir: str = 'film_data_parquet', batch_size: int = 500):
+        '''
+        See help(parquet_sink) for accurate signature.
+        '''
+        self.root_dir = root_dir
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.__run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.__buffer = []
+        self.__writers = {}
+        self.__files_opened = 0
+
+    def __writer_for(self, scrape_date: str):
+        if scrape_date not in self.__writers:
+            partition_dir = os.path.join(self.root_dir, f'scrape_date={scrape_date}')
+            os.makedirs(partition_dir, exist_ok=True)
+            file_name = f'part-{self.__run_id}-{self.__files_opened:05d}.parquet'
+            self.__files_opened += 1
+            file_path = os.path.join(partition_dir, file_name)
+            hidden_path = os.path.join(partition_dir, f'.{file_name}')
+            self.__writers[scrape_date] = (pq.ParquetWriter(hidden_path, FILM_DATA_SCHEMA, compression='snappy'), hidden_path, file_path)
+        return self.__writers[scrape_date][0]
+
+    def write(self, film_data_dic: dict):
+        '''
+        Adds the data for a single film to the buffer, writing a row group if the buffer is full.
+        Parameters
+        ----------
+        film_data_dic: dict
+            A dictionary containing all cleaned data for a single film.
+        '''
+        self.__buffer.append(to_typed_row(film_data_dic))
+        if len(self.__buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Writes the buffered rows as one row group per scrape date.
+        '''
+        for scrape_date, rows in self.__partition(self.__buffer).items():
+            self.__writer_for(scrape_date).write_table(pa.Table.from_pylist(rows, schema=FILM_DATA_SCHEMA))
+            self.rows_written += len(rows)
+        self.__buffer = []
+
+    def __partition(self, rows: list) -> dict:
+        partitions = {}
+        for row in rows:
+            obtained_time = row['data_obtained_time'] or datetime.now()
+            partitions.setdefault(obtained_time.date().isoformat(), []).append(row)
+        return partitions
+
+    def write_batch(self, film_data_dic_list: list):
+        '''
+        Writes the data for a batch of films straight away as one complete file per scrape date, e.g. for a write_behind_spool.
+        Unlike the files written by write, which only become readable once they are finalised, the batch can be read as soon as this returns.
+        Parameters
+        ----------
+        film_data_dic_list: list of dict
+            A dictionary containing all cleaned data for each film.
+        '''
+        for scrape_date, rows in self.__partition([to_typed_row(film_data_dic) for film_data_dic in film_data_dic_list]).items():
+            partition_dir = os.path.join(self.root_dir, f'scrape_date={scrape_date}')
+            os.makedirs(partition_dir, exist_ok=True)
+            file_name = f'part-{self.__run_id}-batch-{uuid.uuid4().hex[:8]}.parquet'
+            hidden_path = os.path.join(partition_dir, f'.{file_name}')
+            pq.write_table(pa.Table.from_pylist(rows, schema=FILM_DATA_SCHEMA), hidden_path, compression='snappy')
+            os.replace(hidden_path, os.path.join(partition_dir, file_name))
+            self.rows_written += len(rows)
+
+    def finalise(self):
+        '''
+        Writes any buffered rows and finalises every open Parquet file, so that every row written so far can be read, e.g. before a crawl is checkpointed. Later rows go to new files.
+        '''
+        self.flush()
+        for writer, hidden_path, file_path in self.__writers.values():
+            writer.close()
+            os.replace(hidden_path, file_path)
+        self.__writers = {}
+
+    def close(self):
+        '''
+        Writes any buffered rows and finalises every open Parquet file.
+        '''
+        self.finalise()
+
+
+class csv_sink:
+    '''
+    A batched writer that appends tabular film data to a .csv file, keeping the file open between batches.
+
+    Attributes
+    ----------
+    output_path: str
+        The path of the .csv file (equal to output_path parameter).
+    batch_size: int
+        The number of buffered rows that triggers a write (equal to batch_size parameter).
+    '''
+    def __init__(self, output_path: str = 'film_data.csv', batch_size: int = 50):
+        '''
+        See help(csv_sink) for accurate signature.
+        '''
+        self.output_path = output_path
+        self.batch_size = batch_size
+        self.__buffer = []
+        self.__file = None
+
+    def write(self, film_data_dic: dict):
+        '''
+        Adds the data for a single film to the buffer, writing the buffer to the file if it is full.
+        Parameters
+        ----------
+        film_data_dic: dict
+            A dictionary containing all cleaned data for a single film.
+        '''
+        self.__buffer.append(dict(film_data_dic))
+        if len(self.__buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        Appends the buffered rows to the file and flushes it to disk.
+        '''
+        if len(self.__buffer) == 0:
+            return
+        self.__write_rows(self.__buffer)
+        self.__buffer = []
+
+    def __write_rows(self, rows: list):
+        if self.__file is None:
+            self.__file = open(self.output_path, 'a', newline='')
+        film_data_df = pd.DataFrame(rows).set_index('friendly_id')
+        film_data_df['top_250_position'] = film_data_df['top_250_position'].astype('Int64')
+        film_data_df.to_csv(self.__file, header=self.__file.tell() == 0)
+        self.__file.flush()
+
+    def write_batch(self, film_data_dic_list: list):
+        '''
+        Appends the data for a batch of films to the file straight away, without buffering it, e.g. for a write_behind_spool.
+        Parameters
+        ----------
+        film_data_dic_list: list of dict
+            A dictionary containing all cleaned data for each film.
+        '''
+        self.flush()
+        if len(film_data_dic_list) > 0:
+            self.__write_rows([dict(film_data_dic) for film_data_dic in film_data_dic_list])
+
+    def close(self):
+        '''
+        Writes any buffered rows and closes the file.
+        '''
+        self.flush()
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
@@ -7,6 +7,6 @@ setup(
     description='Tool to scrape letterboxd.com for film data',
     url='',
     author='Fintan Smyth',
-    packages=find_packages(),
-    install_requires=['requests', 'selenium'],
+    packages=find_packages(exclude=['benchmarks']),
+    install_requires=['requests', 'selenium', 'lxml'],
 )
\ No newline at end of file
@@ -0,0 +1,45 @@
+from benchmarks import fixture_server
+from benchmarks import run_benchmarks
+from data_collection import http_engine
+import unittest
+
+class fixture_serverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.server = fixture_server.fixture_server(n_films=5, films_per_page=3).start()
+        self.scrapetest = http_engine.http_scraper(base_url=self.server.base_url)
+
+    def tearDown(self):
+        self.scrapetest.session.close()
+        self.server.stop()
+
+    def test_pages_served_from_fixtures(self):
+        self.assertEqual(self.scrapetest.get_film_links_from_page(2), [f'{self.server.base_url}/film/benchmark-film-3/',
+                                                                      f'{self.server.base_url}/film/benchmark-film-4/'])
+        film_data_dic, missing_fields = self.scrapetest.scrape_film_entry(f'{self.server.base_url}/film/benchmark-film-3/')
+        self.assertEqual(missing_fields, [])
+        self.assertEqual(film_data_dic['title'], 'Benchmark Film 3')
+        self.assertEqual(film_data_dic['poster_link'], f'{self.server.base_url}/posters/benchmark-film-3.jpg?v=1')
+
+    def test_errors_injected(self):
+        self.server.error_rate = 1
+        with self.assertRaises(http_engine.requests.HTTPError):
+            self.scrapetest.fetch_page(f'{self.server.base_url}/film/benchmark-film-0/')
+        self.assertEqual(self.server.errors_served, 1)
+
+class run_benchmarksTestCase(unittest.TestCase):
+    def test_single_run(self):
+        setting = {'engine': 'http', 'flow': 'sequential', 'workers': 2, 'pages': 1, 'films_per_page': 4,
+                   'latency': 0, 'error_rate': 0, 'politeness_delay': 0}
+        result = run_benchmarks.run_single(setting)
+        self.assertEqual(result['films'], 4)
+        self.assertGreater(result['films_per_second'], 0)
+        self.assertIsNotNone(result['p95_seconds'])
+
+    def test_regressions_reported(self):
+        previous = {'commit': 'abc1234', 'films_per_second': 10, 'p50_seconds': 0.1, 'p95_seconds': 0.2, 'peak_rss_mb': 100}
+        result = {'films_per_second': 8, 'p50_seconds': 0.1, 'p95_seconds': 0.21, 'peak_rss_mb': 100}
+        regressions = run_benchmarks.compare(result, previous, 0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith('films_per_second 10 -> 8'))
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,90 @@
+from benchmarks.fixture_server import fixture_server
+from data_collection import cleaning
+from datetime import datetime
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import unittest
+
+def scraped_film(friendly_id: str, **fields) -> dict:
+    film_data_dic = {'friendly_id': friendly_id, 'uuid': '3cc9fa2a-6bb2-4b5f-8b58-3ab2a0e26e4d', 'title': 'La La Land', 'year': '2016',
+                     'runtime': '128 mins', 'rating': '4.1', 'watches': '2,934,817', 'lists': '481,295', 'likes': '1,164,523',
+                     'director': 'Damien Chazelle', 'top_250_position': '213', 'description': 'Mia, an aspiring actress...',
+                     'poster_link': 'https://a.ltrbxd.com/poster.jpg', 'data_obtained_time': datetime(2022, 11, 1, 10)}
+    film_data_dic.update(fields)
+    return film_data_dic
+
+class clean_film_batchTestCase(unittest.TestCase):
+    def test_batch_cleaned_to_records(self):
+        records, parse_errors = cleaning.clean_film_batch([scraped_film('la-la-land'),
+                                                           scraped_film('fargo', director=['Joel Coen', 'Ethan Coen'], top_250_position=np.nan)])
+        self.assertEqual(parse_errors, [])
+        self.assertEqual((records[0].year, records[0].runtime, records[0].rating, records[0].watches), (2016, 128, 4.1, 2934817))
+        self.assertEqual(type(records[0].watches), int)
+        self.assertEqual(records[0]['top_250_position'], 213)
+        self.assertIsNone(records[1].top_250_position)
+        self.assertEqual(records[1].director, 'Joel Coen, Ethan Coen')
+        self.assertEqual(records[1].data_obtained_time, datetime(2022, 11, 1, 10))
+
+    def test_parse_errors_reported_per_field(self):
+        records, parse_errors = cleaning.clean_film_batch([scraped_film('la-la-land'),
+                                                           scraped_film('oz', runtime='TBA', watches='1.2K', year='', director='Oz')])
+        self.assertEqual(parse_errors, [{'friendly_id': 'oz', 'field': 'year', 'value': ''},
+                                        {'friendly_id': 'oz', 'field': 'runtime', 'value': 'TBA'},
+                                        {'friendly_id': 'oz', 'field': 'watches', 'value': '1.2K'}])
+        self.assertEqual((records[1].year, records[1].runtime, records[1].watches, records[1].likes), (None, None, None, 1164523))
+        self.assertEqual(records[1].director, 'Oz')
+        self.assertEqual(records[0].runtime, 128)
+
+    def test_stats_cleaned(self):
+        stats_data_dic_list, parse_errors = cleaning.clean_batch([{'friendly_id': 'la-la-land', 'rating': '4.1', 'watches': '2,934,817',
+                                                                   'lists': '481,295', 'likes': '1,164,523', 'top_250_position': None}])
+        self.assertEqual(parse_errors, [])
+        self.assertEqual(stats_data_dic_list, [{'friendly_id': 'la-la-land', 'rating': 4.1, 'watches': 2934817, 'lists': 481295,
+                                                'likes': 1164523, 'top_250_position': None}])
+
+class film_recordTestCase(unittest.TestCase):
+    def test_record_used_as_dictionary(self):
+        record = cleaning.film_record(friendly_id='la-la-land', year=2016)
+        record['runtime'] = 128
+        self.assertEqual((record['friendly_id'], record.runtime, record.get('title'), record.get('unknown', 'default')),
+                         ('la-la-land', 128, None, 'default'))
+        self.assertEqual(list(dict(record)), cleaning.RECORD_FIELDS)
+        with self.assertRaises(KeyError):
+            record['unknown'] = 1
+        with self.assertRaises(AttributeError):
+            record.unknown = 1
+        self.assertEqual(cleaning.film_record.from_dict(record.to_dict()), record)
+
+class scraped_page_cleaningTestCase(unittest.TestCase):
+    def test_films_scraped_before_a_failure_are_stored(self):
+        from data_collection.scraper import scraper
+        server = fixture_server(n_films=12, films_per_page=12).start()
+        working_dir = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            os.chdir(tmp_dir)
+            try:
+                lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=1, base_url=server.base_url, database_url='sqlite:///film_data.db',
+                                       politeness_delay=0)
+                lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=False, csv=True, parquet=False)
+                scrape_raw_film_entry = lbox_scraper._scraper__scrape_raw_film_entry
+
+                def failing_scrape_raw_film_entry(link: str) -> dict:
+                    if 'benchmark-film-1/' in link:
+                        raise IndexError('list index out of range')
+                    if 'benchmark-film-4/' in link:
+                        raise KeyboardInterrupt
+                    return scrape_raw_film_entry(link)
+
+                lbox_scraper._scraper__scrape_raw_film_entry = failing_scrape_raw_film_entry
+                with self.assertRaises(KeyboardInterrupt):
+                    lbox_scraper.scrape_pages([1])
+                lbox_scraper.close()
+                self.assertEqual(list(pd.read_csv('film_data.csv', index_col=0).index), ['benchmark-film-0', 'benchmark-film-2', 'benchmark-film-3'])
+                self.assertEqual([entry['link'].split('/')[-2] for entry in lbox_scraper.dead_letters], ['benchmark-film-1'])
+            finally:
+                os.chdir(working_dir)
+                server.stop()
+
+unittest.main(argv=[''], verbosity=1, exit=False)
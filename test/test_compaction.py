@@ -0,0 +1,76 @@
+from data_collection import compaction
+from datetime import datetime
+from sqlalchemy import create_engine
+import os
+import pandas as pd
+import tempfile
+import unittest
+
+def film_data(friendly_id: str, data_obtained_time: str, year=1998, rating=4.0, watches='10,000') -> dict:
+    return {'friendly_id': friendly_id,
+            'uuid': '1234-5678-9012-3456',
+            'title': 'Test Film',
+            'year': year,
+            'runtime': '420 mins',
+            'rating': rating,
+            'watches': watches,
+            'lists': 999999,
+            'likes': 3141592,
+            'director': 'Fintan Smyth',
+            'top_250_position': None,
+            'description': 'Test description',
+            'poster_link': 'https://a.ltrbxd.com/poster.jpg',
+            'data_obtained_time': data_obtained_time}
+
+class film_data_compactorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp_dir.name, 'film_data.csv')
+        self.output_dir = os.path.join(self.tmp_dir.name, 'film_data_snapshot')
+        # Rows appended one DataFrame at a time, as the scraper used to write them.
+        for row in [film_data('whiplash', '2022-11-01 10:00:00', year=2014, rating=4.5),
+                    film_data('la-la-land', '2022-11-01 10:00:00', year=2016, rating=4.0, watches='1,000'),
+                    film_data('la-la-land', '2022-11-03 10:00:00', year=2016, rating=4.1, watches='2,000'),
+                    film_data('alien', '2022-11-02 10:00:00', year=1979, rating='not a rating')]:
+            pd.DataFrame([row]).set_index('friendly_id').to_csv(self.csv_path, mode='a', header=not os.path.exists(self.csv_path))
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'film_data.db')}")
+        pd.DataFrame([film_data('la-la-land', '2022-11-02 10:00:00', year=2016, rating=3.9, watches=1500),
+                      film_data('zodiac', '2022-11-02 10:00:00', year=2007, rating=3.8, watches=500)]).set_index('friendly_id').to_sql('film_data', self.engine)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def compact(self, **kwargs) -> dict:
+        compactor = compaction.film_data_compactor(self.output_dir, chunk_rows=2, row_group_rows=2, **kwargs)
+        compactor.add_csv(self.csv_path)
+        compactor.add_table(self.engine)
+        return compactor.compact()
+
+    def test_latest_row_kept_per_film(self):
+        summary = self.compact()
+        self.assertEqual(summary, {'rows_read': 6, 'films': 4, 'duplicates_dropped': 2, 'history_rows': 0})
+        snapshot = compaction.film_data_snapshot(self.output_dir)
+        self.assertEqual(len(snapshot), 4)
+        film = snapshot.get('la-la-land')
+        self.assertEqual((film['rating'], film['watches'], film['runtime']), (4.1, 2000, 420))
+        self.assertEqual(film['data_obtained_time'], datetime(2022, 11, 3, 10))
+        self.assertIsNone(snapshot.get('alien')['rating'])
+        self.assertIsNone(snapshot.get('jaws'))
+        self.assertIsNone(snapshot.get('zzz'))
+        self.assertFalse(os.path.exists(f'{self.output_dir}.part'))
+
+    def test_films_sorted_and_queried_by_range(self):
+        self.compact()
+        snapshot = compaction.film_data_snapshot(self.output_dir)
+        self.assertEqual(snapshot.query()['friendly_id'].tolist(), ['alien', 'la-la-land', 'whiplash', 'zodiac'])
+        self.assertEqual(snapshot.query(year=(2000, None))['friendly_id'].tolist(), ['la-la-land', 'whiplash', 'zodiac'])
+        self.assertEqual(snapshot.query(year=(2000, 2015), rating=(4, 5))['friendly_id'].tolist(), ['whiplash'])
+        self.assertEqual(len(snapshot.query(year=(1900, 1950))), 0)
+
+    def test_history_of_stats(self):
+        summary = self.compact(history=True)
+        self.assertEqual(summary['history_rows'], 6)
+        history = compaction.film_data_snapshot(self.output_dir).history('la-la-land')
+        self.assertEqual(history['watches'].tolist(), [1000, 1500, 2000])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,45 @@
+from data_collection import config
+from contextlib import redirect_stderr
+import io
+import unittest
+
+class parse_run_configTestCase(unittest.TestCase):
+    def test_flags_override_environment(self):
+        environ = {'BATCH_MODE': '1', 'START_PAGE': '3', 'PAGES': '5', 'SCRAPE_ENGINE': 'http', 'SAVE_CSV': 'yes'}
+        run_config = config.parse_run_config(['--pages', '10', '--no-s3'], environ)
+        self.assertTrue(run_config.batch)
+        self.assertEqual((run_config.start_page, run_config.pages), (3, 10))
+        self.assertEqual(run_config.engine, 'http')
+        self.assertFalse(run_config.s3)
+        self.assertTrue(run_config.csv)
+        self.assertTrue(run_config.rds)
+
+    def test_pipeline_concurrency(self):
+        run_config = config.parse_run_config(['--pipeline-concurrency', 'fetch=4, raw_storage=2'], {})
+        self.assertEqual(run_config.pipeline_concurrency, {'fetch': 4, 'raw_storage': 2})
+        self.assertEqual(config.parse_run_config([], {}).pipeline_concurrency, {})
+
+    def test_politeness_settings(self):
+        run_config = config.parse_run_config(['--timeouts', 'page_load=60, element=5', '--max-attempts', '5'], {'POLITENESS_DELAY': '0.5'})
+        self.assertEqual(run_config.timeouts, {'page_load': 60, 'element': 5})
+        self.assertEqual((run_config.max_attempts, run_config.politeness_delay), (5, 0.5))
+
+    def test_batch_mode_needs_pages(self):
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            config.parse_run_config(['--batch', '--start-page', '1'], {})
+        self.assertIsNone(config.parse_run_config([], {}).start_page)
+
+    def test_distributed_settings(self):
+        run_config = config.parse_run_config(['--distributed', '--start-page', '1', '--pages', '20', '--lease-links'], {'LEASE_TTL': '120'})
+        self.assertTrue(run_config.distributed and run_config.lease_links)
+        self.assertEqual((run_config.lease_ttl, run_config.pages_per_lease, run_config.worker_id), (120, 5, None))
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            config.parse_run_config(['--distributed', '--pages', '20'], {})
+
+    def test_page_fingerprint_settings(self):
+        run_config = config.parse_run_config(['--page-fingerprints', 'pages.sqlite'], {'FILMS_PER_PAGE': '12'})
+        self.assertEqual((run_config.page_fingerprints, run_config.films_per_page, run_config.rank_report), ('pages.sqlite', 12, 'rank_changes.jsonl'))
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            config.parse_run_config(['--films-per-page', '0'], {})
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,57 @@
+from data_collection import dedup
+from sqlalchemy import create_engine, event
+import pandas as pd
+import unittest
+
+class scraped_link_indexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        film_data_df = pd.DataFrame({'friendly_id': ['parasite-2019', 'la-la-land', 'whiplash-2014'], 'title': ['Parasite', 'La La Land', 'Whiplash']})
+        film_data_df.set_index('friendly_id').to_sql('film_data', self.engine)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.record_statement)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def record_statement(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            self.statements.append((statement, parameters))
+
+    def test_page_checked_without_per_link_queries(self):
+        index = dedup.scraped_link_index(self.engine)
+        page = ['la-la-land', 'testfilm', 'parasite-2019'] * 24
+        self.assertEqual(index.filter_scraped(page), {'la-la-land', 'parasite-2019'})
+        self.assertEqual(index.filter_scraped(['whiplash-2014']), {'whiplash-2014'})
+        self.assertEqual(len(self.statements), 1)
+
+    def test_added_ids_are_skipped(self):
+        index = dedup.scraped_link_index(self.engine)
+        self.assertFalse('testfilm' in index)
+        index.add('testfilm')
+        self.assertTrue('testfilm' in index)
+
+    def test_bloom_filter_confirms_matches_in_one_query(self):
+        index = dedup.scraped_link_index(self.engine, use_bloom_filter=True, expected_items=1000)
+        index.load()
+        self.statements.clear()
+        page = ['la-la-land', 'whiplash-2014'] + [f'unscraped-film-{i}' for i in range(70)]
+        self.assertEqual(index.filter_scraped(page), {'la-la-land', 'whiplash-2014'})
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(all('?' in statement for statement, _ in self.statements))
+
+    def test_missing_table(self):
+        index = dedup.scraped_link_index(create_engine('sqlite://'))
+        self.assertEqual(index.filter_scraped(['la-la-land']), set())
+
+class bloom_filterTestCase(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = dedup.bloom_filter(capacity=500, error_rate=0.01)
+        items = [f'film-{i}' for i in range(500)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f'other-{i}' in bloom for i in range(5000))
+        self.assertLess(false_positives, 150)
+
+unittest.main(argv=[''], verbosity=1, exit=False)
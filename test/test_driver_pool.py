@@ -0,0 +1,165 @@
+from data_collection import driver_pool
+from unittest import mock
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+class driver_poolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+        self.prepared = []
+        self.pooltest = driver_pool.driver_pool(size=2, pages_per_driver=3, driver_factory=self.fake_driver, on_new_driver=self.prepared.append)
+
+    def tearDown(self):
+        self.pooltest.close()
+
+    def fake_driver(self):
+        driver = mock.Mock()
+        self.created.append(driver)
+        return driver
+
+    def test_drivers_are_reused(self):
+        for _ in range(2):
+            driver = self.pooltest.acquire()
+            self.pooltest.release(driver)
+        self.assertEqual(len(self.created), 1)
+        self.assertEqual(self.prepared, self.created)
+
+    def test_driver_recycled_after_pages_per_driver(self):
+        for _ in range(4):
+            driver = self.pooltest.acquire()
+            self.pooltest.release(driver)
+        self.assertEqual(len(self.created), 2)
+        self.created[0].quit.assert_called_once()
+        self.assertEqual(self.prepared, self.created)
+
+    def test_driver_recycled_after_crash(self):
+        driver = self.pooltest.acquire()
+        self.pooltest.release(driver, crashed=True)
+        self.assertIsNot(self.pooltest.acquire(), driver)
+        driver.quit.assert_called_once()
+
+    def test_pool_is_bounded(self):
+        first = self.pooltest.acquire()
+        self.pooltest.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(self.pooltest.acquire()))
+        waiter.start()
+        time.sleep(0.1)
+        self.assertEqual(acquired, [])
+        self.pooltest.release(first)
+        waiter.join(timeout=1)
+        self.assertEqual(acquired, [first])
+        self.assertEqual(len(self.created), 2)
+
+    def test_close_quits_idle_drivers(self):
+        driver = self.pooltest.acquire()
+        self.pooltest.release(driver)
+        self.pooltest.close()
+        driver.quit.assert_called_once()
+        with self.assertRaises(RuntimeError):
+            self.pooltest.acquire()
+
+class scrape_links_concurrentlyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.working_dir = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.working_dir)
+        self.tmp_dir.cleanup()
+
+    def test_failing_link_releases_its_driver(self):
+        from data_collection.scraper import scraper
+        lbox_scraper = scraper(scrape_engine='selenium', workers=2, start_page=1, pages=1, database_url='sqlite:///film_data.db', politeness_delay=0)
+        lbox_scraper.driver_pool = driver_pool.driver_pool(size=2, driver_factory=mock.Mock)
+
+        def scrape_raw_film_entry(link: str) -> dict:
+            if 'broken' in link:
+                raise IndexError('list index out of range')
+            return {'friendly_id': link.split('/')[4]}
+
+        lbox_scraper._scraper__scrape_raw_film_entry = scrape_raw_film_entry
+        lbox_scraper._scraper__clean_and_store_raw_data_local = lambda film_data_dic_list: film_data_dic_list
+        link_list = [f'https://letterboxd.com/film/{friendly_id}/' for friendly_id in ['broken-1', 'broken-2', 'broken-3', 'la-la-land', 'parasite-2019']]
+        results = []
+        worker = threading.Thread(target=lambda: results.append(lbox_scraper.scrape_links_concurrently(link_list)))
+        worker.start()
+        worker.join(timeout=10)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual([film_data_dic['friendly_id'] for film_data_dic in results[0]], ['la-la-land', 'parasite-2019'])
+        self.assertEqual(sorted(entry['link'] for entry in lbox_scraper.dead_letters), link_list[:3])
+        lbox_scraper.close()
+
+    def test_failing_http_link_keeps_other_films(self):
+        from data_collection.scraper import scraper
+        lbox_scraper = scraper(scrape_engine='http', workers=2, start_page=1, pages=1, database_url='sqlite:///film_data.db', politeness_delay=0, metrics=True)
+
+        def scrape_raw_film_entry(link: str) -> dict:
+            if 'broken' in link:
+                raise IndexError('list index out of range')
+            return {'friendly_id': link.split('/')[4]}
+
+        lbox_scraper._scraper__scrape_raw_film_entry = scrape_raw_film_entry
+        lbox_scraper._scraper__clean_and_store_raw_data_local = lambda film_data_dic_list: film_data_dic_list
+        link_list = [f'https://letterboxd.com/film/{friendly_id}/' for friendly_id in ['la-la-land', 'broken-1', 'parasite-2019']]
+        film_data_dic_list = lbox_scraper.scrape_links_concurrently(link_list)
+        self.assertEqual([film_data_dic['friendly_id'] for film_data_dic in film_data_dic_list], ['la-la-land', 'parasite-2019'])
+        self.assertEqual([entry['link'] for entry in lbox_scraper.dead_letters], link_list[1:2])
+        self.assertEqual(lbox_scraper.metrics.summary()['counters']['films_failed_total'], 1)
+        lbox_scraper.close()
+
+    def test_failing_browser_fetch_releases_its_driver(self):
+        from data_collection.scraper import scraper
+        lbox_scraper = scraper(scrape_engine='selenium', workers=1, start_page=1, pages=1, database_url='sqlite:///film_data.db', politeness_delay=0)
+        lbox_scraper.driver_pool = driver_pool.driver_pool(size=1, driver_factory=mock.Mock)
+        link_list = [f'https://letterboxd.com/film/{friendly_id}/' for friendly_id in ['broken-1', 'broken-2', 'broken-3', 'la-la-land']]
+
+        def scrape_film_entry_selenium(link: str) -> dict:
+            if 'broken' in link:
+                raise IndexError('list index out of range')
+            return {'friendly_id': link.split('/')[4]}
+
+        stored = []
+        lbox_scraper._scraper__worker_scraper = lambda driver: mock.Mock(_scraper__scrape_film_entry_selenium=scrape_film_entry_selenium)
+        lbox_scraper._scraper__discover_links_stage = lambda page, frontier=None: link_list
+        lbox_scraper._scraper__cleaning_stage = lambda film_data_dic_list: film_data_dic_list
+        lbox_scraper._scraper__raw_storage_stage = lambda film_data_dic: film_data_dic
+        lbox_scraper._scraper__tabular_storage_stage = stored.append
+        summaries = []
+        worker = threading.Thread(target=lambda: summaries.append(lbox_scraper.run_pipeline([1], report_interval=None)))
+        worker.start()
+        worker.join(timeout=10)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual([film_data_dic['friendly_id'] for film_data_dic in stored], ['la-la-land'])
+        self.assertEqual(sorted(entry['link'] for entry in lbox_scraper.dead_letters), link_list[:3])
+        lbox_scraper.close()
+
+class firefox_optionsTestCase(unittest.TestCase):
+    def test_lean_options(self):
+        options = driver_pool.firefox_options(lean=True, profile_dir='/tmp/profiles/profile-0')
+        self.assertEqual(options.page_load_strategy, 'eager')
+        self.assertEqual(options.preferences['permissions.default.image'], 2)
+        self.assertEqual(options.preferences['network.proxy.type'], 2)
+        self.assertEqual(options.arguments[-2:], ['-profile', '/tmp/profiles/profile-0'])
+        self.assertEqual(driver_pool.firefox_options().page_load_strategy, 'normal')
+        self.assertNotIn('permissions.default.image', driver_pool.firefox_options().preferences)
+
+    def test_blocked_hosts_pac(self):
+        pac = driver_pool.blocked_hosts_pac(['doubleclick.net'])
+        self.assertIn('dnsDomainIs(host, ".doubleclick.net")', pac)
+        self.assertTrue(pac.endswith('return "DIRECT"; }'))
+
+    def test_profile_directories_reused(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profiles = driver_pool.profile_directories(tmp_dir)
+            first, second = profiles.acquire(), profiles.acquire()
+            self.assertNotEqual(first, second)
+            self.assertTrue(os.path.isdir(first))
+            profiles.release(first)
+            self.assertEqual(profiles.acquire(), first)
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,86 @@
+from benchmarks.fixture_server import fixture_server
+from data_collection import frontier
+import os
+import tempfile
+import unittest
+
+def links(*friendly_ids) -> list:
+    return [f'https://letterboxd.com/film/{friendly_id}/' for friendly_id in friendly_ids]
+
+class crawl_frontierTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'crawl_frontier.sqlite')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resumes_pending_links_after_restart(self):
+        checkpoint = frontier.crawl_frontier(self.path)
+        checkpoint.add_page(1, links('la-la-land', 'parasite-2019', 'whiplash-2014'))
+        checkpoint.mark_skipped(links('parasite-2019'))
+        checkpoint.close()
+        checkpoint = frontier.crawl_frontier(self.path)
+        self.assertTrue(checkpoint.has_page(1))
+        self.assertFalse(checkpoint.is_page_done(1))
+        self.assertEqual(checkpoint.pending_links(1), links('la-la-land', 'whiplash-2014'))
+        checkpoint.finish_page(1)
+        self.assertTrue(checkpoint.is_page_done(1))
+        self.assertEqual(checkpoint.pending_links(1), [])
+        self.assertEqual(checkpoint.summary(), {'pages_done': 1, 'pending': 0, 'done': 2, 'failed': 0, 'skipped': 1})
+        checkpoint.close()
+
+    def test_failed_links_retried_until_attempts_run_out(self):
+        checkpoint = frontier.crawl_frontier(self.path, max_attempts=2)
+        checkpoint.add_page(1, links('la-la-land', 'parasite-2019'))
+        checkpoint.finish_page(1, links('parasite-2019'))
+        self.assertFalse(checkpoint.is_page_done(1))
+        self.assertEqual(checkpoint.pending_links(1), links('parasite-2019'))
+        checkpoint.finish_page(1, links('parasite-2019'))
+        self.assertTrue(checkpoint.is_page_done(1))
+        self.assertEqual(checkpoint.summary()['failed'], 1)
+        checkpoint.close()
+
+    def test_retried_link_marked_done(self):
+        checkpoint = frontier.crawl_frontier(self.path)
+        checkpoint.add_page(1, links('la-la-land'))
+        checkpoint.finish_page(1, links('la-la-land'))
+        checkpoint.finish_page(1)
+        self.assertTrue(checkpoint.is_page_done(1))
+        self.assertEqual(checkpoint.summary()['done'], 1)
+        checkpoint.close()
+
+    def test_reset_pages(self):
+        checkpoint = frontier.crawl_frontier(self.path)
+        checkpoint.add_page(1, links('la-la-land'))
+        checkpoint.add_page(2, links('parasite-2019'))
+        checkpoint.finish_page(1)
+        checkpoint.finish_page(2)
+        checkpoint.reset_pages([1])
+        self.assertFalse(checkpoint.has_page(1))
+        self.assertTrue(checkpoint.is_page_done(2))
+        self.assertEqual(checkpoint.summary(), {'pages_done': 1, 'pending': 0, 'done': 1, 'failed': 0, 'skipped': 0})
+        checkpoint.close()
+
+    def test_finished_crawl_started_again(self):
+        from data_collection.scraper import scraper
+        server = fixture_server(n_films=24, films_per_page=12).start()
+        working_dir = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            films_scraped = []
+            for pages in ([1], [1, 2], [1, 2]):
+                lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=len(pages), base_url=server.base_url, database_url='sqlite:///film_data.db',
+                                       politeness_delay=0, metrics=True)
+                lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=False, csv=False, parquet=False)
+                checkpoint = frontier.crawl_frontier(self.path)
+                lbox_scraper.scrape_pages(pages, checkpoint)
+                checkpoint.close()
+                films_scraped.append(lbox_scraper.metrics.summary()['counters'].get('films_scraped_total', 0))
+                lbox_scraper.close()
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+        self.assertEqual(films_scraped, [12, 12, 24])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
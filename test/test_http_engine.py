@@ -0,0 +1,96 @@
+from data_collection import http_engine
+from data_collection import politeness
+from unittest import mock
+import numpy as np
+import os
+import requests
+import unittest
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name)) as fixture_file:
+        return fixture_file.read()
+
+class http_scraperTestCase(unittest.TestCase):
+    def setUp(self):
+        self.scrapetest = http_engine.http_scraper()
+        self.film_page = read_fixture('film_page.html')
+        self.stats_page = read_fixture('film_stats.html')
+
+    def tearDown(self):
+        self.scrapetest.session.close()
+
+    def test_parse_film_page(self):
+        film_data_dic = self.scrapetest.parse_film_page(self.film_page)
+        self.assertEqual(list(film_data_dic.keys()), http_engine.FILM_FIELDS)
+        self.assertEqual(film_data_dic['title'], 'La La Land')
+        self.assertEqual(film_data_dic['year'], '2016')
+        self.assertEqual(film_data_dic['runtime'], '128 mins')
+        self.assertEqual(film_data_dic['rating'], '4.1')
+        self.assertEqual(film_data_dic['watches'], '2,934,817')
+        self.assertEqual(film_data_dic['lists'], '481,295')
+        self.assertEqual(film_data_dic['likes'], '1,164,523')
+        self.assertEqual(film_data_dic['director'], 'Damien Chazelle')
+        self.assertEqual(film_data_dic['top_250_position'], '213')
+        self.assertTrue(film_data_dic['description'].startswith('Mia, an aspiring actress'))
+        self.assertTrue(film_data_dic['poster_link'].startswith('https://a.ltrbxd.com/resized/film-poster/'))
+        self.assertEqual(self.scrapetest.find_missing_fields(film_data_dic), [])
+
+    def test_missing_fields_are_reported(self):
+        page_html = self.film_page.replace('headline-1 js-widont prettify', 'headline-1').replace('twitter:data2', 'twitter:data3')
+        page_html = page_html.replace('tooltip display-rating', 'display-rating')
+        film_data_dic = self.scrapetest.parse_film_page(page_html)
+        self.assertEqual(self.scrapetest.find_missing_fields(film_data_dic), ['title', 'rating'])
+
+    def test_stats_fetched_from_fragment(self):
+        start = self.film_page.index('<ul class="film-stats">')
+        end = self.film_page.index('</ul>') + len('</ul>')
+        page_html = self.film_page[:start] + self.film_page[end:]
+        pages = {'https://letterboxd.com/film/la-la-land/': page_html,
+                 'https://letterboxd.com/csi/film/la-la-land/stats/': self.stats_page}
+        with mock.patch.object(self.scrapetest, 'fetch_page', side_effect=lambda url: pages[url]):
+            film_data_dic, missing_fields = self.scrapetest.scrape_film_entry('https://letterboxd.com/film/la-la-land/')
+        self.assertEqual(missing_fields, [])
+        self.assertEqual(film_data_dic['watches'], '2,934,817')
+        self.assertEqual(film_data_dic['top_250_position'], '213')
+
+    def test_stats_refreshed_from_fragments(self):
+        pages = {'https://letterboxd.com/csi/film/la-la-land/stats/': self.stats_page,
+                 'https://letterboxd.com/csi/film/la-la-land/rating-histogram/': read_fixture('film_rating_histogram.html')}
+        with mock.patch.object(self.scrapetest, 'fetch_page', side_effect=lambda url: pages[url]) as fetch_page:
+            stats_data_dic, missing_fields = self.scrapetest.scrape_film_stats('https://letterboxd.com/film/la-la-land/')
+        self.assertEqual(fetch_page.call_count, 2)
+        self.assertEqual(missing_fields, [])
+        self.assertEqual(stats_data_dic, {'rating': '4.1', 'watches': '2,934,817', 'lists': '481,295', 'likes': '1,164,523', 'top_250_position': '213'})
+
+    def test_no_top_250_position(self):
+        page_html = self.film_page.replace('has-icon icon-top250 icon-16 tooltip', 'has-icon icon-top250')
+        film_data_dic = self.scrapetest.parse_film_page(page_html)
+        self.assertTrue(np.isnan(film_data_dic['top_250_position']))
+
+    def test_parse_film_links(self):
+        link_list = self.scrapetest.parse_film_links(read_fixture('popular_page.html'))
+        self.assertEqual(link_list, ['https://letterboxd.com/film/la-la-land/',
+                                     'https://letterboxd.com/film/parasite-2019/',
+                                     'https://letterboxd.com/film/whiplash-2014/'])
+        self.assertEqual([link.split('/')[4] for link in link_list], ['la-la-land', 'parasite-2019', 'whiplash-2014'])
+
+    def test_throttled_requests_retried(self):
+        limiter = politeness.rate_limiter(rate=100)
+        scrapetest = http_engine.http_scraper(rate_limiter=limiter, retry_policy=politeness.retry_policy(max_attempts=3, base_delay=0))
+        responses = []
+        for status_code, text in [(503, ''), (429, ''), (200, self.film_page)]:
+            response = requests.Response()
+            response.status_code = status_code
+            response._content = text.encode()
+            response.encoding = 'utf-8'
+            responses.append(response)
+        with mock.patch.object(scrapetest.session, 'get', side_effect=responses) as get:
+            page_html = scrapetest.fetch_page('https://letterboxd.com/film/la-la-land/')
+        self.assertEqual(get.call_count, 3)
+        self.assertEqual(page_html, self.film_page)
+        self.assertLess(limiter.rate, 100)
+        scrapetest.session.close()
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,123 @@
+from benchmarks.fixture_server import fixture_server
+from data_collection import leases
+from sqlalchemy import create_engine, text
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+class fake_clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def claim_until_done(database_url: str, worker_id: str, results):
+    lease_table = leases.lease_table(create_engine(database_url, connect_args={'timeout': 30}), ttl=60)
+    while True:
+        claimed = lease_table.claim(worker_id, n=2)
+        if len(claimed) == 0:
+            return
+        for held_lease in claimed:
+            if lease_table.complete(held_lease):
+                results.put((worker_id, held_lease.key))
+
+def scrape_leased(database_url: str, base_url: str, worker_dir: str, worker_id: str, lease_links: bool):
+    from data_collection.scraper import scraper
+    os.chdir(worker_dir)
+    lease_table = leases.lease_table(create_engine(database_url, connect_args={'timeout': 30}), ttl=60)
+    lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=4, base_url=base_url, database_url=database_url, politeness_delay=0)
+    lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=True, csv=False, parquet=False)
+    lbox_scraper.run_leased(lease_table, worker_id, lease_links=lease_links, links_per_claim=3, poll_interval=0.1)
+    lbox_scraper.close()
+
+class lease_tableTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.database_url = f"sqlite:///{os.path.join(self.tmp_dir.name, 'leases.db')}"
+        self.clock = fake_clock()
+        self.lease_table = leases.lease_table(create_engine(self.database_url), ttl=60, max_attempts=2, clock=self.clock)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_page_ranges_claimed_in_order(self):
+        self.lease_table.add_page_ranges(1, 12, pages_per_item=5)
+        self.lease_table.add_page_ranges(1, 12, pages_per_item=5)
+        self.assertEqual(self.lease_table.summary(), {'pending': 3, 'leased': 0, 'done': 0, 'failed': 0})
+        claimed = self.lease_table.claim('worker-1', n=2)
+        self.assertEqual([leases.parse_page_range_key(held_lease.key) for held_lease in claimed], [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10]])
+        self.assertEqual([held_lease.key for held_lease in self.lease_table.claim('worker-2', n=2)], [leases.page_range_key(11, 12)])
+        self.assertEqual(self.lease_table.claim('worker-3'), [])
+
+    def test_expired_lease_handed_to_another_worker(self):
+        self.lease_table.add_items(['link:a'])
+        first_lease, = self.lease_table.claim('worker-1')
+        self.assertEqual(self.lease_table.claim('worker-2'), [])
+        self.clock.now += 61
+        second_lease, = self.lease_table.claim('worker-2')
+        self.assertFalse(self.lease_table.renew(first_lease))
+        self.assertTrue(first_lease.lost)
+        self.assertFalse(self.lease_table.complete(first_lease))
+        self.assertTrue(self.lease_table.complete(second_lease))
+        self.assertFalse(self.lease_table.complete(second_lease))
+        self.assertEqual(self.lease_table.summary()['done'], 1)
+
+    def test_renewed_lease_kept(self):
+        self.lease_table.add_items(['link:a'])
+        held_lease, = self.lease_table.claim('worker-1')
+        self.clock.now += 50
+        self.assertTrue(self.lease_table.renew(held_lease))
+        self.clock.now += 50
+        self.assertEqual(self.lease_table.claim('worker-2'), [])
+
+    def test_failed_after_max_attempts(self):
+        self.lease_table.add_items(['link:a'])
+        held_lease, = self.lease_table.claim('worker-1')
+        self.lease_table.release(held_lease, 'timed out')
+        self.clock.now += 1
+        held_lease, = self.lease_table.claim('worker-1')
+        self.clock.now += 61
+        self.assertEqual(self.lease_table.claim('worker-2'), [])
+        self.assertEqual(self.lease_table.summary()['failed'], 1)
+
+    def test_each_item_completed_once_across_processes(self):
+        self.lease_table.add_items([f'link:film-{index:03d}' for index in range(60)])
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        workers = [context.Process(target=claim_until_done, args=(self.database_url, f'worker-{index}', results)) for index in range(4)]
+        for worker in workers:
+            worker.start()
+        completed = [results.get(timeout=60) for _ in range(60)]
+        for worker in workers:
+            worker.join(timeout=60)
+        self.assertEqual(sorted(key for _, key in completed), [f'link:film-{index:03d}' for index in range(60)])
+        self.assertEqual(self.lease_table.summary(), {'pending': 0, 'leased': 0, 'done': 60, 'failed': 0})
+
+    def test_scrapers_share_a_crawl(self):
+        server = fixture_server(n_films=48, films_per_page=12).start()
+        context = multiprocessing.get_context('fork')
+        try:
+            for lease_links in (False, True):
+                database_url = f"sqlite:///{os.path.join(self.tmp_dir.name, f'film_data_{lease_links}.db')}"
+                lease_table = leases.lease_table(create_engine(database_url), ttl=60)
+                lease_table.add_page_ranges(1, 4, pages_per_item=1)
+                workers = []
+                for index in range(2):
+                    worker_dir = os.path.join(self.tmp_dir.name, f'worker-{lease_links}-{index}')
+                    os.makedirs(worker_dir)
+                    workers.append(context.Process(target=scrape_leased, args=(database_url, server.base_url, worker_dir, f'worker-{index}', lease_links)))
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join(timeout=120)
+                    self.assertEqual(worker.exitcode, 0)
+                summary = lease_table.summary()
+                self.assertEqual((summary['done'], summary['pending'], summary['leased'], summary['failed']), (52 if lease_links else 4, 0, 0, 0))
+                with create_engine(database_url).connect() as connection:
+                    self.assertEqual(connection.execute(text('SELECT COUNT(*), COUNT(DISTINCT friendly_id) FROM film_data')).fetchone(), (48, 48))
+        finally:
+            server.stop()
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,52 @@
+from data_collection import metrics
+from data_collection import pipeline
+import json
+import os
+import requests
+import tempfile
+import unittest
+
+class metrics_registryTestCase(unittest.TestCase):
+    def test_prometheus_text(self):
+        registry = metrics.metrics_registry(buckets=[0.1, 1])
+        registry.increment('films_scraped_total')
+        registry.increment('films_scraped_total', 2)
+        registry.observe('page_load_seconds', 0.05)
+        registry.observe('page_load_seconds', 0.5)
+        registry.observe('page_load_seconds', 5)
+        text = registry.render_prometheus()
+        self.assertIn('# TYPE letterboxd_films_scraped_total counter\nletterboxd_films_scraped_total 3\n', text)
+        self.assertIn('# TYPE letterboxd_page_load_seconds histogram\n', text)
+        self.assertIn('letterboxd_page_load_seconds_bucket{le="0.1"} 1\n', text)
+        self.assertIn('letterboxd_page_load_seconds_bucket{le="1"} 2\n', text)
+        self.assertIn('letterboxd_page_load_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('letterboxd_page_load_seconds_count 3\n', text)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = metrics.metrics_registry(enabled=False)
+        self.assertIs(registry.timer('page_load_seconds'), metrics.NULL_TIMER)
+        with registry.timer('page_load_seconds'):
+            registry.increment('films_scraped_total')
+        self.assertEqual(registry.summary(), {'counters': {}, 'timings': {}})
+        self.assertEqual(registry.render_prometheus(), '\n')
+
+    def test_summary_and_endpoint(self):
+        registry = metrics.metrics_registry()
+        stage_pipeline = pipeline.pipeline(metrics=registry)
+        stage_pipeline.add_stage('double', lambda item: item * 2).add_stage('collect', lambda item: None)
+        stage_pipeline.run(range(4))
+        registry.increment('timeouts_total', labels={'step': 'element_wait'})
+        port = registry.serve(0, '127.0.0.1')
+        response = requests.get(f'http://127.0.0.1:{port}/metrics', timeout=5)
+        registry.close()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('letterboxd_pipeline_stage_seconds_count{stage="double"} 4', response.text)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'metrics_summary.json')
+            registry.write_summary(path)
+            with open(path) as summary_file:
+                summary = json.load(summary_file)
+        self.assertEqual(summary['counters'], {'timeouts_total{step="element_wait"}': 1})
+        self.assertEqual(summary['timings']['pipeline_stage_seconds{stage="collect"}']['count'], 4)
+
+unittest.main(argv=[''], verbosity=1, exit=False)
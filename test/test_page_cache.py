@@ -0,0 +1,156 @@
+from benchmarks.fixture_server import fixture_server
+from data_collection import http_engine
+from data_collection import page_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+PAGE = '<html><body>' + 'film page ' * 1000 + '</body></html>'
+
+class page_handler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == '"page-etag"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = PAGE.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"page-etag"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class page_cacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp_dir.name, 'page_cache')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_ttl_depends_on_url_class(self):
+        cache = page_cache.page_cache(self.cache_dir, ttls={'list': 10, 'film': 1000})
+        now = time.time()
+        cache.put('https://letterboxd.com/films/popular/page/1/', PAGE)
+        cache.put('https://letterboxd.com/film/la-la-land/', PAGE)
+        with mock.patch('time.time', return_value=now + 100):
+            self.assertFalse(cache.get('https://letterboxd.com/films/popular/page/1/')['fresh'])
+            self.assertTrue(cache.get('https://letterboxd.com/film/la-la-land/')['fresh'])
+        self.assertIsNone(cache.get('https://letterboxd.com/film/parasite-2019/'))
+        self.assertEqual(cache.url_class('https://letterboxd.com/csi/film/la-la-land/stats/'), 'fragment')
+        cache.close()
+
+    def test_identical_pages_stored_once(self):
+        cache = page_cache.page_cache(self.cache_dir)
+        cache.put('https://letterboxd.com/film/la-la-land/', PAGE)
+        single_size = cache.total_bytes()
+        cache.put('https://letterboxd.com/film/la-la-land-2016/', PAGE)
+        self.assertEqual(cache.total_bytes(), single_size)
+        self.assertEqual(cache.get('https://letterboxd.com/film/la-la-land-2016/')['html'], PAGE)
+        cache.close()
+
+    def test_least_recently_used_evicted(self):
+        cache = page_cache.page_cache(self.cache_dir)
+        cache.put('https://letterboxd.com/film/a/', PAGE + 'a')
+        cache.max_bytes = cache.total_bytes() * 2 + 1
+        cache.put('https://letterboxd.com/film/b/', PAGE + 'b')
+        cache.get('https://letterboxd.com/film/a/')
+        cache.put('https://letterboxd.com/film/c/', PAGE + 'c')
+        self.assertEqual(cache.urls(), ['https://letterboxd.com/film/a/', 'https://letterboxd.com/film/c/'])
+        self.assertLessEqual(cache.total_bytes(), cache.max_bytes)
+        cache.close()
+
+    def test_replay_mode_never_uses_network(self):
+        cache = page_cache.page_cache(self.cache_dir, ttls={'film': 0})
+        cache.put('https://letterboxd.com/film/la-la-land/', PAGE)
+        cache.close()
+        cache = page_cache.page_cache(self.cache_dir, replay=True)
+        scraper = http_engine.http_scraper(cache=cache)
+        with mock.patch.object(scraper.session, 'get') as get:
+            self.assertEqual(scraper.fetch_page('https://letterboxd.com/film/la-la-land/'), PAGE)
+            with self.assertRaises(page_cache.page_not_cached):
+                scraper.fetch_page('https://letterboxd.com/film/parasite-2019/')
+        get.assert_not_called()
+        scraper.session.close()
+        cache.close()
+
+    def test_replay_with_partial_cache_skips_missing_pages(self):
+        from data_collection.scraper import scraper
+        server = fixture_server(n_films=24, films_per_page=12).start()
+        working_dir = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=1, base_url=server.base_url, database_url='sqlite:///film_data.db',
+                                   politeness_delay=0, page_cache_dir='full_cache')
+            lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=False, csv=False, parquet=False)
+            lbox_scraper.scrape_pages([1])
+            lbox_scraper.close()
+            # Only the first page and its first film are copied to the cache that is replayed.
+            full_cache = page_cache.page_cache('full_cache')
+            partial_cache = page_cache.page_cache('partial_cache')
+            for url in full_cache.urls():
+                if url.endswith('/page/1/') or 'benchmark-film-0/' in url:
+                    partial_cache.put(url, full_cache.get(url)['html'])
+            full_cache.close()
+            partial_cache.close()
+            for workers in (1, 4):
+                with mock.patch('requests.Session.get') as get:
+                    lbox_scraper = scraper(scrape_engine='http', workers=workers, start_page=1, pages=2, base_url=server.base_url,
+                                           database_url='sqlite:///film_data.db', politeness_delay=0, page_cache_dir='partial_cache', page_cache_replay=True)
+                    lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=False, csv=True, parquet=False)
+                    lbox_scraper.csv_sink.output_path = f'film_data_{workers}.csv'
+                    lbox_scraper.scrape_pages([1, 2])
+                    lbox_scraper.close()
+                get.assert_not_called()
+                with open(f'film_data_{workers}.csv') as csv_file:
+                    self.assertEqual(len(csv_file.readlines()), 2)
+                dead_letters = {(entry['stage'], entry['link'].split('/')[-2]) for entry in lbox_scraper.dead_letters}
+                self.assertIn(('discovery', '2'), dead_letters)
+                self.assertEqual(len(dead_letters), 12)
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+
+    def test_replay_with_missing_fragment_fails_film(self):
+        # The cached film page has no stats, and the fragments they are loaded from were never cached.
+        cache = page_cache.page_cache(self.cache_dir)
+        cache.put('https://letterboxd.com/film/la-la-land/', PAGE)
+        cache.close()
+        cache = page_cache.page_cache(self.cache_dir, replay=True)
+        scraper = http_engine.http_scraper(cache=cache)
+        with mock.patch.object(scraper.session, 'get') as get:
+            with self.assertRaises(page_cache.page_not_cached):
+                scraper.scrape_film_entry('https://letterboxd.com/film/la-la-land/')
+            with self.assertRaises(page_cache.page_not_cached):
+                scraper.scrape_film_stats('https://letterboxd.com/film/la-la-land/')
+        get.assert_not_called()
+        scraper.session.close()
+        cache.close()
+
+    def test_stale_page_revalidated(self):
+        page_handler.requests_seen = []
+        server = ThreadingHTTPServer(('127.0.0.1', 0), page_handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/film/la-la-land/'
+        cache = page_cache.page_cache(self.cache_dir, ttls={'film': 0})
+        scraper = http_engine.http_scraper(cache=cache)
+        self.assertEqual(scraper.fetch_page(url), PAGE)
+        self.assertEqual(scraper.fetch_page(url), PAGE)
+        server.shutdown()
+        server.server_close()
+        scraper.session.close()
+        cache.close()
+        self.assertEqual(page_handler.requests_seen, [('/film/la-la-land/', None), ('/film/la-la-land/', '"page-etag"')])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
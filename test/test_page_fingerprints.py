@@ -0,0 +1,102 @@
+from benchmarks.fixture_server import fixture_server
+from data_collection import page_fingerprints
+import json
+import os
+import tempfile
+import unittest
+
+def links(*friendly_ids) -> list:
+    return [f'https://letterboxd.com/film/{friendly_id}/' for friendly_id in friendly_ids]
+
+class page_fingerprint_storeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'page_fingerprints.sqlite')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_unchanged_page_skipped_once_complete(self):
+        store = page_fingerprints.page_fingerprint_store(self.path, films_per_page=2)
+        self.assertFalse(store.record_page(1, links('parasite-2019', 'la-la-land')))
+        store.finish_page(1, links('la-la-land'))
+        store.close()
+        store = page_fingerprints.page_fingerprint_store(self.path, films_per_page=2)
+        self.assertFalse(store.record_page(1, links('parasite-2019', 'la-la-land')))
+        store.finish_page(1, links('joker-2019'))
+        self.assertTrue(store.record_page(1, links('parasite-2019', 'la-la-land')))
+        self.assertFalse(store.record_page(1, links('la-la-land', 'parasite-2019')))
+        self.assertEqual(store.summary()['pages_unchanged'], 2)
+        store.close()
+
+    def test_rank_changes_across_pages(self):
+        store = page_fingerprints.page_fingerprint_store(self.path, films_per_page=2)
+        store.record_page(1, links('parasite-2019', 'la-la-land'))
+        store.record_page(2, links('joker-2019', 'whiplash-2014'))
+        self.assertEqual(store.summary(), {'pages_unchanged': 0, 'pages_changed': 2, 'new': 4, 'moved': 0, 'dropped': 0})
+        store.close()
+        store = page_fingerprints.page_fingerprint_store(self.path, films_per_page=2)
+        store.record_page(1, links('joker-2019', 'parasite-2019'))
+        store.record_page(2, links('la-la-land', 'barbie'))
+        self.assertEqual(store.rank_changes(), [{'friendly_id': 'joker-2019', 'change': 'moved', 'previous_rank': 3, 'rank': 1},
+                                                {'friendly_id': 'parasite-2019', 'change': 'moved', 'previous_rank': 1, 'rank': 2},
+                                                {'friendly_id': 'la-la-land', 'change': 'moved', 'previous_rank': 2, 'rank': 3},
+                                                {'friendly_id': 'barbie', 'change': 'new', 'previous_rank': None, 'rank': 4},
+                                                {'friendly_id': 'whiplash-2014', 'change': 'dropped', 'previous_rank': 4, 'rank': None}])
+        self.assertEqual(store.get_rank('joker-2019'), 1)
+        self.assertIsNone(store.get_rank('whiplash-2014'))
+        report_path = os.path.join(self.tmp_dir.name, 'rank_changes.jsonl')
+        store.write_rank_report(report_path)
+        with open(report_path) as report_file:
+            entries = [json.loads(line) for line in report_file]
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries[0]['run_id'], store.run_id)
+        store.close()
+
+    def test_second_crawl_skips_unchanged_pages(self):
+        from data_collection.scraper import scraper
+        server = fixture_server(n_films=24, films_per_page=12).start()
+        working_dir = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            films_scraped = []
+            for _ in range(2):
+                lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=2, base_url=server.base_url, database_url='sqlite:///film_data.db',
+                                       politeness_delay=0, metrics=True, page_fingerprint_path=self.path, films_per_page=12)
+                lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=False, csv=True, parquet=False)
+                lbox_scraper.scrape_pages([1, 2])
+                films_scraped.append(lbox_scraper.metrics.summary()['counters'].get('films_scraped_total', 0))
+                summary = lbox_scraper.page_fingerprints.summary()
+                lbox_scraper.close()
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+        self.assertEqual(films_scraped, [24, 0])
+        self.assertEqual(summary, {'pages_unchanged': 2, 'pages_changed': 0, 'new': 0, 'moved': 0, 'dropped': 0})
+
+    def test_page_stored_before_marked_complete(self):
+        from data_collection.scraper import scraper
+        server = fixture_server(n_films=12, films_per_page=12).start()
+        working_dir = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+        try:
+            lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=1, base_url=server.base_url, database_url='sqlite:///film_data.db',
+                                   politeness_delay=0, page_fingerprint_path=self.path, films_per_page=12)
+            lbox_scraper.set_data_storage_options(s3_storage=False, keep_raw_data=True, rds=False, csv=True, parquet=False)
+            rows_stored = []
+            finish_page = lbox_scraper.page_fingerprints.finish_page
+
+            def record_rows_stored(page: int, failed_links: list = ()):
+                with open('film_data.csv') as csv_file:
+                    rows_stored.append(len(csv_file.readlines()) - 1)
+                finish_page(page, failed_links)
+
+            lbox_scraper.page_fingerprints.finish_page = record_rows_stored
+            lbox_scraper.scrape_pages([1])
+            lbox_scraper.close()
+        finally:
+            os.chdir(working_dir)
+            server.stop()
+        self.assertEqual(rows_stored, [12])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
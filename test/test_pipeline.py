@@ -0,0 +1,69 @@
+from data_collection import pipeline
+import threading
+import time
+import unittest
+
+class pipelineTestCase(unittest.TestCase):
+    def test_items_pass_through_every_stage(self):
+        stored = []
+        film_pipeline = pipeline.pipeline()
+        film_pipeline.add_stage('discovery', lambda page: [f'page-{page}-film-{i}' for i in range(3)], fan_out=True)
+        film_pipeline.add_stage('fetch', str.upper, workers=4)
+        film_pipeline.add_stage('storage', stored.append)
+        film_pipeline.run(range(5))
+        self.assertEqual(len(stored), 15)
+        self.assertEqual(film_pipeline.summary()['fetch'], {'processed': 15, 'failed': 0})
+        self.assertEqual(film_pipeline.queue_depths(), {'discovery': 0, 'fetch': 0, 'storage': 0})
+
+    def test_failed_and_dropped_items(self):
+        stored = []
+        def extract(item):
+            if item == 3:
+                raise ValueError('broken page')
+            return None if item % 2 else item
+        film_pipeline = pipeline.pipeline()
+        film_pipeline.add_stage('extraction', extract, workers=2)
+        film_pipeline.add_stage('storage', stored.append)
+        film_pipeline.run(range(6))
+        self.assertEqual(sorted(stored), [0, 2, 4])
+        self.assertEqual(film_pipeline.summary()['extraction'], {'processed': 5, 'failed': 1})
+        self.assertEqual([(stage, item) for stage, item, _ in film_pipeline.errors], [('extraction', 3)])
+
+    def test_batched_stage(self):
+        batches = []
+        def clean(items):
+            batches.append(len(items))
+            return [item * 10 for item in items]
+        stored = []
+        film_pipeline = pipeline.pipeline()
+        film_pipeline.add_stage('extraction', lambda item: item)
+        film_pipeline.add_stage('cleaning', clean, batch_size=4)
+        film_pipeline.add_stage('storage', stored.append)
+        film_pipeline.run(range(10))
+        self.assertEqual(sorted(stored), [item * 10 for item in range(10)])
+        self.assertEqual(sum(batches), 10)
+        self.assertLessEqual(max(batches), 4)
+        self.assertEqual(film_pipeline.summary()['cleaning'], {'processed': 10, 'failed': 0})
+
+    def test_slow_sink_applies_backpressure(self):
+        release_sink = threading.Event()
+        fetched = []
+        def fetch(item):
+            fetched.append(item)
+            return item
+        film_pipeline = pipeline.pipeline()
+        film_pipeline.add_stage('fetch', fetch, queue_size=2)
+        film_pipeline.add_stage('storage', lambda item: release_sink.wait(), queue_size=2)
+        film_pipeline.start()
+        feeder = threading.Thread(target=lambda: [film_pipeline.put(i) for i in range(20)])
+        feeder.start()
+        time.sleep(0.3)
+        self.assertLessEqual(len(fetched), 5)
+        self.assertEqual(film_pipeline.queue_depths(), {'fetch': 2, 'storage': 2})
+        release_sink.set()
+        feeder.join()
+        film_pipeline.close()
+        self.assertEqual(len(fetched), 20)
+        self.assertEqual(film_pipeline.summary()['storage']['processed'], 20)
+
+unittest.main(argv=[''], verbosity=1, exit=False)
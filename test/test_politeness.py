@@ -0,0 +1,77 @@
+from data_collection import politeness
+from unittest import mock
+import json
+import os
+import requests
+import tempfile
+import time
+import unittest
+
+def http_error(status_code: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(response=response)
+
+class rate_limiterTestCase(unittest.TestCase):
+    def test_requests_spaced_out(self):
+        limiter = politeness.rate_limiter(rate=50)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_rate_adjusted(self):
+        limiter = politeness.rate_limiter(rate=1, min_rate=0.2, max_rate=2, increase=0.25, latency_target=1)
+        for _ in range(10):
+            limiter.record(0.1)
+        self.assertEqual(limiter.rate, 2)
+        limiter.record(0.1, throttled=True)
+        self.assertEqual(limiter.rate, 1)
+        # A second slow response straight after a decrease belongs to the old rate and is ignored.
+        limiter.record(5)
+        self.assertEqual(limiter.rate, 1)
+
+    def test_disabled_limiter(self):
+        limiter = politeness.rate_limiter(rate=0)
+        limiter.record(10, throttled=True, retry_after=60)
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertLess(time.monotonic() - started, 0.05)
+
+class retry_policyTestCase(unittest.TestCase):
+    def test_retryable_errors_retried(self):
+        policy = politeness.retry_policy(max_attempts=3, base_delay=0)
+        function = mock.Mock(side_effect=[requests.ConnectionError(), http_error(503), 'page'])
+        self.assertEqual(policy.call(function, 'url'), 'page')
+        self.assertEqual(function.call_count, 3)
+
+    def test_attempts_limited(self):
+        policy = politeness.retry_policy(max_attempts=2, base_delay=0)
+        function = mock.Mock(side_effect=http_error(429))
+        with self.assertRaises(requests.HTTPError):
+            policy.call(function)
+        self.assertEqual(function.call_count, 2)
+        function = mock.Mock(side_effect=http_error(404))
+        with self.assertRaises(requests.HTTPError):
+            policy.call(function)
+        self.assertEqual(function.call_count, 1)
+
+    def test_backoff_capped(self):
+        policy = politeness.retry_policy(base_delay=1, max_delay=4)
+        self.assertTrue(all(0 <= policy.backoff(attempt) <= 4 for attempt in range(1, 10)))
+
+class dead_letter_listTestCase(unittest.TestCase):
+    def test_dead_letters_written(self):
+        dead_letters = politeness.dead_letter_list()
+        dead_letters.add('https://letterboxd.com/film/la-la-land/', http_error(503))
+        dead_letters.add('https://letterboxd.com/film/whiplash-2014/', 'timed out', 'refresh')
+        self.assertEqual(len(dead_letters), 2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'dead_letters.jsonl')
+            dead_letters.write(path)
+            with open(path) as dead_letter_file:
+                entries = [json.loads(line) for line in dead_letter_file]
+        self.assertEqual([entry['link'] for entry in entries], dead_letters.links())
+        self.assertEqual(entries[1]['stage'], 'refresh')
+
+unittest.main(argv=[''], verbosity=1, exit=False)
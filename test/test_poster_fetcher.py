@@ -0,0 +1,92 @@
+from data_collection import poster_fetcher
+from data_collection import raw_archive
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import tempfile
+import threading
+import unittest
+
+POSTER = b'\xff\xd8\xff' + b'poster' * 50000
+
+class poster_handler(BaseHTTPRequestHandler):
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == '"poster-etag"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(POSTER)))
+        self.send_header('ETag', '"poster-etag"')
+        self.end_headers()
+        self.wfile.write(POSTER)
+
+    def log_message(self, format, *args):
+        pass
+
+class poster_fetcherTestCase(unittest.TestCase):
+    def setUp(self):
+        poster_handler.requests_seen = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), poster_handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.validators_path = os.path.join(self.tmp_dir.name, 'poster_validators.json')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp_dir.cleanup()
+
+    def poster_path(self, friendly_id: str) -> str:
+        return os.path.join(self.tmp_dir.name, friendly_id, 'images', f'{friendly_id}_poster.jpg')
+
+    def test_poster_streamed_to_disk(self):
+        fetcher = poster_fetcher.poster_fetcher(chunk_size=1024, validators_path=self.validators_path)
+        status = fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg?v=abc', self.poster_path('testfilm'))
+        fetcher.close()
+        self.assertEqual(status, 'downloaded')
+        with open(self.poster_path('testfilm'), 'rb') as image_file:
+            self.assertEqual(image_file.read(), POSTER)
+        self.assertEqual(fetcher.bytes_downloaded, len(POSTER))
+
+    def test_unchanged_version_skipped_across_runs(self):
+        fetcher = poster_fetcher.poster_fetcher(validators_path=self.validators_path)
+        fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg?v=abc', self.poster_path('testfilm'))
+        fetcher.close()
+        fetcher = poster_fetcher.poster_fetcher(validators_path=self.validators_path)
+        self.assertEqual(fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg?v=abc', self.poster_path('testfilm')), 'skipped')
+        self.assertEqual(fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg?v=def', self.poster_path('testfilm')), 'downloaded')
+        fetcher.close()
+        self.assertEqual(len(poster_handler.requests_seen), 2)
+
+    def test_conditional_request_with_etag(self):
+        fetcher = poster_fetcher.poster_fetcher(validators_path=self.validators_path)
+        fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg', self.poster_path('testfilm'))
+        self.assertEqual(fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg', self.poster_path('testfilm')), 'not_modified')
+        fetcher.close()
+        self.assertEqual(poster_handler.requests_seen[1], ('/poster.jpg', '"poster-etag"'))
+
+    def test_concurrent_downloads_call_on_fetched(self):
+        fetcher = poster_fetcher.poster_fetcher(max_in_flight=4, validators_path=self.validators_path)
+        fetched = []
+        for i in range(10):
+            fetcher.submit(f'testfilm-{i}', f'{self.base_url}/poster-{i}.jpg?v=1', self.poster_path(f'testfilm-{i}'), fetched.append)
+        fetcher.wait()
+        self.assertEqual(fetched, ['downloaded'] * 10)
+        self.assertTrue(all(os.path.exists(self.poster_path(f'testfilm-{i}')) for i in range(10)))
+        fetcher.close()
+
+    def test_poster_stored_in_archive(self):
+        archive = raw_archive.raw_archive(os.path.join(self.tmp_dir.name, 'raw_data_archive'))
+        fetcher = poster_fetcher.poster_fetcher(validators_path=self.validators_path, archive=archive)
+        self.assertEqual(fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg?v=abc', None), 'downloaded')
+        self.assertEqual(fetcher.fetch('testfilm', f'{self.base_url}/poster.jpg?v=abc', None), 'skipped')
+        fetcher.close()
+        self.assertEqual(archive.get_poster('testfilm'), POSTER)
+        archive.close()
+
+unittest.main(argv=[''], verbosity=1, exit=False)
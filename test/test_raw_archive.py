@@ -0,0 +1,74 @@
+from data_collection import raw_archive
+import os
+import tempfile
+import unittest
+
+class raw_archiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = os.path.join(self.tmp_dir.name, 'raw_data_archive')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_records_and_posters_read_back(self):
+        archive = raw_archive.raw_archive(self.root_dir)
+        archive.put_record({'friendly_id': 'la-la-land', 'title': 'La La Land'})
+        archive.put_poster('la-la-land', b'\xff\xd8poster')
+        archive.put_record({'friendly_id': 'la-la-land', 'title': 'La La Land (2016)'})
+        self.assertEqual(archive.get_record('la-la-land'), {'friendly_id': 'la-la-land', 'title': 'La La Land (2016)'})
+        self.assertEqual(archive.get_poster('la-la-land'), b'\xff\xd8poster')
+        self.assertIsNone(archive.get_record('whiplash'))
+        self.assertFalse(archive.has_poster('whiplash'))
+        archive.close()
+
+    def test_segments_sealed_at_size_limit(self):
+        sealed = []
+        archive = raw_archive.raw_archive(self.root_dir, segment_bytes=100, on_sealed=lambda segment, paths: sealed.append((segment, paths)))
+        for index in range(3):
+            archive.put_poster(f'film-{index}', bytes(60))
+        self.assertEqual([segment for segment, paths in sealed], [0, 1])
+        self.assertEqual(os.path.getsize(sealed[0][1]['posters']), 60)
+        self.assertEqual(os.path.getsize(sealed[0][1]['index']), raw_archive.INDEX_ENTRY.size)
+        self.assertEqual(archive.get_poster('film-0'), bytes(60))
+        archive.close()
+        self.assertEqual(archive.sealed_segments(), [0, 1, 2])
+
+    def test_reopened_archive_seals_unfinished_segment(self):
+        archive = raw_archive.raw_archive(self.root_dir)
+        archive.put_record({'friendly_id': 'la-la-land'})
+        # The archive is not closed, as if the run had stopped.
+        sealed = []
+        reopened = raw_archive.raw_archive(self.root_dir, on_sealed=lambda segment, paths: sealed.append(segment))
+        self.assertEqual(sealed, [0])
+        self.assertEqual(reopened.get_record('la-la-land'), {'friendly_id': 'la-la-land'})
+        reopened.put_record({'friendly_id': 'whiplash'})
+        reopened.close()
+        self.assertEqual(reopened.sealed_segments(), [0, 1])
+
+    def test_leftover_segments_sealed_when_asked(self):
+        archive = raw_archive.raw_archive(self.root_dir)
+        archive.put_record({'friendly_id': 'la-la-land'})
+        sealed = []
+        reopened = raw_archive.raw_archive(self.root_dir, on_sealed=lambda segment, paths: sealed.append(segment), seal_leftovers=False)
+        reopened.put_record({'friendly_id': 'whiplash'})
+        self.assertEqual((sealed, reopened.sealed_segments()), ([], []))
+        reopened.seal_leftovers()
+        reopened.seal_leftovers()
+        self.assertEqual(sealed, [0])
+        reopened.close()
+        self.assertEqual(sealed, [0, 1])
+
+    def test_removed_segment_forgotten(self):
+        archive = raw_archive.raw_archive(self.root_dir)
+        archive.put_record({'friendly_id': 'la-la-land'})
+        archive.seal()
+        self.assertEqual(archive.get_record('la-la-land'), {'friendly_id': 'la-la-land'})
+        archive.remove_segment(0)
+        self.assertIsNone(archive.get_record('la-la-land'))
+        self.assertEqual(os.listdir(self.root_dir), [])
+        with self.assertRaises(ValueError):
+            archive.remove_segment(0)
+        archive.close()
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,137 @@
+from data_collection import rds_writer
+from datetime import datetime
+from sqlalchemy import create_engine
+import numpy as np
+import os
+import pandas as pd
+import tempfile
+import time
+import unittest
+
+def film_data(friendly_id: str, watches: int = 10000000, top_250_position=1) -> dict:
+    return {"friendly_id": friendly_id,
+            "uuid": "1234-5678-9012-3456",
+            "title": "Test Film",
+            "year": 1998,
+            "runtime": 420,
+            "rating": 5.0,
+            "watches": watches,
+            "lists": 999999,
+            "likes": 3141592,
+            "director": "Fintan Smyth",
+            "top_250_position": top_250_position,
+            "description": 'Test description',
+            "poster_link": "https://a.ltrbxd.com/resized/film-poster/2/4/0/3/4/4/240344-la-la-land-0-500-0-750-crop.jpg?v=053670ff84",
+            "data_obtained_time": datetime.now()}
+
+class rds_writerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'film_data.db')}")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def read_table(self) -> pd.DataFrame:
+        return pd.read_sql_table('film_data', self.engine)
+
+    def test_rows_flushed_in_batches(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=3, flush_interval=60)
+        writer.write(film_data('testfilm-1'))
+        writer.write(film_data('testfilm-2'))
+        self.assertEqual(writer.rows_written, 0)
+        writer.write(film_data('testfilm-3'))
+        self.assertEqual(writer.rows_written, 3)
+        writer.write(film_data('testfilm-4', top_250_position=np.nan))
+        writer.close()
+        film_data_df = self.read_table()
+        self.assertEqual(list(film_data_df['friendly_id']), ['testfilm-1', 'testfilm-2', 'testfilm-3', 'testfilm-4'])
+        self.assertTrue(pd.isna(film_data_df['top_250_position'].iloc[3]))
+
+    def test_flush_interval(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=100, flush_interval=0.05)
+        writer.write(film_data('testfilm'))
+        time.sleep(0.5)
+        self.assertEqual(writer.rows_written, 1)
+        self.assertEqual(len(self.read_table()), 1)
+        writer.close()
+
+    def test_flush_interval_survives_failed_flush(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=100, flush_interval=0.05)
+        write_rows = writer._rds_writer__write_rows
+        failures = [ConnectionError('connection dropped')]
+
+        def failing_write_rows(rows: list):
+            if len(failures) > 0:
+                raise failures.pop()
+            write_rows(rows)
+
+        writer._rds_writer__write_rows = failing_write_rows
+        writer.write(film_data('testfilm'))
+        time.sleep(0.5)
+        self.assertEqual(failures, [])
+        self.assertEqual(writer.rows_written, 1)
+        self.assertEqual(len(self.read_table()), 1)
+        writer.close()
+
+    def test_write_batch_not_buffered(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=100, flush_interval=60)
+        writer.write_batch([film_data('testfilm-1'), film_data('testfilm-2')])
+        self.assertEqual(writer.rows_written, 2)
+        self.assertEqual(list(self.read_table()['friendly_id']), ['testfilm-1', 'testfilm-2'])
+        writer.close()
+        self.assertEqual(len(self.read_table()), 2)
+
+    def test_upsert_updates_existing_rows(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=10, upsert=True)
+        writer.write(film_data('testfilm', watches=1))
+        writer.write(film_data('otherfilm', watches=1))
+        writer.flush()
+        writer.write(film_data('testfilm', watches=2))
+        writer.write(film_data('testfilm', watches=3))
+        writer.close()
+        film_data_df = self.read_table().set_index('friendly_id')
+        self.assertEqual(len(film_data_df), 2)
+        self.assertEqual(film_data_df.loc['testfilm', 'watches'], 3)
+
+    def test_upsert_removes_existing_duplicates(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=10)
+        latest = film_data('testfilm', watches=2)
+        latest['data_obtained_time'] = '2022-11-02 10:00:00'
+        earlier = film_data('testfilm', watches=1)
+        earlier['data_obtained_time'] = '2022-11-01 10:00:00'
+        writer.write(latest)
+        writer.write(earlier)
+        writer.write(film_data('otherfilm'))
+        writer.close()
+        writer = rds_writer.rds_writer(self.engine, batch_size=10, upsert=True)
+        writer.write(film_data('newfilm'))
+        writer.close()
+        film_data_df = self.read_table().set_index('friendly_id')
+        self.assertEqual(sorted(film_data_df.index), ['newfilm', 'otherfilm', 'testfilm'])
+        self.assertEqual(film_data_df.loc['testfilm', 'watches'], 2)
+
+    def test_append_mode_keeps_duplicates(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=10)
+        writer.write(film_data('testfilm'))
+        writer.write(film_data('testfilm'))
+        writer.close()
+        self.assertEqual(len(self.read_table()), 2)
+
+    def test_update_columns_only_change_stats(self):
+        writer = rds_writer.rds_writer(self.engine, batch_size=10)
+        writer.write(film_data('testfilm', watches=1))
+        writer.write(film_data('otherfilm', watches=1))
+        writer.close()
+        stats_writer = rds_writer.rds_writer(self.engine, batch_size=10, update_columns=['watches', 'data_obtained_time'])
+        stats_writer.write({'friendly_id': 'testfilm', 'watches': 5, 'data_obtained_time': datetime(2023, 1, 1)})
+        stats_writer.close()
+        film_data_df = self.read_table().set_index('friendly_id')
+        self.assertEqual(len(film_data_df), 2)
+        self.assertEqual(film_data_df.loc['testfilm', 'watches'], 5)
+        self.assertEqual(film_data_df.loc['testfilm', 'data_obtained_time'], '2023-01-01 00:00:00')
+        self.assertEqual(film_data_df.loc['testfilm', 'description'], 'Test description')
+        self.assertEqual(film_data_df.loc['otherfilm', 'watches'], 1)
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,45 @@
+from data_collection import rds_writer
+from data_collection import refresh
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+import os
+import tempfile
+import unittest
+
+NOW = datetime(2023, 1, 31)
+
+def film_data(friendly_id: str, watches: int, days_old: float) -> dict:
+    return {'friendly_id': friendly_id, 'watches': watches, 'data_obtained_time': NOW - timedelta(days=days_old)}
+
+class refresh_schedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmp_dir.name, 'film_data.db')}")
+        writer = rds_writer.rds_writer(self.engine, batch_size=10)
+        writer.write(film_data('blockbuster', 3000000, 10))
+        writer.write(film_data('cult-classic', 50000, 10))
+        writer.write(film_data('obscure', 200, 12))
+        writer.write(film_data('fresh-blockbuster', 4000000, 0.5))
+        # An older duplicate row must not make a recently refreshed film look stale.
+        writer.write(film_data('fresh-blockbuster', 4000000, 60))
+        writer.close()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_stale_popular_films_first(self):
+        scheduler = refresh.refresh_scheduler(self.engine, budget=10)
+        self.assertEqual(scheduler.schedule(now=NOW.timestamp()), ['blockbuster', 'obscure', 'cult-classic'])
+
+    def test_budget_limits_films_per_run(self):
+        scheduler = refresh.refresh_scheduler(self.engine, budget=1)
+        self.assertEqual(scheduler.schedule(now=NOW.timestamp()), ['blockbuster'])
+
+    def test_recently_refreshed_films_skipped(self):
+        scheduler = refresh.refresh_scheduler(self.engine, budget=10, min_age=0)
+        self.assertIn('fresh-blockbuster', scheduler.schedule(now=NOW.timestamp()))
+        scheduler = refresh.refresh_scheduler(self.engine, budget=10, min_age=11 * 24 * 60 * 60)
+        self.assertEqual(scheduler.schedule(now=NOW.timestamp()), ['obscure'])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
@@ -0,0 +1,106 @@
+from benchmarks.fixture_server import fixture_server
+from data_collection import s3_sink
+from moto import mock_s3
+from unittest import mock
+import boto3
+import json
+import os
+import tempfile
+import unittest
+
+@mock_s3
+class s3_sinkTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+        self.client = boto3.client('s3', region_name='eu-west-2')
+        self.client.create_bucket(Bucket='letterboxd-data-bucket', CreateBucketConfiguration={'LocationConstraint': 'eu-west-2'})
+        self.film_data_dic = {'friendly_id': 'testfilm', 'title': 'Test Film', 'data_obtained_time': '2022-11-01 10:00:00'}
+
+    def list_keys(self) -> list:
+        return sorted(obj['Key'] for obj in self.client.list_objects_v2(Bucket='letterboxd-data-bucket').get('Contents', []))
+
+    def test_film_uploaded_from_memory(self):
+        sink = s3_sink.s3_sink(client=self.client)
+        sink.upload_film(self.film_data_dic, b'poster bytes')
+        sink.close()
+        self.assertEqual(self.list_keys(), ['raw_data/testfilm/data.json', 'raw_data/testfilm/images/testfilm_poster.jpg'])
+        body = self.client.get_object(Bucket='letterboxd-data-bucket', Key='raw_data/testfilm/data.json')['Body'].read()
+        self.assertEqual(json.loads(body), self.film_data_dic)
+
+    def test_records_batched_with_manifest(self):
+        sink = s3_sink.s3_sink(client=self.client, batch_records=True)
+        for i in range(3):
+            sink.upload_film({'friendly_id': f'testfilm-{i}', 'title': f'Test Film {i}'})
+        sink.flush_batch('popular_page_1')
+        sink.close()
+        prefix = f'raw_data/batches/{sink.run_id}'
+        self.assertEqual(self.list_keys(), [f'{prefix}/popular_page_1.jsonl', f'{prefix}/popular_page_1.manifest.json'])
+        body = self.client.get_object(Bucket='letterboxd-data-bucket', Key=f'{prefix}/popular_page_1.jsonl')['Body'].read()
+        manifest = json.loads(self.client.get_object(Bucket='letterboxd-data-bucket', Key=f'{prefix}/popular_page_1.manifest.json')['Body'].read())
+        self.assertEqual(manifest['key'], f'{prefix}/popular_page_1.jsonl')
+        self.assertEqual(manifest['records'], 3)
+        entry = manifest['entries'][2]
+        self.assertEqual(json.loads(body[entry['offset']:entry['offset'] + entry['length']])['friendly_id'], 'testfilm-2')
+
+    def test_batches_of_later_runs_kept(self):
+        for _ in range(2):
+            sink = s3_sink.s3_sink(client=self.client, batch_records=True)
+            sink.upload_film(self.film_data_dic)
+            sink.close('popular_page_1')
+        self.assertEqual(len([key for key in self.list_keys() if key.endswith('/popular_page_1.jsonl')]), 2)
+
+    def test_records_uploaded_apart_from_held_batch(self):
+        sink = s3_sink.s3_sink(client=self.client, batch_records=True)
+        sink.upload_film({'friendly_id': 'held-film'})
+        self.assertEqual(sink.upload_records([{'friendly_id': 'spooled-film'}], 'spool_1'), [])
+        sink.flush_batch('popular_page_1')
+        sink.close()
+        prefix = f'raw_data/batches/{sink.run_id}'
+        for batch_name, friendly_id in [('spool_1', 'spooled-film'), ('popular_page_1', 'held-film')]:
+            body = self.client.get_object(Bucket='letterboxd-data-bucket', Key=f'{prefix}/{batch_name}.jsonl')['Body'].read()
+            self.assertEqual([json.loads(line)['friendly_id'] for line in body.splitlines()], [friendly_id])
+        sink = s3_sink.s3_sink(bucket='missing-bucket', client=self.client)
+        self.assertEqual(sink.upload_records([{'friendly_id': 'testfilm'}], 'spool_2'), ['raw_data/testfilm/data.json'])
+        sink.close()
+
+    def test_failed_uploads_recorded(self):
+        sink = s3_sink.s3_sink(bucket='missing-bucket', client=self.client)
+        sink.upload_film(self.film_data_dic)
+        sink.close()
+        self.assertEqual(sink.failed_keys, ['raw_data/testfilm/data.json'])
+
+@mock_s3
+class scraper_s3_storageTestCase(unittest.TestCase):
+    def setUp(self):
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-2')
+        boto3.client('s3', region_name='eu-west-2').create_bucket(Bucket='letterboxd-data-bucket', CreateBucketConfiguration={'LocationConstraint': 'eu-west-2'})
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.working_dir = os.getcwd()
+        os.chdir(self.tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self.working_dir)
+        self.tmp_dir.cleanup()
+
+    def test_unchanged_posters_not_uploaded_again(self):
+        from data_collection.scraper import scraper
+        server = fixture_server(n_films=12, films_per_page=12).start()
+        try:
+            posters_uploaded = []
+            for _ in range(2):
+                lbox_scraper = scraper(scrape_engine='http', start_page=1, pages=1, base_url=server.base_url, database_url='sqlite:///film_data.db',
+                                       politeness_delay=0)
+                lbox_scraper.set_data_storage_options(s3_storage=True, keep_raw_data=True, rds=False, csv=False, parquet=False)
+                with mock.patch.object(lbox_scraper.s3_sink, 'upload_poster', wraps=lbox_scraper.s3_sink.upload_poster) as upload_poster:
+                    lbox_scraper.scrape_pages([1])
+                    lbox_scraper.close()
+                posters_uploaded.append(upload_poster.call_count)
+        finally:
+            server.stop()
+        self.assertEqual(posters_uploaded, [12, 0])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
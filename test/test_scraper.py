@@ -114,6 +114,7 @@ class scraperTestCase(unittest.TestCase):
         print('\n\n SELECT YES TO ALL OPTIONS FOR TESTING \n\n')
         self.scrapetest.data_storage_options_prompt()
         self.scrapetest.implement_data_storage_options(film_data_dic)
+        self.scrapetest.flush_storage()
         objects = []
         for file in bucket.objects.filter(Prefix='raw_data/testfilm/'):
             objects.append(file.key)
@@ -0,0 +1,95 @@
+from data_collection import metrics, politeness, spool
+from datetime import datetime
+import numpy as np
+import os
+import tempfile
+import threading
+import unittest
+
+class recording_sink:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def __call__(self, film_data_dic_list: list):
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError('sink unavailable')
+            self.batches.append(film_data_dic_list)
+
+    def ids(self) -> list:
+        with self.lock:
+            return [film_data_dic['friendly_id'] for batch in self.batches for film_data_dic in batch]
+
+def film(friendly_id: str) -> dict:
+    return {'friendly_id': friendly_id, 'year': np.int64(2019), 'rating': 4.5, 'data_obtained_time': datetime(2022, 11, 1, 12, 30)}
+
+class write_behind_spoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'spool.sqlite')
+        self.retry_policy = politeness.retry_policy(max_attempts=2, base_delay=0.01, max_delay=0.01)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def open_spool(self, sinks: dict, **kwargs) -> spool.write_behind_spool:
+        return spool.write_behind_spool(self.path, sinks, retry_policy=self.retry_policy, **kwargs)
+
+    def test_drains_every_sink_in_order(self):
+        rds, csv = recording_sink(), recording_sink()
+        storage_spool = self.open_spool({'rds': rds, 'csv': csv}, batch_size=2)
+        for friendly_id in ['parasite-2019', 'la-la-land', 'joker-2019']:
+            storage_spool.append(film(friendly_id))
+        self.assertTrue(storage_spool.wait(timeout=5))
+        self.assertEqual(storage_spool.status(), {'records': 0, 'lag': {'rds': 0, 'csv': 0}})
+        storage_spool.close()
+        self.assertEqual(rds.ids(), ['parasite-2019', 'la-la-land', 'joker-2019'])
+        self.assertEqual(csv.ids(), rds.ids())
+        self.assertTrue(all(len(batch) <= 2 for batch in rds.batches))
+        self.assertEqual(rds.batches[0][0]['year'], 2019)
+        self.assertEqual(datetime.fromisoformat(rds.batches[0][0]['data_obtained_time']), datetime(2022, 11, 1, 12, 30))
+
+    def test_failing_sink_is_retried_without_holding_up_others(self):
+        registry = metrics.metrics_registry()
+        rds, s3 = recording_sink(), recording_sink(failures=3)
+        storage_spool = self.open_spool({'rds': rds, 's3': s3}, metrics=registry)
+        storage_spool.append(film('parasite-2019'))
+        self.assertTrue(storage_spool.wait(timeout=5))
+        storage_spool.close()
+        self.assertEqual(rds.ids(), ['parasite-2019'])
+        self.assertEqual(s3.ids(), ['parasite-2019'])
+        self.assertEqual(registry.summary()['counters'], {'spool_write_failures_total{sink="s3"}': 3})
+        self.assertIn('letterboxd_spool_lag_records{sink="s3"} 0', registry.render_prometheus())
+
+    def test_unacknowledged_films_are_replayed_when_reopened(self):
+        rds, s3 = recording_sink(), recording_sink(failures=100)
+        storage_spool = self.open_spool({'rds': rds, 's3': s3})
+        storage_spool.append(film('parasite-2019'))
+        storage_spool.append(film('la-la-land'))
+        self.assertFalse(storage_spool.wait(timeout=0.2))
+        self.assertEqual(storage_spool.status()['lag'], {'rds': 0, 's3': 2})
+        storage_spool.close()
+        self.assertEqual(s3.ids(), [])
+
+        rds, s3 = recording_sink(), recording_sink()
+        storage_spool = self.open_spool({'rds': rds, 's3': s3})
+        self.assertTrue(storage_spool.wait(timeout=5))
+        storage_spool.append(film('joker-2019'))
+        storage_spool.close()
+        self.assertEqual(rds.ids(), ['joker-2019'])
+        self.assertEqual(s3.ids(), ['parasite-2019', 'la-la-land', 'joker-2019'])
+
+    def test_unregistered_sink_is_forgotten(self):
+        storage_spool = self.open_spool({'rds': recording_sink(), 's3': recording_sink(failures=100)})
+        storage_spool.append(film('parasite-2019'))
+        storage_spool.close()
+        csv = recording_sink()
+        storage_spool = self.open_spool({'rds': recording_sink(), 'csv': csv})
+        self.assertEqual(storage_spool.status(), {'records': 0, 'lag': {'rds': 0, 'csv': 0}})
+        storage_spool.close()
+        self.assertEqual(csv.ids(), [])
+
+unittest.main(argv=[''], verbosity=1, exit=False)
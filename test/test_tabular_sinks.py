@@ -0,0 +1,111 @@
+from data_collection import tabular_sinks
+from datetime import datetime
+import numpy as np
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import tempfile
+import unittest
+
+def film_data(friendly_id: str, data_obtained_time: str, top_250_position=1) -> dict:
+    return {"friendly_id": friendly_id,
+            "uuid": "1234-5678-9012-3456",
+            "title": "Test Film",
+            "year": 1998,
+            "runtime": 420,
+            "rating": 5.0,
+            "watches": 10000000,
+            "lists": 999999,
+            "likes": 3141592,
+            "director": "Fintan Smyth",
+            "top_250_position": top_250_position,
+            "description": 'Test description',
+            "poster_link": "https://a.ltrbxd.com/resized/film-poster/2/4/0/3/4/4/240344-la-la-land-0-500-0-750-crop.jpg?v=053670ff84",
+            "data_obtained_time": data_obtained_time}
+
+class parquet_sinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = os.path.join(self.tmp_dir.name, 'film_data_parquet')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_rows_partitioned_by_scrape_date(self):
+        sink = tabular_sinks.parquet_sink(self.root_dir, batch_size=2)
+        sink.write(film_data('testfilm-1', '2022-11-01 10:00:00.000001'))
+        sink.write(film_data('testfilm-2', '2022-11-02 10:00:00', top_250_position=np.nan))
+        sink.write(film_data('testfilm-3', str(datetime(2022, 11, 2, 11))))
+        sink.close()
+        self.assertEqual(sorted(os.listdir(self.root_dir)), ['scrape_date=2022-11-01', 'scrape_date=2022-11-02'])
+        film_data_table = pq.read_table(os.path.join(self.root_dir, 'scrape_date=2022-11-02'))
+        self.assertEqual(film_data_table.schema, tabular_sinks.FILM_DATA_SCHEMA)
+        self.assertEqual(film_data_table.column('friendly_id').to_pylist(), ['testfilm-2', 'testfilm-3'])
+        self.assertEqual(film_data_table.column('top_250_position').to_pylist(), [None, 1])
+        self.assertEqual(sink.rows_written, 3)
+
+    def test_dataset_read_back_with_types(self):
+        sink = tabular_sinks.parquet_sink(self.root_dir, batch_size=10)
+        for i in range(25):
+            sink.write(film_data(f'testfilm-{i}', '2022-11-01 10:00:00', top_250_position=i if i % 2 else np.nan))
+        sink.close()
+        film_data_df = pd.read_parquet(self.root_dir)
+        self.assertEqual(len(film_data_df), 25)
+        self.assertEqual(str(film_data_df['top_250_position'].dtype), 'float64')
+        self.assertEqual(pq.ParquetFile(os.path.join(self.root_dir, 'scrape_date=2022-11-01', os.listdir(os.path.join(self.root_dir, 'scrape_date=2022-11-01'))[0])).num_row_groups, 3)
+        film_data_df = pd.read_parquet(self.root_dir, use_nullable_dtypes=True)
+        self.assertEqual(str(film_data_df['top_250_position'].dtype), 'Int32')
+
+    def test_finalise_makes_rows_readable(self):
+        sink = tabular_sinks.parquet_sink(self.root_dir, batch_size=1)
+        sink.write(film_data('testfilm-1', '2022-11-01 10:00:00'))
+        partition_dir = os.path.join(self.root_dir, 'scrape_date=2022-11-01')
+        self.assertTrue(all(file_name.startswith('.') for file_name in os.listdir(partition_dir)))
+        self.assertEqual(len(pd.read_parquet(self.root_dir)), 0)
+        sink.finalise()
+        sink.write(film_data('testfilm-2', '2022-11-01 11:00:00'))
+        self.assertEqual(list(pd.read_parquet(self.root_dir)['friendly_id']), ['testfilm-1'])
+        sink.close()
+        self.assertEqual(sorted(pd.read_parquet(self.root_dir)['friendly_id']), ['testfilm-1', 'testfilm-2'])
+        self.assertEqual(len(os.listdir(partition_dir)), 2)
+
+    def test_write_batch_readable_before_close(self):
+        sink = tabular_sinks.parquet_sink(self.root_dir, batch_size=10)
+        sink.write_batch([film_data('testfilm-1', '2022-11-01 10:00:00'), film_data('testfilm-2', '2022-11-02 10:00:00')])
+        sink.write_batch([film_data('testfilm-3', '2022-11-01 11:00:00')])
+        film_data_df = pd.read_parquet(self.root_dir)
+        self.assertEqual(sorted(film_data_df['friendly_id']), ['testfilm-1', 'testfilm-2', 'testfilm-3'])
+        self.assertEqual(sink.rows_written, 3)
+        sink.close()
+
+class csv_sinkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.output_path = os.path.join(self.tmp_dir.name, 'film_data.csv')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_batches_appended_with_one_header(self):
+        sink = tabular_sinks.csv_sink(self.output_path, batch_size=2)
+        sink.write(film_data('testfilm-1', '2022-11-01 10:00:00'))
+        self.assertFalse(os.path.exists(self.output_path))
+        sink.write(film_data('testfilm-2', '2022-11-01 10:00:00', top_250_position=np.nan))
+        sink.write(film_data('testfilm-3', '2022-11-01 10:00:00'))
+        sink.close()
+        sink = tabular_sinks.csv_sink(self.output_path, batch_size=2)
+        sink.write(film_data('testfilm-4', '2022-11-01 10:00:00'))
+        sink.close()
+        csv_df = pd.read_csv(self.output_path, index_col=0)
+        self.assertEqual(list(csv_df.index), ['testfilm-1', 'testfilm-2', 'testfilm-3', 'testfilm-4'])
+        self.assertTrue(pd.isna(csv_df.loc['testfilm-2', 'top_250_position']))
+
+    def test_write_batch_after_buffered_rows(self):
+        sink = tabular_sinks.csv_sink(self.output_path, batch_size=10)
+        sink.write(film_data('testfilm-1', '2022-11-01 10:00:00'))
+        sink.write_batch([film_data('testfilm-2', '2022-11-01 10:00:00'), film_data('testfilm-3', '2022-11-01 10:00:00')])
+        self.assertEqual(list(pd.read_csv(self.output_path, index_col=0).index), ['testfilm-1', 'testfilm-2', 'testfilm-3'])
+        sink.close()
+
+unittest.main(argv=[''], verbosity=1, exit=False)